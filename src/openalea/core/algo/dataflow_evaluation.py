@@ -19,20 +19,28 @@
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
+import atexit
 import sys
-from time import clock
+from heapq import heapify, heappop, heappush
+from time import clock, time
 import traceback as tb
+import cPickle
+import Queue
+import threading
+import weakref
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from openalea.core import ScriptLibrary
 
 from openalea.core.dataflow import SubDataflow
 from openalea.core.interface import IFunction
+from openalea.core.node import Node, FuncNode
+from openalea.core.observer import queued_notifications
 
-# test for distributed executions
-from openalea.core.metadata.provenance_data import Prov
-from openalea.core.metadata.cache_index import Cache_index
+# distributed executions
+from openalea.core.metadata.provenance_data import Prov, Prov_item
 from openalea.core.metadata.cloud_sites import Site, MultiSiteCloud, link_two_sites
 
-from openalea.core.metadata.costs import minimum_cost_site
 from openalea.core.metadata.scheduling_plan import SchedulingPlan
 from openalea.core.metadata.data_size import total_size
 
@@ -65,17 +73,30 @@ def db_create(cursor):
 
     #- retrospective provenance -#
     #- CompositeNodeExec table creation
-    cur.execute("CREATE TABLE IF NOT EXISTS CompositeNodeExec (CompositeNodeExecid INTEGER, createtime DATETIME, endtime DATETIME,userid INTEGER,CompositeNodeid INTEGER,PRIMARY KEY(CompositeNodeExecid),FOREIGN KEY(CompositeNodeid) references CompositeNode,FOREIGN KEY(userid) references User)")
+    cur.execute("CREATE TABLE IF NOT EXISTS CompositeNodeExec (CompositeNodeExecid INTEGER, createtime DATETIME, endtime DATETIME,userid INTEGER,CompositeNodeid INTEGER,name varchar (25),PRIMARY KEY(CompositeNodeExecid),FOREIGN KEY(CompositeNodeid) references CompositeNode,FOREIGN KEY(userid) references User)")
     #- NodeExec 
-    cur.execute("CREATE TABLE IF NOT EXISTS NodeExec (NodeExecid INTEGER, createtime DATETIME, endtime DATETIME,Nodeid INTEGER,CompositeNodeExecid INTEGER,dataid INTEGER,PRIMARY KEY(NodeExecid),FOREIGN KEY(Nodeid) references Node, FOREIGN KEY (CompositeNodeExecid) references CompositeNodeExec, FOREIGN KEY (dataid) references Data)")
+    cur.execute("CREATE TABLE IF NOT EXISTS NodeExec (NodeExecid INTEGER, createtime DATETIME, endtime DATETIME,Nodeid INTEGER,CompositeNodeExecid INTEGER,dataid INTEGER,NodeFactory varchar (25),input_size INTEGER,PRIMARY KEY(NodeExecid),FOREIGN KEY(Nodeid) references Node, FOREIGN KEY (CompositeNodeExecid) references CompositeNodeExec, FOREIGN KEY (dataid) references Data)")
     #- History
     cur.execute("CREATE TABLE IF NOT EXISTS Histoire (Histoireid INTEGER, createtime DATETIME, name varchar (25), description varchar (25),userid INTEGER,CompositeNodeExecid INTEGER,PRIMARY KEY (Histoireid), FOREIGN KEY(Userid) references User, FOREIGN KEY(CompositeNodeExecid) references CompositeNodeExec)")
     #- Data
-    cur.execute("CREATE TABLE IF NOT EXISTS Data (dataid INTEGER, createtime DATETIME,NodeExecid INTEGER, PRIMARY KEY(dataid),FOREIGN KEY(NodeExecid) references NodeExec)")
+    cur.execute("CREATE TABLE IF NOT EXISTS Data (dataid INTEGER, createtime DATETIME,NodeExecid INTEGER,size INTEGER, PRIMARY KEY(dataid),FOREIGN KEY(NodeExecid) references NodeExec)")
     #- Tag
     cur.execute("CREATE TABLE IF NOT EXISTS Tag (CompositeNodeExecid INTEGER, createtime DATETIME, name varchar(25),userid INTEGER,PRIMARY KEY(CompositeNodeExecid),FOREIGN KEY(userid) references User)")
+
+    #- columns added to databases created by previous versions
+    for table, column, typ in db_added_columns:
+        columns = [row[1] for row in cur.execute("PRAGMA table_info(%s)" % table)]
+        if column not in columns:
+            cur.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, column, typ))
     return cur
 
+# (table, column, type) of the measures of the executions
+db_added_columns = [("CompositeNodeExec", "name", "varchar (25)"),
+                    ("NodeExec", "NodeFactory", "varchar (25)"),
+                    ("NodeExec", "input_size", "INTEGER"),
+                    ("Data", "size", "INTEGER"),
+                    ]
+
 def get_database_name():
     db_fn = path(settings.get_openalea_home_dir())/'provenance.sq3'
     return db_fn
@@ -87,12 +108,11 @@ def db_connexion():
     """
     global db_conn
     if db_conn is None:
-        db_fn = get_database_name()
-        if not db_fn.exists():
-            db_conn=sqlite3.connect(db_fn)
-            cur = db_conn.cursor()
-            cur = db_create(cur)
-            return cur
+        db_conn = sqlite3.connect(get_database_name())
+        cur = db_conn.cursor()
+        cur = db_create(cur)
+        db_conn.commit()
+        return cur
     else:
         cur = db_conn.cursor()
         return cur
@@ -130,17 +150,49 @@ class PrintProvenance(Provenance):
     def workflow_exec(self, *args):
         print 'Workflow execution ', self.workflow.factory.name
     def node_exec(self, vid, node, start_time, end_time, *args):
-        provenance(vid, node, start_time, end_time)
+        print_provenance(vid, node, start_time, end_time)
 
 
-def provenance(vid, node, start_time, end_time):
-    #from service import db
-    #conn = db.connect()
+class StoreProvenance(Provenance):
+    """ Record the executions in a metadata.provenance_store.ProvenanceStore.
 
+    Records are buffered by the store and written by its writer thread.
+    """
 
-    if PROVENANCE:
-        cur = db_connexion()
+    def __init__(self, workflow, store):
+        self.store = store
+        self.exec_id = None
+        self.t0 = None
+        Provenance.__init__(self, workflow)
+
+    def workflow_name(self):
+        factory = getattr(self.workflow, 'factory', None)
+        if factory is not None:
+            return factory.name
+        return getattr(self.workflow, 'caption', '')
+
+    def workflow_exec(self, *args):
+        self.exec_id = self.store.new_exec_id()
+        self.t0 = time()
+        self.store.workflow_start(self.exec_id, self.workflow_name(), self.t0)
+
+    def start_time(self):
+        self.t0 = time()
+
+    def end_time(self):
+        if self.exec_id is not None:
+            self.store.workflow_exec(self.exec_id, self.workflow_name(),
+                                     self.t0, time())
+            self.exec_id = None
 
+    def node_exec(self, vid, node, start_time, end_time, *args):
+        if self.exec_id is None:
+            self.workflow_exec()
+        self.store.node_exec(self.exec_id, vid, node, start_time, end_time)
+
+
+def print_provenance(vid, node, start_time, end_time):
+    if PROVENANCE:
         pname = node.factory.package.name
         name = node.factory.name
 
@@ -155,6 +207,31 @@ def provenance(vid, node, start_time, end_time):
 quantify = False
 # get the prov when evaluating
 provenance = False
+# store of the provenance (see metadata.provenance_store.ProvenanceStore)
+provenance_store = None
+# memoization of node outputs (see metadata.cache_index.ResultCache)
+result_cache = None
+
+
+def set_result_cache(cache):
+    """ Set the ResultCache used by evaluations (None to disable it).
+    Return the previous cache.
+    """
+    global result_cache
+    previous = result_cache
+    result_cache = cache
+    return previous
+
+
+def set_provenance_store(store):
+    """ Record the provenance of evaluations in store (None to disable it).
+    Return the previous store.
+    """
+    global provenance_store, PROVENANCE
+    previous = provenance_store
+    provenance_store = store
+    PROVENANCE = store is not None
+    return previous
 
 __evaluators__ = []
 
@@ -209,13 +286,22 @@ def cmp_posx(x, y):
 
 class AbstractEvaluation(object):
 
+    # notifications sent during the evaluation (see CompositeNode.eval_as_expression):
+    # None (all), 'quiet' (none) or 'batch' (coalesced and sent at the end)
+    notification_mode = None
+
     def __init__(self, dataflow):
         """
         :param dataflow: to be done
         """
         self._dataflow = dataflow
+        self._plan = None
+        self.result_cache = result_cache
         if PROVENANCE:
-            self.provenance = PrintProvenance(dataflow)
+            if provenance_store is not None:
+                self.provenance = StoreProvenance(dataflow, provenance_store)
+            else:
+                self.provenance = PrintProvenance(dataflow)
 
     def eval(self, *args):
         """todo"""
@@ -232,15 +318,20 @@ class AbstractEvaluation(object):
         """
 
         node = self._dataflow.actor(vid)
+        cache = self.result_cache
 
         try:
-            t0 = clock()
-            ret = node.eval()
-            t1 = clock()
+            # only record the nodes which are executed
+            record = PROVENANCE and not node.is_up_to_date()
+            t0 = time()
+            if cache is None:
+                ret = node.eval()
+            else:
+                ret = cache.eval_node(node)
+            t1 = time()
 
-            if PROVENANCE:
+            if record:
                 self.provenance.node_exec(vid, node, t0,t1)
-                #provenance(vid, node, t0,t1)
             
             # When an exception is raised, a flag is set.
             # So we remove it when evaluation is ok.
@@ -285,6 +376,29 @@ class AbstractEvaluation(object):
     def set_provenance(self, provenance):
         self.provenance = provenance
 
+    def start_provenance(self):
+        """ Record the start of a workflow execution """
+        if PROVENANCE and getattr(self, 'provenance', None) is not None:
+            self.provenance.workflow_exec()
+            self.provenance.start_time()
+
+    def end_provenance(self):
+        """ Record the end of the workflow execution """
+        if PROVENANCE and getattr(self, 'provenance', None) is not None:
+            self.provenance.end_time()
+
+    def get_plan(self):
+        """ Return the EvaluationPlan of the dataflow.
+
+        A CompositeNode keeps its plan until its graph is modified.
+        """
+        df = self._dataflow
+        if hasattr(df, 'get_eval_plan'):
+            return df.get_eval_plan()
+        if self._plan is None:
+            self._plan = EvaluationPlan(df)
+        return self._plan
+
 class BrutEvaluation(AbstractEvaluation):
     """ Basic evaluation algorithm """
     __evaluators__.append("BrutEvaluation")
@@ -379,20 +493,23 @@ class PriorityEvaluation(BrutEvaluation):
         if (vtx_id is not None):
             return self.eval_vertex(vtx_id, *args)
 
-        # Select the leaves (list of (vid, actor))
-        leaves = [(vid, df.actor(vid))
-              for vid in df.vertices() if df.nb_out_edges(vid)==0]
-
-        leaves.sort(cmp_priority)
-
         # Excecute
-        for vid, actor in leaves:
+        for vid, actor in self.get_leaves():
             self.eval_vertex(vid, *args)
 
         t1 = clock()
         if quantify:
             print "Evaluation time: %s"%(t1-t0)
 
+    def get_leaves(self):
+        """ Return the leaves (list of (vid, actor)) sorted by priority """
+        df = self._dataflow
+        leaves = [(vid, df.actor(vid))
+              for vid in df.vertices() if df.nb_out_edges(vid)==0]
+
+        leaves.sort(cmp_priority)
+        return leaves
+
 
 class GeneratorEvaluation(AbstractEvaluation):
     """ Evaluation algorithm with generator / priority and selection"""
@@ -483,6 +600,199 @@ class GeneratorEvaluation(AbstractEvaluation):
         return False
 
 
+class StreamEvaluation(GeneratorEvaluation):
+    """ Generator evaluation which streams the items through the graph.
+
+    The first pass is the one of GeneratorEvaluation. Then, while some
+    vertices ask for a reevaluation (e.g. IterNode), only these vertices
+    and their descendants are evaluated again, in topological order.
+    The other branches are evaluated once and keep their outputs.
+
+    If chunk_size is set, the nodes which support it (IterNode) output
+    lists of at most chunk_size items instead of single items.
+    """
+    __evaluators__.append("StreamEvaluation")
+
+    def __init__(self, dataflow, chunk_size=None):
+        GeneratorEvaluation.__init__(self, dataflow)
+        self.chunk_size = chunk_size
+        # vertices which asked for a reevaluation
+        self._generators = set()
+        # number of evaluations of the downstream cones
+        self.nb_items = 0
+
+    def eval_vertex_code(self, vid):
+        ret = GeneratorEvaluation.eval_vertex_code(self, vid)
+        if ret:
+            self._generators.add(vid)
+        return ret
+
+    def eval(self, vtx_id=None, step=False):
+        t0 = clock()
+        df = self._dataflow
+
+        if (vtx_id is not None):
+            leafs = [(vtx_id, df.actor(vtx_id))]
+        else:
+            leafs = self.get_plan().sorted_leaves()
+
+        chunked = [df.actor(vid) for vid in df.vertices()
+                   if hasattr(df.actor(vid), 'chunk_size')]
+        for actor in chunked:
+            actor.chunk_size = self.chunk_size
+
+        self.start_provenance()
+        try:
+            self.nb_items = 0
+            for vid, actor in leafs:
+                if not self.is_stopped(vid, actor):
+                    self.stream(vid)
+        finally:
+            for actor in chunked:
+                actor.chunk_size = None
+            self.end_provenance()
+
+        t1 = clock()
+        if quantify:
+            print "Evaluation time: %s"%(t1-t0)
+        return False
+
+    def stream(self, vid):
+        """ Evaluate vid, then the downstream cones of the generators
+        until they are exhausted """
+        self.clear()
+        self._generators.clear()
+        self.eval_vertex(vid)
+
+        # vertices needed by vid
+        scope = set(self._evaluated)
+        cones = {}
+        while self._generators:
+            generators = frozenset(self._generators)
+            self._generators.clear()
+
+            cone = cones.get(generators)
+            if cone is None:
+                cone = cones[generators] = self.get_cone(generators, scope)
+
+            self.eval_cone(cone)
+            self.nb_items += 1
+
+    def get_cone(self, generators, scope):
+        """ Return the list of (vid, actor) of the generators and their
+        descendants in scope, in evaluation order """
+        df = self._dataflow
+        plan = self.get_plan()
+
+        cone = set(generators)
+        vertices = []
+        for vid in plan.order:
+            if vid not in cone or vid not in scope:
+                continue
+            actor = df.actor(vid)
+            if actor.block:
+                continue
+            vertices.append((vid, actor))
+            cone.update(plan.children[vid])
+        return vertices
+
+    def eval_cone(self, cone):
+        """ Set the inputs and evaluate each vertex of the cone """
+        plan = self.get_plan()
+        for vid, actor in cone:
+            for input_index, parents in plan.inputs[vid]:
+                inputs = [nactor.get_output(output_index) for npid, nvid, nactor, output_index
+                          in plan.sorted_parents(parents)]
+                # set input as a list or a simple value
+                if len(inputs) == 1:
+                    inputs = inputs[0]
+                actor.set_input(input_index, inputs)
+
+            self.eval_vertex_code(vid)
+
+
+class EvaluationPlan(object):
+    """ Precompiled structure of a dataflow, built once and used by each
+    evaluation until the graph is modified.
+
+    - order: list of vertices, parents before children
+    - leaves: list of (vid, actor) of the vertices without out edges
+    - inputs: dict vid -> list of (input_index, parents) for each connected
+      input port, where parents is the list of (npid, nvid, nactor,
+      output_index) sorted by x position (see cmp_posx)
+    - children: dict vid -> set of the vertices connected to its outputs
+    """
+
+    def __init__(self, dataflow):
+        self.dataflow = dataflow
+        self.inputs = {}
+        self.children = {}
+        self.leaves = []
+        self.order = []
+        self.compile()
+
+    def compile(self):
+        """ Resolve the connections and the evaluation order """
+        df = self.dataflow
+        self.inputs.clear()
+        self.children = dict((vid, set()) for vid in df.vertices())
+
+        for vid in df.vertices():
+            inputs = []
+            for pid in df.in_ports(vid):
+                npids = [(npid, df.vertex(npid), df.actor(df.vertex(npid)))
+                         for npid in df.connected_ports(pid)]
+                if npids:
+                    npids.sort(cmp=cmp_posx)
+                    parents = [(npid, nvid, nactor, df.local_id(npid))
+                               for npid, nvid, nactor in npids]
+                    inputs.append((df.local_id(pid), parents))
+                    for npid, nvid, nactor in npids:
+                        self.children[nvid].add(vid)
+            inputs.sort(key=lambda item: item[0])
+            self.inputs[vid] = inputs
+
+        self.leaves = [(vid, df.actor(vid))
+                       for vid in df.vertices() if df.nb_out_edges(vid) == 0]
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        visited = set()
+        for vid, actor in self.leaves:
+            stack = [(vid, False)]
+            while stack:
+                vid, processed = stack.pop()
+                if processed:
+                    order.append(vid)
+                    continue
+                if vid in visited:
+                    continue
+                visited.add(vid)
+                stack.append((vid, True))
+                for input_index, parents in reversed(self.inputs[vid]):
+                    for npid, nvid, nactor, output_index in reversed(parents):
+                        if nvid not in visited:
+                            stack.append((nvid, False))
+        return order
+
+    def sorted_parents(self, parents):
+        """ Sort again the parents of a multi connected port.
+
+        Nodes may have been moved since the compilation of the plan.
+        """
+        if len(parents) < 2:
+            return parents
+        position = lambda actor: actor.get_ad_hoc_dict().get_metadata('position')[0]
+        return sorted(parents, key=lambda p: (position(p[2]), p[0]))
+
+    def sorted_leaves(self):
+        """ Return the leaves sorted by priority (see cmp_priority) """
+        if len(self.leaves) < 2:
+            return list(self.leaves)
+        return sorted(self.leaves,
+                      key=lambda leaf: -leaf[1].internal_data.get('priority', 0))
+
 
 class LambdaEvaluation(PriorityEvaluation):
     """ Evaluation algorithm with support of lambda / priority and selection"""
@@ -519,11 +829,11 @@ class LambdaEvaluation(PriorityEvaluation):
         self._evaluated.add(vid)
 
         use_lambda = False
+        plan = self.get_plan()
 
-        # For each inputs
-        for pid in df.in_ports(vid):
+        # For each connected inputs
+        for input_index, parents in plan.inputs[vid]:
 
-            input_index = df.local_id(pid)
             inputs = []
 
             # Get input interface
@@ -542,13 +852,13 @@ class LambdaEvaluation(PriorityEvaluation):
             cpt = 0 # parent counter
 
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for npid, nvid, nactor, output_index in plan.sorted_parents(parents):
 
                 # Do no reevaluate the same node
                 if not self.is_stopped(nvid, nactor):
                     self.eval_vertex(nvid, transmit_cxt, transmit_lambda)
 
-                outval = nactor.get_output(df.local_id(npid))
+                outval = nactor.get_output(output_index)
                 # Lambda
 
                 # We must consider 3 cases
@@ -622,7 +932,7 @@ class LambdaEvaluation(PriorityEvaluation):
         PriorityEvaluation.eval(self, vtx_id, context, self.lambda_value, is_subdataflow=is_subdataflow)
         self.lambda_value.clear() # do not keep context in memory
         
-        if PROVENANCE:
+        if PROVENANCE and (not is_subdataflow):
             self.provenance.end_time()
 
         t1 = clock()
@@ -632,11 +942,533 @@ class LambdaEvaluation(PriorityEvaluation):
         if not is_subdataflow:
             self._resolution_node.clear()
 
+    def get_leaves(self):
+        return self.get_plan().sorted_leaves()
+
 
 DefaultEvaluation = LambdaEvaluation
 #DefaultEvaluation = GeneratorEvaluation
 
 
+###############################################################################
+# Parallel evaluation
+
+# Pools are shared between evaluations: a new algorithm instance is created
+# each time a CompositeNode is evaluated.
+_worker_pools = {}
+_worker_local = threading.local()
+
+
+def get_worker_pool(nb_workers=None, use_processes=False):
+    """ Return a shared pool of workers, created on first use.
+
+    :param nb_workers: number of workers (None means the number of cpus)
+    :param use_processes: use a pool of processes instead of threads
+    """
+    key = (nb_workers, use_processes)
+    if key not in _worker_pools:
+        if use_processes:
+            _worker_pools[key] = multiprocessing.Pool(nb_workers)
+        else:
+            _worker_pools[key] = ThreadPool(nb_workers)
+    return _worker_pools[key]
+
+
+def _remote_call(payload):
+    """ Execute a pickled (function, inputs) in a worker process.
+
+    Return a pickled (True, result) or (False, (message, traceback)).
+    """
+    try:
+        func, inputs = cPickle.loads(payload)
+        return cPickle.dumps((True, func(*inputs)), cPickle.HIGHEST_PROTOCOL)
+    except Exception, e:
+        error = (repr(e), tb.format_tb(sys.exc_info()[2]))
+        return cPickle.dumps((False, error), cPickle.HIGHEST_PROTOCOL)
+
+
+class ParallelEvaluation(PriorityEvaluation):
+    """ Evaluate independent vertices at the same time on a pool of workers.
+
+    The vertices to evaluate are ordered topologically. A vertex is submitted
+    to the pool as soon as all its parents have been evaluated. Inputs are set,
+    results are collected and listeners are notified in the calling thread.
+    Lambda (SubDataflow) resolution is not supported.
+    """
+    __evaluators__.append("ParallelEvaluation")
+
+    # number of workers (None: number of cpus)
+    nb_workers = None
+    # run the nodes in a pool of processes rather than threads
+    use_processes = False
+
+    def __init__(self, dataflow, nb_workers=None, use_processes=None):
+        PriorityEvaluation.__init__(self, dataflow)
+
+        if nb_workers is not None:
+            self.nb_workers = nb_workers
+        if use_processes is not None:
+            self.use_processes = use_processes
+
+        self._done = Queue.Queue()
+        # vid -> list of (input index, [(parent vid, output index)])
+        self._inputs = {}
+
+    def eval(self, vtx_id=None, *args, **kwds):
+        """ Evaluate the dataflow (from vtx_id if not None) """
+
+        # A node evaluated inside a worker thread can not wait for the pool.
+        if getattr(_worker_local, 'in_worker', False):
+            return PriorityEvaluation.eval(self, vtx_id, *args, **kwds)
+
+        t0 = clock()
+        df = self._dataflow
+
+        self._evaluated.clear()
+        self._inputs.clear()
+
+        if (vtx_id is not None):
+            starts = [vtx_id]
+        else:
+            leaves = [(vid, df.actor(vid))
+                      for vid in df.vertices() if df.nb_out_edges(vid) == 0]
+            leaves.sort(cmp_priority)
+            starts = [vid for vid, actor in leaves]
+
+        self.start_provenance()
+        try:
+            self.schedule(self.scan_graph(starts))
+        finally:
+            self.end_provenance()
+
+        t1 = clock()
+        if quantify:
+            print "Evaluation time: %s"%(t1-t0)
+
+    def scan_graph(self, starts):
+        """ Return the list of vertices to evaluate, reachable from starts.
+
+        The traversal stops on vertices which are stopped (see is_stopped).
+        Connected inputs of each vertex are stored for later use.
+        """
+        df = self._dataflow
+
+        vertices = []
+        scan_list = list(starts)
+        self._evaluated.update(starts)
+
+        while scan_list:
+            vid = scan_list.pop()
+            vertices.append(vid)
+
+            inputs = []
+            for pid in df.in_ports(vid):
+                parents = []
+                for npid, nvid, nactor in self.get_parent_nodes(pid):
+                    if not self.is_stopped(nvid, nactor):
+                        self._evaluated.add(nvid)
+                        scan_list.append(nvid)
+                    parents.append((nvid, df.local_id(npid)))
+                if parents:
+                    inputs.append((df.local_id(pid), parents))
+            self._inputs[vid] = inputs
+
+        return vertices
+
+    def schedule(self, vertices):
+        """ Evaluate vertices, in parallel when their parents are evaluated.
+
+        Raise the first EvaluationException once the running tasks are done.
+        """
+        df = self._dataflow
+        todo = set(vertices)
+
+        # Dependencies between the vertices to evaluate
+        nb_parents = dict.fromkeys(vertices, 0)
+        children = dict((vid, []) for vid in vertices)
+        for vid in vertices:
+            parents = set(nvid for index, connections in self._inputs[vid]
+                          for nvid, out_index in connections
+                          if nvid in todo)
+            nb_parents[vid] = len(parents)
+            for nvid in parents:
+                children[nvid].append(vid)
+
+        ready = [vid for vid in vertices if nb_parents[vid] == 0]
+        pool = self.get_pool()
+        running = 0
+        error = None
+
+        while todo:
+            if not ready and not running:
+                # A cycle: evaluate it as the recursive algorithm does,
+                # with the current values of the parents.
+                ready.append(min(todo, key=lambda v: (nb_parents[v], v)))
+
+            ready.sort(cmp_priority,
+                       key=lambda vid: (vid, df.actor(vid)))
+            while ready and error is None:
+                vid = ready.pop(0)
+                todo.discard(vid)
+                self.submit(pool, vid)
+                running += 1
+
+            if not running:
+                break
+
+            vid, result = self._done.get()
+            running -= 1
+
+            try:
+                self.complete(vid, result)
+            except EvaluationException, e:
+                if error is None:
+                    error = e
+                continue
+
+            for cvid in children[vid]:
+                nb_parents[cvid] -= 1
+                if nb_parents[cvid] == 0 and cvid in todo:
+                    ready.append(cvid)
+
+        # Wait for the running tasks
+        while running:
+            vid, result = self._done.get()
+            running -= 1
+            try:
+                self.complete(vid, result)
+            except EvaluationException:
+                pass
+
+        if error is not None:
+            raise error
+
+    def get_pool(self):
+        """ Return the pool of workers """
+        return get_worker_pool(self.nb_workers, self.use_processes)
+
+    def set_vertex_inputs(self, vid):
+        """ Set the inputs of vid with the outputs of its parents """
+        df = self._dataflow
+        actor = df.actor(vid)
+
+        for input_index, connections in self._inputs[vid]:
+            inputs = [df.actor(nvid).get_output(out_index)
+                      for nvid, out_index in connections]
+            # set input as a list or a simple value
+            if len(inputs) == 1:
+                inputs = inputs[0]
+            actor.set_input(input_index, inputs)
+
+    def submit(self, pool, vid):
+        """ Set the inputs of vid and submit its evaluation to the pool """
+        self.set_vertex_inputs(vid)
+
+        if self.use_processes:
+            node = self._dataflow.actor(vid)
+            payload = self.remote_payload(node)
+            if payload is None:
+                # Evaluate the node locally
+                self._done.put(self.eval_task(vid))
+            else:
+                node.notify_listeners(("start_eval",))
+                callback = lambda res: self._done.put((vid, ('remote', res)))
+                pool.apply_async(_remote_call, (payload,), callback=callback)
+        else:
+            pool.apply_async(self.eval_task, (vid,), callback=self._done.put)
+
+    def eval_task(self, vid):
+        """ Evaluate vid.
+
+        Return (vid, ('local', (exception or None, notifications))). The
+        notifications sent by the nodes are queued, complete sends them in
+        the calling thread.
+        """
+        _worker_local.in_worker = True
+        notifications = []
+        try:
+            with queued_notifications(notifications):
+                self.eval_vertex_code(vid)
+        except EvaluationException, e:
+            return vid, ('local', (e, notifications))
+        finally:
+            _worker_local.in_worker = False
+        return vid, ('local', (None, notifications))
+
+    def complete_local(self, value):
+        """ Send the notifications of a local evaluation and raise its
+        EvaluationException if any """
+        error, notifications = value
+        for sender, event in notifications:
+            sender.notify_listeners(event)
+        if error is not None:
+            raise error
+
+    def remote_payload(self, node):
+        """ Return the pickled call of node to send to a process
+        or None if the node has to be evaluated locally.
+
+        Only function nodes which do not redefine the evaluation are shipped.
+        """
+        if not isinstance(node, FuncNode) or node.is_up_to_date():
+            return None
+        cache = self.result_cache
+        if cache is not None and cache.node_key(node) in cache:
+            return None
+        cls = node.__class__
+        if (cls.eval.im_func is not Node.eval.im_func or
+            cls.__call__.im_func is not FuncNode.__call__.im_func):
+            return None
+        try:
+            return cPickle.dumps((node.func, tuple(node.inputs)),
+                                 cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+
+    def complete(self, vid, result):
+        """ Finalize the evaluation of vid in the calling thread.
+
+        Raise an EvaluationException if the evaluation has failed.
+        """
+        kind, value = result
+        if kind == 'local':
+            return self.complete_local(value)
+
+        node = self._dataflow.actor(vid)
+        success, ret = cPickle.loads(value)
+        node.raise_exception = not success
+        if success:
+            cache = self.result_cache
+            key = None if cache is None else cache.node_key(node)
+            node.end_eval(ret)
+            if key is not None:
+                cache.put(key, list(node.outputs))
+            node.notify_listeners(('data_modified', None, None))
+        else:
+            node.notify_listeners(('data_modified', None, None))
+            message, exc_info = ret
+            raise EvaluationException(vid, node, Exception(message), exc_info)
+
+
+class ProcessParallelEvaluation(ParallelEvaluation):
+    """ Parallel evaluation on a pool of processes """
+    __evaluators__.append("ProcessParallelEvaluation")
+
+    use_processes = True
+
+
+class IncrementalEvaluation(PriorityEvaluation):
+    """ Evaluate only the vertices downstream of a modified vertex.
+
+    A vertex is dirty when its node is not up to date (see Node.is_up_to_date):
+    modified or invalidated lazy nodes, non lazy nodes and delayed nodes.
+    Vertices are visited in topological order and only the downstream cone
+    of the dirty vertices is visited. In this cone, a lazy vertex whose
+    inputs did not change is skipped, as are its children if nothing else
+    changed. Clean vertices are neither evaluated nor notified.
+    Lambda (SubDataflow) resolution is not supported.
+    """
+    __evaluators__.append("IncrementalEvaluation")
+
+    def __init__(self, dataflow):
+        PriorityEvaluation.__init__(self, dataflow)
+        # vertices evaluated by the last call to eval
+        self.executed = []
+
+    def eval(self, vtx_id=None, *args, **kwds):
+        """ Evaluate the dirty vertices (only the ancestors of vtx_id if not
+        None) and their descendants """
+        t0 = clock()
+        df = self._dataflow
+        plan = self.get_plan()
+
+        self.executed = []
+        self.start_provenance()
+        try:
+            for vid in self.get_cone(vtx_id):
+                actor = df.actor(vid)
+                for input_index, parents in plan.inputs[vid]:
+                    inputs = [nactor.get_output(output_index) for npid, nvid, nactor, output_index
+                              in plan.sorted_parents(parents)]
+                    # set input as a list or a simple value
+                    if len(inputs) == 1:
+                        inputs = inputs[0]
+                    actor.set_input(input_index, inputs)
+
+                # unchanged inputs of a lazy node
+                if actor.is_up_to_date():
+                    continue
+
+                self.executed.append(vid)
+                self.eval_vertex_code(vid)
+        finally:
+            self.end_provenance()
+
+        t1 = clock()
+        if quantify:
+            print "Evaluation time: %s"%(t1-t0)
+
+    def get_cone(self, vtx_id=None):
+        """ Return the vertices which may be evaluated, in evaluation order.
+
+        These are the dirty vertices and their descendants, restricted to the
+        ancestors of vtx_id if not None. Descendants of a stopped vertex
+        (see is_stopped) are not included.
+        """
+        df = self._dataflow
+        plan = self.get_plan()
+
+        if vtx_id is not None:
+            scope = set(df.get_all_parent_nodes(vtx_id))
+            scope.add(vtx_id)
+        else:
+            scope = None
+
+        cone = set()
+        for vid in plan.order:
+            if scope is not None and vid not in scope:
+                continue
+            actor = df.actor(vid)
+            if vid in cone:
+                if self.is_stopped(vid, actor):
+                    cone.discard(vid)
+                    continue
+            elif actor.is_up_to_date():
+                continue
+            else:
+                cone.add(vid)
+            cone.update(plan.children[vid])
+
+        return [vid for vid in plan.order
+                if vid in cone and (scope is None or vid in scope)]
+
+    def is_stopped(self, vid, actor):
+        """ Return True if the evaluation does not go through this vertex """
+        return actor.block and actor.is_up_to_date()
+
+
+class BatchEvaluation(AbstractEvaluation):
+    """ Evaluate a composite node for a list of input tuples.
+
+    The graph is traversed once for the whole batch and each vertex
+    receives a column (a list or array of values) per input. Vectorizable
+    nodes (see Node.vectorizable) are called once with these columns and
+    return a column per output, the other nodes are called for each item.
+    Nodes are called directly: their inputs, outputs and state are not
+    modified and no event is sent. Blocked nodes with outputs keep them.
+    Lambda (SubDataflow) resolution is not supported.
+    """
+
+    def eval(self, list_of_inputs):
+        """ Return the list of the output columns of the composite node.
+
+        :param list_of_inputs: list of tuples of input values. Missing values
+            are replaced by the current inputs of the composite node.
+        """
+        cn = self._dataflow
+        plan = cn.get_eval_plan()
+        rows = [tuple(row) for row in list_of_inputs]
+        nb = len(rows)
+
+        columns = {}
+        if cn.id_in is not None:
+            in_node = cn.node(cn.id_in)
+            columns[cn.id_in] = [[row[i] if i < len(row) else in_node.get_input(i)
+                                  for row in rows]
+                                 for i in range(in_node.get_nb_output())]
+
+        if cn.id_out is not None and cn.get_nb_output() > 0:
+            scope = set(cn.get_all_parent_nodes(cn.id_out))
+        else:
+            scope = set(cn.vertices())
+        scope.discard(cn.id_in)
+        scope.discard(cn.id_out)
+
+        for vid in plan.order:
+            if vid in scope:
+                actor = cn.actor(vid)
+                inputs = self.input_columns(vid, actor, nb, columns)
+                columns[vid] = self.eval_vertex_batch(vid, actor, inputs, nb)
+
+        if cn.id_out is None or cn.get_nb_output() == 0:
+            return []
+        return self.input_columns(cn.id_out, cn.node(cn.id_out), nb, columns)
+
+    def input_columns(self, vid, actor, nb, columns):
+        """ Return the list of input columns of vid.
+
+        Unconnected inputs are repeated nb times.
+        """
+        plan = self._dataflow.get_eval_plan()
+        inputs = [[actor.get_input(i)] * nb for i in range(actor.get_nb_input())]
+
+        for input_index, parents in plan.inputs[vid]:
+            parent_columns = []
+            for npid, nvid, nactor, output_index in plan.sorted_parents(parents):
+                if nvid in columns:
+                    parent_columns.append(columns[nvid][output_index])
+                else:
+                    parent_columns.append([nactor.get_output(output_index)] * nb)
+
+            # set input as a list or a simple value
+            if len(parent_columns) == 1:
+                inputs[input_index] = parent_columns[0]
+            else:
+                inputs[input_index] = [list(values) for values in zip(*parent_columns)]
+        return inputs
+
+    def eval_vertex_batch(self, vid, actor, inputs, nb):
+        """ Return the list of output columns of vid for the input columns """
+        nb_output = actor.get_nb_output()
+
+        if actor.block and actor.is_up_to_date():
+            return [[actor.get_output(i)] * nb for i in range(nb_output)]
+
+        try:
+            if hasattr(actor, 'eval_batch'):
+                rows = zip(*inputs) if inputs else [()] * nb
+                return actor.eval_batch(rows)
+
+            # nodes overriding eval are evaluated item by item, with eval
+            default_eval = type(actor).eval.im_func is Node.eval.im_func
+            if actor.vectorizable and default_eval:
+                outlist = actor(inputs)
+                if nb_output == 1:
+                    if isinstance(outlist, tuple) and len(outlist) == 1:
+                        outlist = outlist[0]
+                    return [outlist]
+                outputs = list(outlist)[:nb_output]
+                return outputs + [[None] * nb for i in range(nb_output - len(outputs))]
+
+            outputs = [[None] * nb for i in range(nb_output)]
+            saved_inputs = actor.inputs
+            saved_outputs = list(actor.outputs)
+            try:
+                for i in xrange(nb):
+                    # some nodes read self.inputs
+                    actor.inputs = [column[i] for column in inputs]
+                    if default_eval:
+                        values = actor.split_outputs(actor(actor.inputs))
+                    else:
+                        actor.eval()
+                        values = list(actor.outputs)
+                    for output, value in zip(outputs, values):
+                        output[i] = value
+            finally:
+                actor.inputs = saved_inputs
+                actor.outputs[:] = saved_outputs
+            return outputs
+
+        except EvaluationException, e:
+            e.vid = vid
+            e.node = actor
+            raise e
+
+        except Exception, e:
+            raise EvaluationException(vid, actor, e, \
+                tb.format_tb(sys.exc_info()[2]))
+
+
 # from collections import deque
 
 
@@ -918,24 +1750,35 @@ class ToScriptEvaluation(AbstractEvaluation):
 # The objective is to take
 
 class DiscreteTimeEvaluation(AbstractEvaluation):
-    """ Evaluation algorithm with generator / priority and selection"""
+    """ Discrete event evaluation.
+
+    A node which returns a delay d (an int > 0) is evaluated again d cycles
+    later. The first cycle evaluates the whole graph. Then the scheduler
+    (a heap of (cycle, vid)) jumps to the next cycle where some nodes are
+    due, and only these nodes and their descendants are evaluated.
+
+    The simulation stops when no node is scheduled, when a due node returns
+    no delay, or after max_cycles cycles (no limit if None). In the last two
+    cases the scheduled nodes are reset.
+    """
     __evaluators__.append("DiscreteTimeEvaluation")
 
-    def __init__(self, dataflow):
+    def __init__(self, dataflow, max_cycles=1000):
 
         AbstractEvaluation.__init__(self, dataflow)
         # a property to specify if the node has already been evaluated
         self._evaluated = set()
         self.reeval = False # Flag to force reevaluation (for generator)
-
-        # CPL
-        # At each evaluation of the dataflow, increase the current cycle of
-        # one unit.
+        self.max_cycles = max_cycles
 
         self._current_cycle = 0
-        # timed nodes are a dict with vid, time >0
-        # when time is 0, remove the node from the dict
+        # timed nodes are a dict vid -> cycle where the node is due,
+        # events is the heap of (cycle, vid) (may contain stale entries)
         self._timed_nodes = dict()
+        self._events = []
+        # vertices of the running simulation (None when not started)
+        self._scope = None
+        self._position = {}
         self._stop = False
         self._nodes_to_reset = []
 
@@ -958,16 +1801,58 @@ class DiscreteTimeEvaluation(AbstractEvaluation):
         self._stop = False
         self._nodes_to_reset = []
 
+    def schedule(self, vid, delay):
+        """ Evaluate vid again delay cycles after the current one """
+        cycle = self._current_cycle + delay
+        self._timed_nodes[vid] = cycle
+        heappush(self._events, (cycle, vid))
+        self.reeval = True
+
+    def next_cycle(self):
+        """ Return the next cycle where some nodes are due, or None """
+        events = self._events
+        while events:
+            cycle, vid = events[0]
+            if self._timed_nodes.get(vid) == cycle:
+                return cycle
+            heappop(events)
+        return None
+
     def next_step(self):
-        """ Update the scheduler of one step. """
-        self._current_cycle += 1
-        for vid in self._timed_nodes:
-            self._timed_nodes[vid] -= 1
+        """ Jump to the next cycle where some nodes are due.
 
-    def eval_vertex(self, vid):
-        """ Evaluate the vertex vid """
+        Return the list of the due vertices.
+        """
+        cycle = self.next_cycle()
+        if cycle is None:
+            return []
+
+        self._current_cycle = cycle
+        events = self._events
+        due = []
+        while events and events[0][0] == cycle:
+            cycle, vid = heappop(events)
+            if self._timed_nodes.get(vid) == cycle:
+                due.append(vid)
+        return due
+
+    def eval_timed(self, vid):
+        """ Evaluate vid and schedule it if it returns a delay """
+        was_due = self._timed_nodes.get(vid) == self._current_cycle
+        if was_due:
+            del self._timed_nodes[vid]
+
+        delay = self.eval_vertex_code(vid)
 
-        #print "Step ", self._current_cycle
+        if (delay):
+            self.schedule(vid, int(delay))
+        elif was_due:
+            # When a node return no delay, we stopped the simulation
+            self._stop = True
+            self._nodes_to_reset.append(vid)
+
+    def eval_vertex(self, vid):
+        """ Evaluate the vertex vid and its ancestors """
 
         df = self._dataflow
         actor = df.actor(vid)
@@ -995,74 +1880,123 @@ class DiscreteTimeEvaluation(AbstractEvaluation):
             if (cpt > 0):
                 actor.set_input(df.local_id(pid), inputs)
 
-        # Eval the node
-        delay = 0
-        # When a node return no delay, we stopped the simulation
-        stop_when_finished = False
-
-        if vid in self._timed_nodes:
-            delay = self._timed_nodes[vid]
-            if delay == 0:
-                del self._timed_nodes[vid]
-                stop_when_finished = True
+        # a scheduled node keeps its outputs until it is due
+        if self._timed_nodes.get(vid, self._current_cycle) > self._current_cycle:
+            return
 
-        if delay == 0:
-            delay = self.eval_vertex_code(vid)
+        self.eval_timed(vid)
 
+    def eval_cycle(self, due):
+        """ Evaluate the due vertices and their descendants """
+        df = self._dataflow
+        plan = self.get_plan()
+        position = self._position
+        scope = self._scope
+        cycle = self._current_cycle
+
+        queue = [(position[vid], vid) for vid in due if vid in scope]
+        heapify(queue)
+        visited = set(due)
+        while queue:
+            i, vid = heappop(queue)
+            actor = df.actor(vid)
+            if actor.block:
+                continue
+            if self._timed_nodes.get(vid, cycle) > cycle:
+                continue
 
-        # Reevaluation flag
-        # TODO: Add the node to the scheduler rather to execute
-        if (delay):
-            self._timed_nodes[vid] = int(delay)
-            self.reeval = delay
-        elif stop_when_finished:
-            self._stop = True
-            self._nodes_to_reset.append(vid)
-        elif self._current_cycle > 1000:
-            self._stop = True
+            for input_index, parents in plan.inputs[vid]:
+                inputs = [nactor.get_output(output_index) for npid, nvid, nactor, output_index
+                          in plan.sorted_parents(parents)]
+                # set input as a list or a simple value
+                if len(inputs) == 1:
+                    inputs = inputs[0]
+                actor.set_input(input_index, inputs)
 
-    def eval(self, vtx_id=None, step=False):
-        t0 = clock()
+            self.eval_timed(vid)
 
-        self.clear()
+            for child in plan.children[vid]:
+                if child in scope and child not in visited:
+                    visited.add(child)
+                    heappush(queue, (position[child], child))
 
+    def start(self, vtx_id=None):
+        """ Evaluate the first cycle """
         df = self._dataflow
 
+        self.clear()
+        self._current_cycle = 0
+        self._timed_nodes.clear()
+        del self._events[:]
+
         if (vtx_id is not None):
             leafs = [(vtx_id, df.actor(vtx_id))]
-
         else:
-            # Select the leafs (list of (vid, actor))
-            leafs = [(vid, df.actor(vid))
-                for vid in df.vertices() if df.nb_out_edges(vid)==0]
-
-        leafs.sort(cmp_priority)
+            leafs = self.get_plan().sorted_leaves()
 
-        # Execute
         for vid, actor in leafs:
             if not self.is_stopped(vid, actor):
-                self.reeval = True
-                if not step:
-                    while(self.reeval and not self._stop):
-                        self.clear()
-                        self.eval_vertex(vid)
-                        self.next_step()
-                elif (self.reeval and not self._stop):
-                    self.clear()
-                    self.eval_vertex(vid)
-                    self.next_step()
+                self.eval_vertex(vid)
+
+        self._scope = set(self._evaluated)
+        self._position = dict((vid, i) for i, vid in
+                              enumerate(self.get_plan().order))
+
+    def is_finished(self):
+        """ Return True if the simulation is finished """
+        if self._stop:
+            return True
+        cycle = self.next_cycle()
+        if cycle is None:
+            return True
+        if self.max_cycles is not None and cycle > self.max_cycles:
+            self._stop = True
+            return True
+        return False
 
+    def finish(self):
+        """ Reset the scheduled nodes if the simulation has been stopped """
         if self._stop:
             self._nodes_to_reset.extend(self._timed_nodes)
             for vid in self._nodes_to_reset:
-                df.actor(vid).reset()
+                self._dataflow.actor(vid).reset()
+
+        self.clear()
+        self._timed_nodes.clear()
+        del self._events[:]
+        self._scope = None
+        self._current_cycle = 0
+
+    def step(self, vtx_id=None):
+        """ Evaluate one cycle (the first one if the simulation is not
+        started). Return False when the simulation is finished. """
+        if self._scope is None:
+            self.start(vtx_id)
+        else:
+            self.eval_cycle(self.next_step())
 
-        #print 'Run %d times the dataflow'%(self._current_cycle,)
+        if self.is_finished():
+            self.finish()
+            return False
+        return True
+
+    def run(self, vtx_id=None):
+        """ Evaluate all the cycles of the simulation.
+        Return the number of the last cycle. """
+        self.start(vtx_id)
+        while not self.is_finished():
+            self.eval_cycle(self.next_step())
+        cycle = self._current_cycle
+        self.finish()
+        return cycle
+
+    def eval(self, vtx_id=None, step=False):
+        t0 = clock()
 
-        # Reset the state
-        if not step:
-            self.clear()
-            self._current_cycle = 0
+        if step:
+            self.step(vtx_id)
+        else:
+            self.run(vtx_id)
 
         t1 = clock()
         if quantify:
@@ -1206,128 +2140,403 @@ class SciFlowareEvaluation(AbstractEvaluation):
         return False
 
 
-class TestEval(AbstractEvaluation):
-    """ Basic evaluation algorithm """
-    __evaluators__.append("TestEval")
-
-    def __init__(self, dataflow):
-
-        AbstractEvaluation.__init__(self, dataflow)
-        # a property to specify if the node has already been evaluated
-        self._evaluated = set()
+###############################################################################
+# Distributed evaluation on local sites
 
-        # GENERATE FAKE INFO
-        # provenance
-        p = Prov()
-        p.generate_fake()
-        self.p = p
-        # cache
-        c = Cache_index()
-        c.generate_fake()
-        self.c = c
-        # site cloud
-        m = MultiSiteCloud()
-        m.generate_fake()
-        self.m = m
-        # set input data on site s1:
-        m.list_sites["s1"].add_input_data("2")
-        # scheduling plan
-        self.SP = SchedulingPlan()
+_site_pools = {}
 
 
-    def is_stopped(self, vid, actor):
-        """ Return True if evaluation must be stop at this vertex """
+def _site_worker(tasks, results):
+    """ Main loop of a site process.
 
-        if vid in self._evaluated:
-            return True
+    A new node is instantiated for each task from its (package id,
+    factory name), so that no state is kept between the evaluations.
+    The outputs computed on the site are kept until the evaluation which
+    produced them is released.
+    """
+    from openalea.core.pkgmanager import PackageManager
+
+    factories = {}
+    store = {}
+    while True:
+        msg = tasks.get()
+        if msg is None:
+            break
+
+        if msg[0] == 'release':
+            token = msg[1]
+            for key in [key for key in store if key[0] == token]:
+                del store[key]
+            continue
+
+        _, token, vid, factory_key, inputs = msg
+        try:
+            factory = factories.get(factory_key)
+            if factory is None:
+                pm = PackageManager()
+                pkg_id, name = factory_key
+                if pkg_id not in pm:
+                    pm.init(verbose=False)
+                factory = factories[factory_key] = pm[pkg_id][name]
+            node = factory.instantiate()
+
+            values = []
+            for kind, value in inputs:
+                if kind == 'value':
+                    values.append(value)
+                else:
+                    # outputs stored on the site: value is (single, refs)
+                    single, refs = value
+                    column = [store[(token, pvid)][index] for pvid, index in refs]
+                    values.append(column[0] if single else column)
+
+            t0 = time()
+            node.inputs = values
+            outputs = node.split_outputs(node(values))
+            exec_time = time() - t0
+
+            store[(token, vid)] = outputs
+            ret = (True, (outputs, exec_time, total_size(outputs)))
+        except Exception, e:
+            ret = (False, (repr(e), tb.format_tb(sys.exc_info()[2])))
 
         try:
-            if actor.block:
-                status = True
-                n = actor.get_nb_output()
-                outputs = [i for i in range(n) if actor.get_output(i) is not None ]
-                if not outputs:
-                    status = False
-                return status
-        except:
-            pass
-        return False
+            payload = cPickle.dumps(ret, cPickle.HIGHEST_PROTOCOL)
+        except Exception, e:
+            payload = cPickle.dumps((False, (repr(e), [])), cPickle.HIGHEST_PROTOCOL)
+        results.put((token, vid, payload))
 
-    def eval_vertex(self, vid, *args):
-        """ Evaluate the vertex vid """
-        print "start the evaluation of node : " + str(vid)
-        df = self._dataflow
-        actor = df.actor(vid)
 
-        self._evaluated.add(vid)
+def packages_stamp():
+    """ Return a value which changes when packages are added, removed or
+    reloaded in the PackageManager, or when their factories change """
+    from openalea.core.pkgmanager import PackageManager
+    pkgs = PackageManager().pkgs
+    return (id(pkgs), pkgs.nb_changes,
+            tuple(getattr(pkg, 'nb_changes', None) for pkg in pkgs.itervalues()))
 
-        # For each inputs
-        for pid in df.in_ports(vid):
-            inputs = []
 
-            cpt = 0
-            # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
-                if not self.is_stopped(nvid, nactor):
-                    self.eval_vertex(nvid)
+class SitePool(object):
+    """ A set of worker processes, one per site.
 
-                inputs.append(nactor.get_output(df.local_id(npid)))
-                cpt += 1
+    Tasks are sent to a given site. Results are dispatched by a thread to
+    the queue registered by each evaluation. The processes are forked with
+    the packages of the PackageManager at creation (see packages_stamp).
+    """
 
-            # set input as a list or a simple value
-            if (cpt == 1):
-                inputs = inputs[0]
-            if (cpt > 0):
-                actor.set_input(df.local_id(pid), inputs)
+    def __init__(self, nb_sites):
+        self.stamp = packages_stamp()
+        self.results = multiprocessing.Queue()
+        self.tasks = []
+        self.processes = []
+        for i in range(nb_sites):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_site_worker,
+                                              args=(tasks, self.results))
+            process.daemon = True
+            process.start()
+            self.tasks.append(tasks)
+            self.processes.append(process)
+
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._token = 0
+        dispatcher = threading.Thread(target=self._dispatch)
+        dispatcher.daemon = True
+        dispatcher.start()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def _dispatch(self):
+        while True:
+            msg = self.results.get()
+            if msg is None:
+                break
+            token, vid, payload = msg
+            with self._lock:
+                queue = self._queues.get(token)
+            if queue is not None:
+                queue.put((vid, ('site', payload)))
+
+    def register(self, queue):
+        """ Register the queue of an evaluation and return its token """
+        with self._lock:
+            self._token += 1
+            self._queues[self._token] = queue
+            return self._token
+
+    def release(self, token):
+        """ Forget the data of an evaluation """
+        with self._lock:
+            del self._queues[token]
+        for tasks in self.tasks:
+            tasks.put(('release', token))
+
+    def run(self, site_index, token, vid, factory_key, inputs):
+        """ Evaluate a node on a site """
+        self.tasks[site_index].put(('run', token, vid, factory_key, inputs))
+
+    def in_use(self):
+        """ Return True if evaluations are registered """
+        with self._lock:
+            return bool(self._queues)
+
+    def close(self):
+        """ Stop the processes once their tasks are done """
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join()
+        self.results.put(None)
+
+
+def get_site_pool(nb_sites):
+    """ Return a shared pool of nb_sites processes, created on first use.
+
+    The pool is created again when the packages changed since its creation,
+    unless an evaluation is running on it.
+    """
+    pool = _site_pools.get(nb_sites)
+    if pool is not None and pool.stamp != packages_stamp() and not pool.in_use():
+        pool.close()
+        pool = None
+    if pool is None:
+        pool = _site_pools[nb_sites] = SitePool(nb_sites)
+    return pool
 
-        # Eval the node
-        print "start the execution of node : " + str(vid)
-        t0 = clock()
 
-        best_site, cost = minimum_cost_site(vid=vid, provenance=self.p, multisites=self.m)
-        self.SP.add_to_plan(vid, best_site)
-        self.SP.add_to_cost(cost)
+def shutdown_site_pools():
+    """ Stop the processes of the shared site pools """
+    while _site_pools:
+        nb_sites, pool = _site_pools.popitem()
+        pool.close()
 
+atexit.register(shutdown_site_pools)
 
-        self.eval_vertex_code(vid)
 
-        t1 = clock()
-        if provenance:
-            # print id task
-            print vid
-            # print actor.inputs
+# measures (Prov) of the previous evaluations of each dataflow
+_measures = weakref.WeakKeyDictionary()
 
-            # data info
-            # if inputs:
-            #     for i in inputs:
-            print "size", total_size(actor.inputs)
-            # for o in range(actor.get_nb_output()):
-            #     print "out", actor.get_output(o)
-            print "size out", total_size(actor.outputs)
 
-            # execution info
-            print "Execution time: %s" % (t1 - t0)
+class DistributedEvaluation(ParallelEvaluation):
+    """ Evaluate a dataflow on several sites (local processes).
 
-            # vm info
+    Each site is described by a metadata.cloud_sites.Site (compute cost and
+    transfer costs). A ready vertex is placed on the site with the minimum
+    estimated cost: computation (compute cost * measured exec time) plus
+    transfer of the inputs computed on other sites (transfer cost * measured
+    output size), plus the estimated work already queued on the site.
+    Inputs computed on the selected site are not sent again.
 
+    Nodes are instantiated on the sites from their (package id, factory name).
+    Nodes without package, composite nodes and nodes which redefine the
+    evaluation are evaluated locally.
 
+    Exec times and output sizes are kept (see get_measures) for the next
+    evaluations. After an evaluation, self.plan is the SchedulingPlan of the
+    vertices evaluated on the sites, with their actual costs.
+    """
+    __evaluators__.append("DistributedEvaluation")
 
+    # number of sites, used when no cloud is given (None: number of cpus)
+    nb_sites = None
+    # default costs: a byte costs as much as 10 ns of computation
+    compute_cost = 1.
+    transfer_cost = 1e-8
 
-    def eval(self, *args, **kwgs):
-        """ Evaluate the whole dataflow starting from leaves"""
-        t0 = clock()
+    def __init__(self, dataflow, cloud=None):
+        """
+        :param cloud: a MultiSiteCloud describing the sites (default: nb_sites
+            identical sites)
+        """
+        ParallelEvaluation.__init__(self, dataflow)
+
+        if cloud is None:
+            cloud = self.default_cloud()
+        self.cloud = cloud
+        self.sites = [cloud.list_sites[sid] for sid in sorted(cloud.list_sites)]
+        self.plan = SchedulingPlan()
+        self.measures = self.get_measures()
+
+        self._token = None
+        # vid -> site index of the outputs computed on a site
+        self._location = {}
+        # vid -> (site index, estimated exec time, transfer cost)
+        self._placed = {}
+
+    def default_cloud(self):
+        """ Return a MultiSiteCloud of nb_sites identical sites """
+        nb_sites = self.nb_sites or multiprocessing.cpu_count()
+        cloud = MultiSiteCloud()
+        sites = [Site(sid='s%d' % i, compute_cost=self.compute_cost,
+                      compute_power=1.) for i in range(nb_sites)]
+        cloud.add_sitelist(sites)
+        for i, site1 in enumerate(sites):
+            for site2 in sites[i + 1:]:
+                link_two_sites(site1, site2, self.transfer_cost)
+        return cloud
+
+    def get_measures(self):
+        """ Return the Prov of the dataflow (measures of the evaluations) """
         df = self._dataflow
+        try:
+            return _measures[df]
+        except KeyError:
+            return _measures.setdefault(df, Prov())
+        except TypeError:
+            # not weakly referenceable
+            return Prov()
 
-        # Unvalidate all the nodes
-        self._evaluated.clear()
+    def get_pool(self):
+        return get_site_pool(len(self.sites))
 
-        # Eval from the leaf
-        for vid in (vid for vid in df.vertices() if df.nb_out_edges(vid)==0):
+    def eval(self, vtx_id=None, *args, **kwds):
+        """ Evaluate the dataflow (from vtx_id if not None) """
+        if getattr(_worker_local, 'in_worker', False):
+            return PriorityEvaluation.eval(self, vtx_id, *args, **kwds)
+
+        pool = self.get_pool()
+        self.plan = SchedulingPlan()
+        self._location.clear()
+        self._placed.clear()
+        for site in self.sites:
+            site.free()
+
+        self._token = pool.register(self._done)
+        try:
+            ParallelEvaluation.eval(self, vtx_id, *args, **kwds)
+        finally:
+            pool.release(self._token)
+            self._token = None
+
+    def factory_key(self, node):
+        """ Return the (package id, factory name) used to instantiate node on
+        a site or None if node has to be evaluated locally """
+        factory = getattr(node, 'factory', None)
+        if factory is None or not factory.is_node():
+            return None
+        if node.__class__.eval.im_func is not Node.eval.im_func:
+            return None
+        pkg = factory.package
+        if pkg is None:
+            return None
+        return (pkg.get_id(), factory.name)
+
+    def estimated_time(self, vid):
+        """ Return the measured exec time of vid, or the mean exec time """
+        item = self.measures.check_prov(str(vid))
+        if item is not None:
+            return item.exec_time
+        times = [item.exec_time for item in self.measures.prov.itervalues()]
+        if times:
+            return sum(times) / len(times)
+        return 1e-3
+
+    def output_size(self, vid):
+        item = self.measures.check_prov(str(vid))
+        return 0 if item is None else item.output_size
+
+    def place(self, vid):
+        """ Return (site index, estimated exec time, transfer cost) of vid """
+        exec_time = self.estimated_time(vid)
+        parents = set(nvid for index, connections in self._inputs[vid]
+                      for nvid, out_index in connections
+                      if nvid in self._location)
+
+        best = None
+        for i, site in enumerate(self.sites):
+            transfer = 0.
+            for nvid in parents:
+                src = self.sites[self._location[nvid]]
+                if src is not site:
+                    transfer += site.transfer_cost.get(src.sid, 0.) * self.output_size(nvid)
+            cost = (site.compute_cost * (exec_time + site.buzyness) + transfer)
+            if best is None or cost < best[0]:
+                best = (cost, i, transfer)
+
+        cost, index, transfer = best
+        return index, exec_time, transfer
+
+    def remote_inputs(self, vid, site_index):
+        """ Return the inputs of vid to send to a site.
+
+        Ports whose parents were all evaluated on the site refer to
+        the outputs stored on the site.
+        """
+        actor = self._dataflow.actor(vid)
+        connected = dict(self._inputs[vid])
+        inputs = []
+        for i, value in enumerate(actor.inputs):
+            connections = connected.get(i)
+            if connections and all(self._location.get(nvid) == site_index
+                                   for nvid, out_index in connections):
+                inputs.append(('ref', (len(connections) == 1, connections)))
+            else:
+                inputs.append(('value', value))
+        return inputs
 
-            self.eval_vertex(vid)
+    def submit(self, pool, vid):
+        """ Set the inputs of vid and evaluate it on a site """
+        self.set_vertex_inputs(vid)
 
-        print "end evaluation - Scheduling plan : ", str(self.SP.plan)
-        print "total cost : ", str(self.SP.cost)
-        t1 = clock()
-        if quantify:
-            print "Evaluation time: %s"%(t1-t0)
+        node = self._dataflow.actor(vid)
+        key = self.factory_key(node)
+        cache = self.result_cache
+        if (key is None or node.is_up_to_date() or
+            (cache is not None and cache.node_key(node) in cache)):
+            # Evaluate the node locally
+            self._done.put(self.eval_task(vid))
+            return
+
+        index, exec_time, transfer = self.place(vid)
+        inputs = self.remote_inputs(vid, index)
+        try:
+            cPickle.dumps(inputs, cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self._done.put(self.eval_task(vid))
+            return
+
+        self._placed[vid] = (index, exec_time, transfer)
+        self.sites[index].increase_workload(exec_time)
+        node.notify_listeners(("start_eval",))
+        pool.run(index, self._token, vid, key, inputs)
+
+    def complete(self, vid, result):
+        """ Finalize the evaluation of vid, update the measures and the plan.
+
+        Raise an EvaluationException if the evaluation has failed.
+        """
+        kind, value = result
+        if kind == 'local':
+            return self.complete_local(value)
+
+        node = self._dataflow.actor(vid)
+        index, estimated_time, transfer = self._placed.pop(vid)
+        site = self.sites[index]
+        site.increase_workload(-estimated_time)
+
+        success, ret = cPickle.loads(value)
+        node.raise_exception = not success
+        if not success:
+            node.notify_listeners(('data_modified', None, None))
+            message, exc_info = ret
+            raise EvaluationException(vid, node, Exception(message), exc_info)
+
+        outputs, exec_time, output_size = ret
+        node.end_eval(outputs)
+        node.notify_listeners(('data_modified', None, None))
+        self._location[vid] = index
+
+        input_size = sum(self.output_size(nvid)
+                         for i, connections in self._inputs[vid]
+                         for nvid, out_index in connections)
+        self.measures.add_prov_item(Prov_item(str(vid), exec_time,
+                                              input_size, output_size))
+
+        self.plan.add_to_plan(vid, site.sid)
+        self.plan.add_to_cost(float(site.compute_cost * exec_time + transfer))
+
+
+# Former name of the distributed evaluation
+TestEval = DistributedEvaluation
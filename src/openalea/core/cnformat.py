@@ -0,0 +1,592 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Compact format of the packages of composite nodes.
+
+A package is stored in a __wralea__.json (text) or __wralea__.bin
+(binary) file::
+
+    {"format": "openalea.package", "version": 1,
+     "name": ..., "metainfo": {...}, "alias": [...],
+     "data": "__wralea__.data",
+     "factories": [{"name": ..., "elt_factory": ..., ...}, ...]}
+
+The python values which have no equivalent in the file format (tuples
+in JSON, interfaces, ...) are stored as {"$t": type, "v": value}.
+Values which can not be encoded are stored with their repr.
+
+The binary file is BIN_MAGIC, one byte for the version of the marshal
+format (MARSHAL_VERSION, see the marshal module) and the marshal data.
+The file is rejected if the header does not match, and if the data
+contains other types than None, bool, int, long, float, complex, str,
+unicode, list, tuple, set, frozenset and dict (e.g. code objects).
+
+The input values larger than BLOB_SIZE are stored out of line in the
+data file. They are read (with mmap) the first time the factory is
+instantiated.
+
+The reader never evaluates python code: input values are decoded once
+and given to the factory in elt_decoded. Only the input values stored
+with their repr are evaluated at instantiation, like in the python
+format.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import json
+import mmap
+import marshal
+from ast import literal_eval
+
+from openalea.core.compositenode import CompositeNodeFactory
+from openalea.core.interface import IInterface, IInterfaceMetaClass
+from openalea.core.interface import TypeNameInterfaceMap
+from openalea.core.metadatadict import MetaDataDict
+
+FORMAT = 'openalea.package'
+FORMAT_VERSION = 1
+WRALEA_JSON = '__wralea__.json'
+WRALEA_BIN = '__wralea__.bin'
+BLOB_SIZE = 4096
+
+BIN_MAGIC = '\x89OAPKG\r\n'
+MARSHAL_VERSION = 2
+
+TAG = '$t'
+
+FACTORY_ATTRIBUTES = ('name', 'description', 'category', 'doc', 'inputs',
+                      'outputs', 'lazy', 'eval_algo')
+
+# types which are stored as they are
+_plain_types = frozenset([int, long, float, bool, type(None)])
+_native_types = _plain_types | frozenset([str, unicode, complex])
+_native_containers = (list, tuple, set, frozenset)
+
+
+class FormatError(Exception):
+    pass
+
+
+def _is_ascii(s):
+    try:
+        s.decode('ascii')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _metadata_values(md):
+    """ Return the values of a MetaDataDict (as in its repr) """
+    return dict((k, md._metaValues.get(k)) for k in md.keys())
+
+
+class JSONCodec(object):
+    """ Text format """
+    name = 'json'
+    native = False
+
+    def dumps(self, d):
+        return json.dumps(d, separators=(',', ':'))
+
+    def loads(self, data):
+        try:
+            return json.loads(data)
+        except ValueError, e:
+            raise FormatError(str(e))
+
+
+def check_native(data):
+    """ Raise FormatError if data contains other types than the native
+    types of the binary format.
+    """
+    native = _native_types
+    stack = [data]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        obj = pop()
+        cls = type(obj)
+        # only the containers are pushed, most items are scalars
+        if cls is dict:
+            for k in obj:
+                if type(k) not in native:
+                    push(k)
+            for v in obj.itervalues():
+                if type(v) not in native:
+                    push(v)
+        elif cls in _native_containers:
+            for v in obj:
+                if type(v) not in native:
+                    push(v)
+        elif cls not in native:
+            raise FormatError('Unexpected type: %s' % cls.__name__)
+
+
+class BinaryCodec(object):
+    """ Binary format: the python types are stored natively """
+    name = 'bin'
+    native = True
+
+    def dumps(self, d):
+        return BIN_MAGIC + chr(MARSHAL_VERSION) + \
+            marshal.dumps(d, MARSHAL_VERSION)
+
+    def loads(self, data):
+        header = len(BIN_MAGIC)
+        if not data.startswith(BIN_MAGIC) or len(data) == header:
+            raise FormatError('Not an OpenAlea binary file')
+        if ord(data[header]) != MARSHAL_VERSION:
+            raise FormatError('Unsupported marshal version: %d'
+                              % ord(data[header]))
+        try:
+            d = marshal.loads(data[header + 1:])
+        except (ValueError, EOFError, TypeError), e:
+            raise FormatError(str(e))
+        check_native(d)
+        return d
+
+
+def get_codec(name):
+    """ Return the codec of a file name or of a codec name """
+    if name.endswith('bin'):
+        return BinaryCodec()
+    return JSONCodec()
+
+
+###############################################################################
+# Values
+###############################################################################
+
+def is_native(obj):
+    """ Return True if obj can be stored as is in the binary format """
+    cls = type(obj)
+    if cls in _native_types:
+        return True
+    elif cls in _native_containers:
+        for v in obj:
+            if not is_native(v):
+                return False
+        return True
+    elif cls is dict:
+        if TAG in obj:
+            return False
+        for k, v in obj.iteritems():
+            if not is_native(k) or not is_native(v):
+                return False
+        return True
+    return False
+
+
+def encode_value(obj, native=False):
+    """ Return the representation of obj.
+
+    If native is True, the python types supported by the binary format
+    are not converted.
+    """
+    cls = type(obj)
+    if cls in _plain_types:
+        return obj
+    elif native and is_native(obj):
+        return obj
+    elif cls is str:
+        if _is_ascii(obj):
+            return obj
+        return {TAG: 'bytes', 'v': obj.decode('latin-1')}
+    elif cls is unicode:
+        return {TAG: 'unicode', 'v': obj}
+    elif cls is list:
+        return [encode_value(v, native) for v in obj]
+    elif cls in (tuple, set, frozenset):
+        return {TAG: cls.__name__, 'v': [encode_value(v, native) for v in obj]}
+    elif cls is dict:
+        if (not native and TAG not in obj and
+                all(type(k) is str and _is_ascii(k) for k in obj)):
+            return dict((k, encode_value(v)) for k, v in obj.iteritems())
+        return {TAG: 'dict', 'v': [[encode_value(k, native),
+                                    encode_value(v, native)]
+                                   for k, v in obj.iteritems()]}
+    elif cls is complex:
+        return {TAG: 'complex', 'v': [obj.real, obj.imag]}
+    elif isinstance(obj, MetaDataDict):
+        # as in the python format, only the values are stored
+        return encode_value(_metadata_values(obj), native)
+    elif isinstance(obj, IInterfaceMetaClass):
+        return {TAG: 'interface', 'v': obj.__name__}
+    elif isinstance(obj, IInterface):
+        return {TAG: 'interface', 'v': obj.__class__.__name__,
+                'args': encode_value(vars(obj), native)}
+    else:
+        return {TAG: 'repr', 'v': repr(obj)}
+
+
+def decode_value(data, native=False):
+    """ Return the python value of a representation """
+    cls = type(data)
+    if cls in _plain_types:
+        return data
+    elif cls is unicode:
+        if native:
+            return data
+        try:
+            return str(data)
+        except UnicodeEncodeError:
+            return data
+    elif cls is list:
+        return [v if type(v) in _plain_types else decode_value(v, native)
+                for v in data]
+    elif cls in _native_containers:
+        return cls(decode_value(v, native) for v in data)
+    elif cls is not dict:
+        return data
+
+    tag = data.get(TAG)
+    if tag is None:
+        if native:
+            return dict((k, decode_value(v, native))
+                        for k, v in data.iteritems())
+        return dict((str(k), v if type(v) in _plain_types
+                     else decode_value(v, native))
+                    for k, v in data.iteritems())
+
+    v = data['v']
+    if tag == 'tuple':
+        return tuple(decode_value(x, native) for x in v)
+    elif tag == 'set':
+        return set(decode_value(x, native) for x in v)
+    elif tag == 'frozenset':
+        return frozenset(decode_value(x, native) for x in v)
+    elif tag == 'dict':
+        return dict((decode_value(k, native), decode_value(x, native))
+                    for k, x in v)
+    elif tag == 'unicode':
+        return v
+    elif tag == 'bytes':
+        return v.encode('latin-1')
+    elif tag == 'complex':
+        return complex(*v)
+    elif tag == 'interface':
+        interface = TypeNameInterfaceMap().get(str(v))
+        if interface is None:
+            return str(v)
+        if 'args' in data:
+            try:
+                return interface(**decode_value(data['args'], native))
+            except TypeError:
+                pass
+        return interface
+    elif tag == 'repr':
+        try:
+            return literal_eval(v)
+        except (ValueError, SyntaxError):
+            return str(v)
+    else:
+        raise FormatError('Unknown type: %s' % tag)
+
+
+class OutOfLineValue(object):
+    """ Input value stored in the data file of a package """
+
+    def __init__(self, filename, offset, size, codec=None):
+        self.filename = filename
+        self.offset = offset
+        self.size = size
+        # name of the codec of the value, None for raw strings
+        self.codec = codec
+
+    def read(self):
+        """ Return the stored bytes """
+        f = open(self.filename, 'rb')
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return m[self.offset:self.offset + self.size]
+            finally:
+                m.close()
+        finally:
+            f.close()
+
+    def load(self):
+        """ Return the value """
+        data = self.read()
+        if self.codec is None:
+            return data
+        codec = get_codec(self.codec)
+        return decode_value(codec.loads(data), codec.native)
+
+    def __repr__(self):
+        return '<OutOfLineValue %s[%d:%d]>' % (self.filename, self.offset,
+                                               self.offset + self.size)
+
+
+class DataWriter(object):
+    """ Write the out of line values of a package """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.chunks = []
+        self.size = 0
+
+    def add(self, data, raw=False):
+        """ Store data and return its reference """
+        self.chunks.append(data)
+        offset = self.size
+        self.size += len(data)
+        return {TAG: 'data', 'v': [offset, len(data)], 'raw': raw}
+
+    def write(self):
+        f = open(self.filename, 'wb')
+        try:
+            f.writelines(self.chunks)
+        finally:
+            f.close()
+
+
+###############################################################################
+# Factories
+###############################################################################
+
+def encode_input_value(v, codec, data_writer=None):
+    """ Return the representation of an elt_value repr string """
+    if isinstance(v, OutOfLineValue):
+        value = v.load()
+    else:
+        try:
+            value = literal_eval(v)
+        except (ValueError, SyntaxError):
+            return {TAG: 'repr', 'v': v}
+
+    if type(value) is str and len(value) > BLOB_SIZE:
+        if data_writer is not None:
+            return data_writer.add(value, raw=True)
+        return value
+
+    encoded = encode_value(value, codec.native)
+    if data_writer is not None:
+        data = codec.dumps(encoded)
+        if len(data) > BLOB_SIZE:
+            return data_writer.add(data)
+    return encoded
+
+
+def encode_records(records):
+    """ Return the JSON representation of a dict of element data.
+
+    The keys of the data are stored once for all the elements which
+    have the same keys::
+
+        {"keys": [keys], "rows": [[vid, keys index, values]]}
+    """
+    keys = []
+    index = {}
+    rows = []
+    for vid, data in records.iteritems():
+        if type(data) is not dict or TAG in data:
+            rows.append([encode_value(vid), -1, encode_value(data)])
+            continue
+
+        k = tuple(sorted(data))
+        i = index.get(k)
+        if i is None:
+            i = index[k] = len(keys)
+            keys.append(list(k))
+        rows.append([encode_value(vid), i,
+                     [encode_value(data[x]) for x in k]])
+    return dict(keys=keys, rows=rows)
+
+
+def decode_records(d):
+    """ Return the dict of element data of encode_records """
+    keys = [[str(k) for k in ks] for ks in d['keys']]
+    records = {}
+    for vid, i, data in d['rows']:
+        if i < 0:
+            data = decode_value(data)
+        else:
+            data = dict(zip(keys[i], decode_value(data)))
+        records[decode_value(vid)] = data
+    return records
+
+
+def factory_to_dict(factory, codec=None, data_writer=None):
+    """ Return the representation of a CompositeNodeFactory.
+
+    In the binary format, the attributes which only contain native
+    python types are stored as they are and listed in 'plain'.
+    """
+    if codec is None:
+        codec = JSONCodec()
+    native = codec.native
+
+    attributes = dict((k, getattr(factory, k)) for k in FACTORY_ATTRIBUTES)
+    attributes['elt_factory'] = factory.elt_factory
+    attributes['elt_connections'] = factory.connections
+    attributes['elt_data'] = factory.elt_data
+    attributes['elt_ad_hoc'] = dict((vid, _metadata_values(data)
+                                     if isinstance(data, MetaDataDict)
+                                     else data)
+                                    for vid, data
+                                    in factory.elt_ad_hoc.iteritems())
+
+    if native:
+        d = dict(plain=[])
+        for k, v in attributes.iteritems():
+            if is_native(v):
+                d[k] = v
+                d['plain'].append(k)
+            else:
+                d[k] = encode_value(v, native)
+    else:
+        d = dict((k, encode_value(attributes[k])) for k in FACTORY_ATTRIBUTES)
+        d['elt_factory'] = [encode_value([vid, pkg_id, factory_id])
+                            for vid, (pkg_id, factory_id)
+                            in factory.elt_factory.iteritems()]
+        d['elt_connections'] = [encode_value([eid] + list(link))
+                                for eid, link
+                                in factory.connections.iteritems()]
+        d['elt_data'] = encode_records(attributes['elt_data'])
+        d['elt_ad_hoc'] = encode_records(attributes['elt_ad_hoc'])
+
+    d['elt_value'] = elt_value = []
+    for vid, values in factory.elt_value.iteritems():
+        elt_value.append([encode_value(vid, native),
+                          [[encode_value(vs[0], native),
+                            encode_input_value(vs[1], codec, data_writer)]
+                           for vs in values]])
+    return d
+
+
+def factory_from_dict(d, codec=None, data_filename=None):
+    """ Return the CompositeNodeFactory of a representation """
+    if codec is None:
+        codec = JSONCodec()
+    native = codec.native
+
+    if native:
+        plain = set(d['plain'])
+        kwds = dict((k, d[k] if k in plain else decode_value(d[k], native))
+                    for k in FACTORY_ATTRIBUTES + ('elt_factory',
+                                                   'elt_connections',
+                                                   'elt_data', 'elt_ad_hoc')
+                    if k in d)
+    else:
+        kwds = dict((k, decode_value(d[k])) for k in FACTORY_ATTRIBUTES
+                    if k in d)
+        kwds['elt_factory'] = dict((vid, (pkg_id, fid)) for vid, pkg_id, fid
+                                   in decode_value(d['elt_factory']))
+        kwds['elt_connections'] = dict((link[0], tuple(link[1:])) for link
+                                       in decode_value(d['elt_connections']))
+        kwds['elt_data'] = decode_records(d['elt_data'])
+        kwds['elt_ad_hoc'] = decode_records(d['elt_ad_hoc'])
+
+    elt_value = kwds['elt_value'] = {}
+    elt_decoded = kwds['elt_decoded'] = {}
+    for vid, values in d['elt_value']:
+        vid = decode_value(vid, native)
+        elt_value[vid] = l = []
+        for port, data in values:
+            port = decode_value(port, native)
+            tag = data.get(TAG) if type(data) is dict else None
+            if tag == 'repr':
+                l.append((port, str(data['v'])))
+                continue
+            elif tag == 'data':
+                if data_filename is None:
+                    raise FormatError('No data file for the out of line values')
+                offset, size = data['v']
+                value = OutOfLineValue(data_filename, offset, size,
+                                       None if data['raw'] else codec.name)
+                l.append((port, value))
+            else:
+                value = decode_value(data, native)
+                l.append((port, repr(value)))
+            elt_decoded[(vid, port)] = value
+
+    return CompositeNodeFactory(**kwds)
+
+
+###############################################################################
+# Packages
+###############################################################################
+
+def write_package(pkg, dirname, alias=(), binary=False):
+    """ Write the composite node factories of pkg in dirname.
+
+    :param alias: the package aliases
+    :param binary: write a __wralea__.bin file instead of __wralea__.json
+
+    Return the name of the written file.
+    """
+    filename = os.path.join(dirname, WRALEA_BIN if binary else WRALEA_JSON)
+    codec = get_codec(filename)
+    data_filename = os.path.splitext(filename)[0] + '.data'
+    data_writer = DataWriter(data_filename)
+
+    factories = []
+    for name in sorted(pkg.get_names()):
+        factory = pkg[name]
+        if not isinstance(factory, CompositeNodeFactory):
+            raise FormatError('%s is not a composite node factory' % name)
+        # skip the aliases
+        if name == factory.name:
+            factories.append(factory_to_dict(factory, codec, data_writer))
+
+    d = dict(format=FORMAT,
+             version=FORMAT_VERSION,
+             name=encode_value(pkg.name, codec.native),
+             metainfo=encode_value(pkg.metainfo, codec.native),
+             alias=encode_value(list(alias), codec.native),
+             data=None,
+             factories=factories)
+
+    if data_writer.chunks:
+        data_writer.write()
+        d['data'] = os.path.basename(data_filename)
+    elif os.path.exists(data_filename):
+        os.remove(data_filename)
+
+    f = open(filename, 'wb')
+    try:
+        f.write(codec.dumps(d))
+    finally:
+        f.close()
+    return filename
+
+
+def read_package(filename):
+    """ Return (name, metainfo, alias, factories) of a package file """
+    codec = get_codec(filename)
+    f = open(filename, 'rb')
+    try:
+        d = codec.loads(f.read())
+    finally:
+        f.close()
+
+    if type(d) is not dict or d.get('format') != FORMAT:
+        raise FormatError('%s is not an OpenAlea package' % filename)
+    if d.get('version', 0) > FORMAT_VERSION:
+        raise FormatError('%s: unsupported version %s'
+                          % (filename, d.get('version')))
+
+    data_filename = None
+    if d.get('data'):
+        data_filename = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                                     d['data'])
+
+    native = codec.native
+    factories = [factory_from_dict(fd, codec, data_filename)
+                 for fd in d['factories']]
+    return (decode_value(d['name'], native),
+            decode_value(d['metainfo'], native),
+            decode_value(d.get('alias', []), native), factories)
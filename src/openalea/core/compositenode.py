@@ -34,10 +34,38 @@ from openalea.core.package import UnknownNodeError
 from openalea.core.dataflow import DataFlow, InvalidEdge, PortError
 from openalea.core.settings import Settings
 from openalea.core.metadatadict import MetaDataDict
+from openalea.core import observer
 import logger
 
 quantify = False
 
+# types copied by reference by _copy
+_atomic_types = (type(None), bool, int, long, float, complex, str, unicode)
+
+
+def _copy(obj):
+    """ Fast deepcopy of the plain python structures of the factories """
+    cls = type(obj)
+    if cls in _atomic_types:
+        return obj
+    elif cls is dict:
+        return dict((k, _copy(v)) for k, v in obj.iteritems())
+    elif cls is list:
+        return [_copy(v) for v in obj]
+    elif cls is tuple:
+        return tuple([_copy(v) for v in obj])
+    elif cls is set:
+        return set([_copy(v) for v in obj])
+    elif cls is MetaDataDict:
+        ret = MetaDataDict()
+        ret.update(obj)
+        for k, v in ret._metaValues.iteritems():
+            ret._metaValues[k] = _copy(v)
+        return ret
+    else:
+        return copy.deepcopy(obj)
+
+
 class IncompatibleNodeError(Exception):
     """todo"""
     pass
@@ -63,6 +91,8 @@ class CompositeNodeFactory(AbstractFactory):
         - elt_connections: map of ( dst_id , input_port ):(src_id,output_port)
         - elt_data: Dictionary containing associated data
         - elt_value: Dictionary containing Lists of 2-uples (port, value)
+        - elt_decoded: Dictionary mapping (elt_id, port) to the input values
+          already decoded by the reader (used instead of evaluating elt_value)
         """
         # Init parent (name, description, category, doc, node, widget=None)
         AbstractFactory.__init__(self, *args, **kargs)
@@ -81,6 +111,7 @@ class CompositeNodeFactory(AbstractFactory):
         self.elt_data = kargs.get("elt_data", {})
         self.elt_value = kargs.get("elt_value", {})
         self.elt_ad_hoc = kargs.get("elt_ad_hoc", {})
+        self.elt_decoded = kargs.get("elt_decoded", {})
         from openalea.core.algo.dataflow_evaluation import DefaultEvaluation
         self.eval_algo = kargs.get("eval_algo", DefaultEvaluation.__name__)
 
@@ -88,6 +119,17 @@ class CompositeNodeFactory(AbstractFactory):
         self.doc = kargs.get('doc', "")
         self.__doc__ = self.doc
 
+        # decoded elements used by instantiate (see get_prototype)
+        self._prototype = None
+
+    _prototype = None
+    elt_decoded = {}
+
+    def __getstate__(self):
+        odict = AbstractFactory.__getstate__(self)
+        odict['_prototype'] = None
+        return odict
+
     def is_composite_node(self):
         return True
 
@@ -100,6 +142,93 @@ class CompositeNodeFactory(AbstractFactory):
         self.connections.clear()
         self.elt_data.clear()
         self.elt_value.clear()
+        self.elt_decoded.clear()
+        self.invalidate_prototype()
+
+    def invalidate_prototype(self):
+        """ Forget the decoded elements.
+
+        Has to be called when the elt_* dictionaries are modified
+        directly.
+        """
+        self._prototype = None
+
+    def find_factory(self, package_id, factory_id):
+        """ Return the factory of an element or None if it is unknown """
+        pkgmanager = PackageManager()
+        try:
+            pkg = pkgmanager[package_id]
+            try:
+                return pkg.get_factory(factory_id)
+            except UnknownNodeError:
+                # Bug when both package_id and protected(package_id) exist
+                pkg = pkgmanager[protected(package_id)]
+                return pkg.get_factory(factory_id)
+        except (UnknownNodeError, UnknownPackageError):
+            return None
+
+    def get_prototype(self):
+        """ Return the decoded elements of the factory.
+
+        The prototype maps each element id to its factory, its internal
+        data, its ad hoc data and its decoded input values. It is built
+        at the first instantiation and rebuilt when one of the element
+        factories changed (e.g. after a package reload).
+        """
+        proto = self._prototype
+        if proto is not None:
+            for (pkg_id, factory_id), factory in proto['factories'].iteritems():
+                if self.find_factory(pkg_id, factory_id) is not factory:
+                    proto = None
+                    break
+
+        if proto is None:
+            proto = self._prototype = self._build_prototype()
+        return proto
+
+    def _elt_input_value(self, vid, port, v):
+        """ Return the value of the input port of element vid, decoded by
+        the reader or evaluated from its repr v.
+        """
+        from openalea.core.cnformat import OutOfLineValue
+
+        if (vid, port) in self.elt_decoded:
+            value = self.elt_decoded[(vid, port)]
+            if isinstance(value, OutOfLineValue):
+                value = value.load()
+            return value
+        return eval(v)
+
+    def _build_prototype(self):
+        factories = {}
+        elements = {}
+        for vid, key in self.elt_factory.iteritems():
+            if key not in factories:
+                factories[key] = self.find_factory(*key)
+
+            values = []
+            for vs in self.elt_value.get(vid, ()):
+                try:
+                    #the two first elements are the historical
+                    #values : port Id and port value
+                    #the values beyond are not used.
+                    port, v = vs[:2]
+                    value = self._elt_input_value(vid, port, v)
+                    values.append((port, value, v))
+                except:
+                    continue
+
+            elements[vid] = (factories[key],
+                             _copy(self.elt_data[vid]),
+                             _copy(self.elt_ad_hoc.get(vid, None)),
+                             values)
+
+        connections = []
+        for eid, link in self.connections.iteritems():
+            connections.append(link)
+
+        return dict(factories=factories, elements=elements,
+                    connections=connections)
 
     def copy(self, **args):
         """
@@ -155,10 +284,13 @@ class CompositeNodeFactory(AbstractFactory):
 
         cont_eval = set() # continuous evaluated nodes
 
+        prototype = self.get_prototype()
+        new_df.reserve_vertices(self.elt_factory)
+
         # Instantiate the node with each factory
         for vid in self.elt_factory:
             try:
-                node = self.instantiate_node(vid, call_stack)
+                node = self.instantiate_node(vid, call_stack, prototype)
 
                 # Manage continuous eval
                 if(node.user_application):
@@ -178,16 +310,16 @@ class CompositeNodeFactory(AbstractFactory):
         # Set IO internal data
         try:
             self.load_ad_hoc_data(new_df.node(new_df.id_in),
-                                  copy.deepcopy(self.elt_data["__in__"]),
-                                  copy.deepcopy(self.elt_ad_hoc.get("__in__", None)))
+                                  _copy(self.elt_data["__in__"]),
+                                  _copy(self.elt_ad_hoc.get("__in__", None)))
             self.load_ad_hoc_data(new_df.node(new_df.id_out),
-                                  copy.deepcopy(self.elt_data["__out__"]),
-                                  copy.deepcopy(self.elt_ad_hoc.get("__out__", None)))
+                                  _copy(self.elt_data["__out__"]),
+                                  _copy(self.elt_ad_hoc.get("__out__", None)))
         except:
             pass
 
         # Create the connections
-        for eid, link in self.connections.iteritems():
+        for link in prototype['connections']:
             (source_vid, source_port, target_vid, target_port) = link
 
             # Replace id for in and out nodes
@@ -249,7 +381,7 @@ class CompositeNodeFactory(AbstractFactory):
                 #beyond that are extensions added by gengraph:
                 #the ad_hoc_dict representation is third.
                 port, v = vs[:2]
-                node.set_input(port, eval(v))
+                node.set_input(port, _copy(self._elt_input_value(vid, port, v)))
                 if(len(vs)>2):
                     d = MetaDataDict(vs[2])
                     node.input_desc[port].get_ad_hoc_dict().update(d)
@@ -274,10 +406,11 @@ class CompositeNodeFactory(AbstractFactory):
 
         # map to convert id
         idmap = {}
+        prototype = self.get_prototype()
 
         # Instantiate the node with each factory
         for vid in self.elt_factory:
-            n = self.instantiate_node(vid, call_stack)
+            n = self.instantiate_node(vid, call_stack, prototype)
 
             # Apply modifiers (if callable)
             for (key, func) in data_modifiers:
@@ -310,8 +443,9 @@ class CompositeNodeFactory(AbstractFactory):
     def load_ad_hoc_data(self, node, elt_data, elt_ad_hoc=None):
         if elt_ad_hoc and len(elt_ad_hoc):
             #reading 0.8+ files.
-            d = MetaDataDict(dict=elt_ad_hoc)
-            node.get_ad_hoc_dict().update(d)
+            if not isinstance(elt_ad_hoc, MetaDataDict):
+                elt_ad_hoc = MetaDataDict(dict=elt_ad_hoc)
+            node.get_ad_hoc_dict().update(elt_ad_hoc)
         else:
             #extracting ad hoc data from old files.
             #we parse the Node class' __ad_hoc_from_old_map__
@@ -335,40 +469,34 @@ class CompositeNodeFactory(AbstractFactory):
         node._init_internal_data(elt_data)
 #        node.internal_data.update(elt_data)
 
-    def instantiate_node(self, vid, call_stack=None):
+    def instantiate_node(self, vid, call_stack=None, prototype=None):
         """ Partial instantiation
 
         instantiate only elt_id in CompositeNode
 
         :param call_stack: a list of parent id (to avoid infinite recursion)
+        :param prototype: the prototype of the factory (see get_prototype)
         """
-        (package_id, factory_id) = self.elt_factory[vid]
-        pkgmanager = PackageManager()
-        pkg = pkgmanager[package_id]
-        try:
-            factory = pkg.get_factory(factory_id)
-        except UnknownNodeError, e:
-            # Bug when both package_id and protected(package_id) exist
-            pkg = pkgmanager[protected(package_id)]
-            factory = pkg.get_factory(factory_id)
+        if prototype is None:
+            prototype = self.get_prototype()
+        factory, attributes, ad_hoc, values = prototype['elements'][vid]
 
+        if factory is None:
+            raise UnknownNodeError("%s.%s" % self.elt_factory[vid])
 
         node = factory.instantiate(call_stack)
 
-        attributes = copy.deepcopy(self.elt_data[vid])
-        ad_hoc     = copy.deepcopy(self.elt_ad_hoc.get(vid, None))
-        self.load_ad_hoc_data(node, attributes, ad_hoc)
+        self.load_ad_hoc_data(node, _copy(attributes), _copy(ad_hoc))
 
         # copy node input data if any
-        values = copy.deepcopy(self.elt_value.get(vid, ()))
-
-        for vs in values:
+        for port, value, v in values:
             try:
-                #the two first elements are the historical
-                #values : port Id and port value
-                #the values beyond are not used.
-                port, v = vs[:2]
-                node.set_input(port, eval(v))
+                try:
+                    value = _copy(value)
+                except:
+                    # value which can not be copied
+                    value = eval(v)
+                node.set_input(port, value)
                 node.input_desc[port].get_ad_hoc_dict().set_metadata("hide",
                                                                      node.is_port_hidden(port))
             except:
@@ -415,6 +543,8 @@ class CompositeNode(Node, DataFlow):
 
         self.id_in = None
         self.id_out = None
+        # compiled evaluation plan (see get_eval_plan)
+        self._eval_plan = None
         Node.__init__(self, inputs, outputs)
         # graph modification status
         self.graph_modified = False
@@ -519,11 +649,42 @@ class CompositeNode(Node, DataFlow):
 
         return self.eval_algo
 
-    def eval_as_expression(self, vtx_id=None, step=False):
+    def get_eval_plan(self):
+        """ Return the EvaluationPlan of the graph.
+
+        The plan is built on first use and kept until the graph is modified.
+        """
+        if self._eval_plan is None:
+            from openalea.core.algo.dataflow_evaluation import EvaluationPlan
+            self._eval_plan = EvaluationPlan(self)
+        return self._eval_plan
+
+    def invalidate_eval_plan(self):
+        """ Discard the evaluation plan after a modification of the graph """
+        self._eval_plan = None
+
+    def __getstate__(self):
+        odict = Node.__getstate__(self)
+        odict['_eval_plan'] = None
+        return odict
+
+    def __setstate__(self, dict):
+        Node.__setstate__(self, dict)
+        self.__dict__.setdefault('_eval_plan', None)
+        # dataflows saved without the port index (and with sets of edges).
+        # The copy pickled through the weak proxy of the children is
+        # restored before the graph, it is left as is.
+        if '_local_ports' not in dict and self._vertex_property:
+            self.rebuild_port_index()
+
+    def eval_as_expression(self, vtx_id=None, step=False, notification_mode=None):
         """
         Evaluate a vtx_id
 
         if node_id is None, then all the nodes without sons are evaluated
+
+        notification_mode may be 'quiet' or 'batch' (see observer.notification_mode),
+        the default is the one of the evaluation algorithm.
         """
         import time
         t0 = time.time()
@@ -532,10 +693,13 @@ class CompositeNode(Node, DataFlow):
         if(vtx_id != None):
             self.node(vtx_id).modified = True
         algo = self.get_eval_algo()
+        if notification_mode is None:
+            notification_mode = algo.notification_mode
 
         try:
             self.evaluating = True
-            algo.eval(vtx_id,step=step)
+            with observer.notification_mode(notification_mode):
+                algo.eval(vtx_id,step=step)
         finally:
             self.evaluating = False
         t1 = time.time()
@@ -557,6 +721,21 @@ class CompositeNode(Node, DataFlow):
 
         return False
 
+    def eval_batch(self, list_of_inputs):
+        """
+        Evaluate the graph for each tuple of input values of list_of_inputs
+        and return the list of output columns (a list of values per output).
+
+        The graph is traversed once for the whole batch,
+        see algo.dataflow_evaluation.BatchEvaluation.
+        """
+        from openalea.core.algo.dataflow_evaluation import BatchEvaluation
+        return BatchEvaluation(self).eval(list_of_inputs)
+
+    def is_up_to_date(self):
+        """ The graph is always evaluated, its nodes may be up to date """
+        return False
+
     def __call__(self, inputs=()):
         """
         Evaluate the graph
@@ -856,6 +1035,7 @@ class CompositeNode(Node, DataFlow):
         :return: the id
         """
         vid = self.add_vertex(vid)
+        self.invalidate_eval_plan()
 
         # -- NOOOOOO THE UGLY BACK REFERENCE --
         node.set_compositenode(self)
@@ -909,6 +1089,7 @@ class CompositeNode(Node, DataFlow):
         if vtx_id == self.id_in : self.id_in = None
         elif vtx_id == self.id_out : self.id_out = None
         self.remove_vertex(vtx_id)
+        self.invalidate_eval_plan()
         node.close()
         self.notify_vertex_removal(node)
         self.notify_listeners(("graph_modified", ))
@@ -921,6 +1102,7 @@ class CompositeNode(Node, DataFlow):
         except PortError:
             port = None
         DataFlow.remove_edge(self, eid)
+        self.invalidate_eval_plan()
         if port:
             self.actor(port._vid).set_input_state(port._local_pid, "disconnected")
         self.notify_listeners(("edge_removed", ("default",eid) ))
@@ -972,6 +1154,8 @@ class CompositeNode(Node, DataFlow):
             logger.error("Enable to create the edge %s %d %d %d %d"%( self.factory.name,  src_id, port_src, dst_id, port_dst))
             return
 
+        self.invalidate_eval_plan()
+
         self.actor(dst_id).set_input_state(port_dst, "connected")
         self.notify_listeners(("connection_modified", ))
         self.graph_modified = True
@@ -1028,6 +1212,7 @@ class CompositeNode(Node, DataFlow):
             raise IncompatibleNodeError()
 
         self.set_actor(vid, newnode)
+        self.invalidate_eval_plan()
 
     # Continuous eval functions
 
@@ -1060,8 +1245,7 @@ class CompositeNode(Node, DataFlow):
     def update_eval_listeners(self, vid):
         """ Update continuous evaluation listener for node vid """
 
-        src_node = self.node(vid)
-        src_node.continuous_eval.listeners.clear()
+        listeners = set()
 
         # For each output
         for pid in self.out_ports(vid):
@@ -1071,8 +1255,12 @@ class CompositeNode(Node, DataFlow):
                 dst_id = self.vertex(npid)
 
                 dst_node = self.node(dst_id)
-                listeners = dst_node.continuous_eval.listeners
-                src_node.continuous_eval.listeners.update(listeners)
+                listeners.update(dst_node.continuous_eval.listeners)
+
+        # do not give a listener set to the nodes that are never observed
+        continuous_eval = self.node(vid).continuous_eval
+        if listeners or continuous_eval.listeners:
+            continuous_eval.listeners = listeners
 
 from openalea.core.observer import AbstractListener
 
@@ -1107,6 +1295,7 @@ class CompositeNodeInput(Node):
         """ Define input value """
         index = self.map_index_out[input_pid]
         self.outputs[index] = val
+        self.modified = True
 
     def get_input(self, input_pid):
         """ Return the input value """
@@ -1114,6 +1303,7 @@ class CompositeNodeInput(Node):
         return self.outputs[index]
 
     def eval(self):
+        self.modified = False
         return False
 
     def to_script (self):
@@ -1143,6 +1333,7 @@ class CompositeNodeOutput(Node):
         self.inputs[index] = val
 
     def eval(self):
+        self.modified = False
         return False
 
     def to_script (self):
@@ -1178,6 +1369,19 @@ $NAME = CompositeNodeFactory(name=$PNAME,
         """ Pretty print repr """
         return pprint.pformat(obj, indent=indent)
 
+    def elt_value_repr(self):
+        """ Return elt_value where the values stored out of line by the
+        compact reader (see cnformat) are replaced by their repr.
+        """
+        from openalea.core.cnformat import OutOfLineValue
+
+        elt_value = {}
+        for vid, values in self.factory.elt_value.iteritems():
+            elt_value[vid] = [(vs[0], repr(vs[1].load())) + tuple(vs[2:])
+                              if isinstance(vs[1], OutOfLineValue) else vs
+                              for vs in values]
+        return elt_value
+
     def __repr__(self):
         """ Return the python string representation """
 
@@ -1196,7 +1400,7 @@ $NAME = CompositeNodeFactory(name=$PNAME,
                                       ELT_FACTORY=self.pprint_repr(f.elt_factory),
                                       ELT_CONNECTIONS=self.pprint_repr(f.connections),
                                       ELT_DATA=self.pprint_repr(f.elt_data),
-                                      ELT_VALUE=self.pprint_repr(f.elt_value),
+                                      ELT_VALUE=self.pprint_repr(self.elt_value_repr()),
                                       ELT_AD_HOC=self.pprint_repr(f.elt_ad_hoc),
                                       LAZY=self.pprint_repr(f.lazy),
                                       EVALALGO=self.pprint_repr(f.eval_algo),
@@ -1205,32 +1409,12 @@ $NAME = CompositeNodeFactory(name=$PNAME,
 
 import json
 class JSONCNFactoryWriter(PyCNFactoryWriter):
+    """ CompositeNodeFactory JSON Writer (see cnformat) """
 
     def __repr__(self):
-        f = self.factory
+        from openalea.core import cnformat
 
-        minx = min(f.elt_ad_hoc.itervalues(), key=lambda x: x["position"][0])["position"][0]
-        miny = min(f.elt_ad_hoc.itervalues(), key=lambda x: x["position"][1])["position"][1]
-
-        print minx, miny
-
-        for elt in f.elt_ad_hoc.itervalues():
-            elt["position"][0] -= minx
-            elt["position"][1] -= miny
-
-        d = dict(type="CompositeNodeFactory",
-                 name=f.name,
-                 description=f.description,
-                 category=f.category,
-                 doc=f.doc,
-                 #inputs=f.inputs,
-                 #outputs=f.outputs,
-                 #elt_factory=f.elt_factory,
-                 elt_connections=list(f.connections.itervalues()),
-                 #elt_data=f.elt_data,
-                 #elt_value=f.elt_value,
-                 elt_ad_hoc=f.elt_ad_hoc,
-                 lazy=f.lazy,
-                 eval_algo=f.eval_algo,
-                 )
-        return json.dumps(d)
+        d = cnformat.factory_to_dict(self.factory)
+        d.update(type="CompositeNodeFactory",
+                 version=cnformat.FORMAT_VERSION)
+        return json.dumps(d, separators=(',', ':'))
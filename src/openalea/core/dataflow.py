@@ -35,11 +35,27 @@ class Port (object):
     a port is an entry point to a vertex
     """
 
+    __slots__ = ('_vid', '_local_pid', '_is_out_port', '_edges')
+
     def __init__(self, vid, local_pid, is_out_port):
         #internal data to access from dataflow
         self._vid = vid
         self._local_pid = local_pid
         self._is_out_port = is_out_port
+        # edges connected to this port
+        self._edges = []
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        # ports pickled before __slots__ have a (dict, None) state
+        if isinstance(state, tuple):
+            state = state[0] or state[1]
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+        # edges pickled as a set, or rebuilt with the port index
+        self._edges = list(getattr(self, '_edges', ()))
 
 
 class DataFlow(PropertyGraph):
@@ -49,9 +65,14 @@ class DataFlow(PropertyGraph):
     ports are typed
     """
 
+    # incremented each time ports or connections change
+    port_version = 0
+
     def __init__(self):
         PropertyGraph.__init__(self)
         self._ports = {}
+        # (vid, local_pid, is_out_port) -> pid
+        self._local_ports = {}
         self._pid_generator = IdGenerator()
 
         self.add_edge_property("_source_port")
@@ -179,15 +200,7 @@ class DataFlow(PropertyGraph):
         to this port
         :rtype: iter of eid
         """
-        vid = self.vertex(pid)
-        if self.is_out_port(pid):
-            for eid in self.out_edges(vid):
-                if self.source_port(eid)==pid:
-                    yield eid
-        else:
-            for eid in self.in_edges(vid):
-                if self.target_port(eid)==pid:
-                    yield eid
+        return iter(self._ports[pid]._edges)
 
     def nb_connections(self, pid):
         """ Compute number of edges connected to a given port.
@@ -198,7 +211,7 @@ class DataFlow(PropertyGraph):
         return:
             - int
         """
-        return len(tuple(self.connected_edges(pid)))
+        return len(self._ports[pid]._edges)
 
     ####################################################
     #
@@ -230,20 +243,20 @@ class DataFlow(PropertyGraph):
         global port id of a given port
         :rtype: pid
         """
-        for pid in self.out_ports(vid):
-            if self._ports[pid]._local_pid == local_pid:
-                return pid
-        raise PortError("Local pid '%s' does not exist" % str(local_pid))
+        try:
+            return self._local_ports[(vid, local_pid, True)]
+        except KeyError:
+            raise PortError("Local pid '%s' does not exist" % str(local_pid))
 
     def in_port(self, vid, local_pid):
         """
         global port id of a given port
         :rtype: pid
         """
-        for pid in self.in_ports(vid):
-            if self._ports[pid]._local_pid == local_pid:
-                return pid
-        raise PortError("local pid '%s' does not exist for vertex %d" % (str(local_pid),vid) )
+        try:
+            return self._local_ports[(vid, local_pid, False)]
+        except KeyError:
+            raise PortError("local pid '%s' does not exist for vertex %d" % (str(local_pid),vid) )
 
     #####################################################
     #
@@ -299,7 +312,9 @@ class DataFlow(PropertyGraph):
         """
         pid = self._pid_generator.get_id(pid)
         self._ports[pid] = Port(vid, local_pid, False)
-        self.vertex_property("_ports")[vid].add(pid)
+        self._local_ports.setdefault((vid, local_pid, False), pid)
+        self.vertex_property("_ports")[vid].append(pid)
+        self.port_version += 1
         return pid
 
     def add_out_port(self, vid, local_pid, pid=None):
@@ -314,7 +329,9 @@ class DataFlow(PropertyGraph):
         """
         pid = self._pid_generator.get_id(pid)
         self._ports[pid] = Port(vid, local_pid, True)
-        self.vertex_property("_ports")[vid].add(pid)
+        self._local_ports.setdefault((vid, local_pid, True), pid)
+        self.vertex_property("_ports")[vid].append(pid)
+        self.port_version += 1
         return pid
 
     def remove_port(self, pid):
@@ -324,9 +341,14 @@ class DataFlow(PropertyGraph):
         """
         for eid in list(self.connected_edges(pid)):
             self.remove_edge(eid)
-        self.vertex_property("_ports")[self.vertex(pid)].remove(pid)
+        port = self._ports[pid]
+        key = (port._vid, port._local_pid, port._is_out_port)
+        if self._local_ports.get(key) == pid:
+            del self._local_ports[key]
+        self.vertex_property("_ports")[port._vid].remove(pid)
         self._pid_generator.release_id(pid)
         del self._ports[pid]
+        self.port_version += 1
 
     def connect(self, source_pid, target_pid, eid=None):
         """
@@ -350,13 +372,61 @@ class DataFlow(PropertyGraph):
             self.vertex(target_pid)), eid)
         self.edge_property("_source_port")[eid] = source_pid
         self.edge_property("_target_port")[eid] = target_pid
+        self._ports[source_pid]._edges.append(eid)
+        self._ports[target_pid]._edges.append(eid)
+        self.port_version += 1
 
         return eid
 
+    def remove_edge(self, eid):
+        """todo"""
+        for prop in ("_source_port", "_target_port"):
+            pid = self.edge_property(prop).get(eid)
+            if pid in self._ports:
+                edges = self._ports[pid]._edges
+                if eid in edges:
+                    edges.remove(eid)
+        PropertyGraph.remove_edge(self, eid)
+        self.port_version += 1
+
+    remove_edge.__doc__ = PropertyGraph.remove_edge.__doc__
+
+    def clear_edges(self):
+        """todo"""
+        for port in self._ports.itervalues():
+            del port._edges[:]
+        PropertyGraph.clear_edges(self)
+        self.port_version += 1
+
+    clear_edges.__doc__ = PropertyGraph.clear_edges.__doc__
+
+    def rebuild_port_index(self):
+        """ Rebuild the edges of each port and the local port map
+        (e.g. for dataflows pickled without them or with sets).
+        """
+        self._rebuild_adjacency()
+        vertex_ports = self.vertex_property("_ports")
+        for vid in vertex_ports:
+            vertex_ports[vid] = list(vertex_ports[vid])
+        self._local_ports = {}
+        for pid, port in self._ports.iteritems():
+            port._edges = []
+            self._local_ports.setdefault((port._vid, port._local_pid,
+                                          port._is_out_port), pid)
+        for eid in self.edges():
+            self._ports[self.source_port(eid)]._edges.append(eid)
+            self._ports[self.target_port(eid)]._edges.append(eid)
+        self.port_version += 1
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_local_ports' not in state:
+            self.rebuild_port_index()
+
     def add_vertex(self, vid=None):
         """todo"""
         vid = PropertyGraph.add_vertex(self, vid)
-        self.vertex_property("_ports")[vid] = set()
+        self.vertex_property("_ports")[vid] = []
         return vid
 
     add_vertex.__doc__ = PropertyGraph.add_vertex.__doc__
@@ -375,8 +445,10 @@ class DataFlow(PropertyGraph):
     def clear(self):
         """todo"""
         self._ports.clear()
+        self._local_ports.clear()
         self._pid_generator = IdGenerator()
         PropertyGraph.clear(self)
+        self.port_version += 1
 
     clear.__doc__ = PropertyGraph.clear.__doc__
 
@@ -135,16 +135,60 @@ class BruteEvaluation(AbstractEvaluation):
             raise UserWarning("mismatch nb out port vs. function result")
 
 
-# class LazyEvaluation(BruteEvaluation):
-#     """ For each evaluation reevaluate a node of the dataflow
-#     only if its inputs have changed or if it is tagged
-#     as not lazy.
-#     """
-#     def __init__(self, dataflow):
-#         BruteEvaluation.__init__(self, dataflow)
-#
-#         self._modified = {}
-#
-#     def clear(self):
-#         BruteEvaluation.clear(self)
-#         self._modified.clear()
\ No newline at end of file
+class LazyEvaluation(BruteEvaluation):
+    """ For each evaluation reevaluate a node of the dataflow
+    only if its inputs have changed or if it is tagged
+    as not lazy.
+
+    The inputs of a node have changed if the version of the data on one
+    of its input ports (see DataflowState.get_version) differs from the
+    one of its last evaluation. These versions are kept by clear().
+    """
+    def __init__(self, dataflow):
+        BruteEvaluation.__init__(self, dataflow)
+
+        # vid -> versions of the inputs at the last evaluation
+        self._input_versions = {}
+        self._state = None
+
+    def eval(self, env, state, vid=None):
+        # versions are only comparable within a state
+        if state is not self._state:
+            self._input_versions.clear()
+            self._state = state
+
+        BruteEvaluation.eval(self, env, state, vid)
+
+    def is_modified(self, state, vid, versions):
+        """ Test wether node vid needs to be evaluated
+
+        args:
+            - versions (dict): current versions of its inputs
+        """
+        df = self._dataflow
+
+        if not getattr(df.actor(vid), "lazy", True):
+            return True
+
+        if self._input_versions.get(vid) != versions:
+            return True
+
+        for pid in df.out_ports(vid):
+            if state.get_version(pid) is None:
+                return True
+
+        return False
+
+    def input_versions(self, state, vid):
+        """ Return the versions of the data on the input ports of vid
+        """
+        return dict((pid, state.get_version(pid))
+                    for pid in self._dataflow.in_ports(vid))
+
+    def eval_node(self, env, state, vid):
+        versions = self.input_versions(state, vid)
+        if not self.is_modified(state, vid, versions):
+            return
+
+        BruteEvaluation.eval_node(self, env, state, vid)
+        self._input_versions[vid] = versions
@@ -23,6 +23,9 @@ __revision__ = " $Id$ "
 
 class DataflowState(object):
     """ Store outputs of node and provide a way to access them
+
+    Each data is stamped with a version, unique in the state, each time it
+    is set (see get_version).
     """
     def __init__(self, dataflow):
         """ constructor
@@ -32,27 +35,53 @@ class DataflowState(object):
         """
         self._dataflow = dataflow
         self._state = {}
+        self._versions = {}
+        self._last_version = 0
+
+        # computed from the ports of the dataflow (see _update_ports)
+        self._port_version = None
+        self._lonely_ports = frozenset()
+        self._out_ports = frozenset()
+        self._port_order = {}
 
     def clear(self):
         """Clear state
         """
         self._state.clear()
+        self._versions.clear()
+
+    def _update_ports(self):
+        """ Compute the sets of lonely input ports and output ports
+        if the ports of the dataflow changed.
+        """
+        df = self._dataflow
+        if self._port_version == df.port_version:
+            return
+
+        self._lonely_ports = frozenset(pid for pid in df.in_ports()
+                                       if df.nb_connections(pid) == 0)
+        self._out_ports = frozenset(df.out_ports())
+        self._port_order.clear()
+        self._port_version = df.port_version
 
     def reinit(self):
         """ Remove all data stored except for the one
         associated to lonely input ports.
         """
-        df = self._dataflow
+        self._update_ports()
+        lonely = self._lonely_ports
 
         # save state
         save = dict((pid, dat) for pid, dat in self._state.items()
-                    if df.is_in_port(pid) and df.nb_connections(pid) == 0)
+                    if pid in lonely)
+        versions = dict((pid, self._versions[pid]) for pid in save)
 
         # clear
         self.clear()
 
         # resume state
         self._state.update(save)
+        self._versions.update(versions)
 
     def is_ready_for_evaluation(self):
         """ Test wether the state contains enough information
@@ -61,26 +90,17 @@ class DataflowState(object):
         Simply check that each lonely input port has
         some data attached to it.
         """
-        df = self._dataflow
-        state = self._state
-
-        return all([pid in state for pid in df.in_ports()
-                    if df.nb_connections(pid) == 0])
+        self._update_ports()
+        return self._state.viewkeys() >= self._lonely_ports
 
     def is_valid(self):
         """ Test wether all data have been computed
         """
-        df = self._dataflow
-        state = self._state
-
         if not self.is_ready_for_evaluation():
             return False
 
         # check that all nodes have been evaluated
-        if not all([pid in state for pid in df.out_ports()]):
-            return False
-
-        return True
+        return self._state.viewkeys() >= self._out_ports
 
     def cmp_port_priority(self, pid1, pid2):
         """ Compare port priority.
@@ -108,6 +128,40 @@ class DataflowState(object):
 
         return cmp(pid1, pid2)
 
+    def sorted_ports(self, pid):
+        """ Return the output ports connected to the input port pid,
+        sorted with cmp_port_priority.
+
+        The order is kept until the connections or the x positions of
+        the actors change.
+        """
+        self._update_ports()
+        df = self._dataflow
+
+        npids = tuple(df.connected_ports(pid))
+        positions = []
+        for npid in npids:
+            try:
+                node = df.actor(df.vertex(npid))
+            except KeyError:
+                # cmp_port_priority compares the pids of such ports
+                positions = None
+                break
+            positions.append(node.get_ad_hoc_dict().get_metadata('position')[0])
+
+        if positions is None:
+            return sorted(npids, self.cmp_port_priority)
+
+        positions = tuple(positions)
+        cached = self._port_order.get(pid)
+        if cached is not None and cached[0] == npids and \
+                cached[1] == positions:
+            return cached[2]
+
+        order = [npid for x, npid in sorted(zip(positions, npids))]
+        self._port_order[pid] = (npids, positions, order)
+        return order
+
     def get_data(self, pid):
         """ Retrieve data associated with a port.
 
@@ -127,14 +181,15 @@ class DataflowState(object):
         elif df.is_out_port(pid):
             raise KeyError("value not set for this port")
         else:
-            npids = list(df.connected_ports(pid))
-            if len(npids) == 0:
+            nb = df.nb_connections(pid)
+            if nb == 0:
                 raise KeyError("lonely in_port not set")
-            elif len(npids) == 1:
-                return self.get_data(npids[0])
+            elif nb == 1:
+                npid, = df.connected_ports(pid)
+                return self.get_data(npid)
             else:
-                npids.sort(self.cmp_port_priority)
-                return [self.get_data(pid) for pid in npids]
+                return [self.get_data(npid)
+                        for npid in self.sorted_ports(pid)]
 
     def set_data(self, pid, data):
         """ Store data on a port.
@@ -146,3 +201,20 @@ class DataflowState(object):
             - data (any)
         """
         self._state[pid] = data
+        self._last_version += 1
+        self._versions[pid] = self._last_version
+
+    def get_version(self, pid):
+        """ Return the version of the data on a port.
+
+        Return None if no data has been set on the port. For an input
+        port connected to output ports, return the tuple of the versions
+        of these ports.
+        """
+        if pid in self._versions:
+            return self._versions[pid]
+        df = self._dataflow
+        if df.is_out_port(pid) or df.nb_connections(pid) == 0:
+            return None
+        return tuple(sorted(self._versions.get(npid)
+                            for npid in df.connected_ports(pid)))
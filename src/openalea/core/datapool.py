@@ -38,7 +38,12 @@ def notify_decorator(f):
 
 
 class DataPool(Observed, dict):
-    """ Dictionnary of session data """
+    """ Dictionnary of session data
+
+    Entries added with add_pending are loaded on first access. Their loaders
+    are kept apart from the items of the dict, so that the methods of dict
+    which are not overridden (like dict(datapool)) only see loaded values.
+    """
 
     __metaclass__ = Singleton
 
@@ -46,10 +51,8 @@ class DataPool(Observed, dict):
 
         Observed.__init__(self)
         dict.__init__(self)
-
-        DataPool.__setitem__ = notify_decorator(dict.__setitem__)
-        DataPool.__delitem__ = notify_decorator(dict.__delitem__)
-        DataPool.clear = notify_decorator(dict.clear)
+        # key -> function returning the value, for the entries not loaded yet
+        self._pending = {}
 
     def add_data(self, key, instance):
         """ Add an instance referenced by key to the data pool """
@@ -57,6 +60,127 @@ class DataPool(Observed, dict):
         self[key] = instance
         self.notify_listeners(('pool_modified', ))
 
+    def add_pending(self, key, load):
+        """ Add an entry whose value is returned by load() on first access """
+        dict.pop(self, key, None)
+        self._pending[key] = load
+
+    def is_loaded(self, key):
+        """ Return False if the value of key has not been loaded yet """
+        if key in self._pending:
+            return False
+        dict.__getitem__(self, key)
+        return True
+
+    def load_all(self, ignore_errors=False):
+        """ Load the values of all the pending entries.
+
+        If ignore_errors is True, the entries which cannot be loaded are
+        removed and returned as a list of (key, exception).
+        """
+        errors = []
+        for key in self._pending.keys():
+            try:
+                self[key]
+            except Exception, e:
+                if not ignore_errors:
+                    raise
+                self._pending.pop(key, None)
+                errors.append((key, e))
+        return errors
+
+    def __getitem__(self, key):
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            if key not in self._pending:
+                raise
+        value = self._pending[key]()
+        del self._pending[key]
+        dict.__setitem__(self, key, value)
+        return value
+
+    @notify_decorator
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    @notify_decorator
+    def __delitem__(self, key):
+        if self._pending.pop(key, None) is None:
+            dict.__delitem__(self, key)
+
+    @notify_decorator
+    def clear(self):
+        self._pending.clear()
+        dict.clear(self)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._pending
+
+    has_key = __contains__
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._pending)
+
+    def __iter__(self):
+        for key in dict.keys(self) + self._pending.keys():
+            yield key
+
+    iterkeys = __iter__
+
+    def keys(self):
+        return dict.keys(self) + self._pending.keys()
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        if self._pending:
+            key = next(iter(self._pending))
+            return key, self.pop(key)
+        return dict.popitem(self)
+
+    def update(self, *args, **kwds):
+        items = dict(*args, **kwds)
+        for key in items:
+            self._pending.pop(key, None)
+        dict.update(self, items)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def itervalues(self):
+        self.load_all()
+        return dict.itervalues(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+    def iteritems(self):
+        self.load_all()
+        return dict.iteritems(self)
+
+    def copy(self):
+        self.load_all()
+        return dict.copy(self)
+
     def remove_data(self, key):
         """ Remove the instance identified by key """
         try:
@@ -0,0 +1,243 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Dependency graph of the composite node factories.
+
+For each composite node factory, the graph stores the factories used by
+its elements (resolved in the package manager) and the elements which
+can not be resolved. An entry is computed again when the elements of the
+factory change or when one of the packages it refers to is replaced or
+gets a different number of factories, so only the affected composite
+nodes are resolved again after a package is added or reloaded.
+
+Transitive queries walk the entries, reverse queries use the index of
+the composite nodes using each factory.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.pkgdict import is_protected
+
+
+class Entry(object):
+    """ Direct dependencies of a composite node factory.
+
+    - elt_factory: copy of the elements of the factory
+    - stamps: (package id, package, nb of factories) of the packages
+      used to resolve the elements
+    - deps: the factories used by the elements
+    - names: (package name, factory name) of deps
+    - missing: (package id, factory id) of the unresolved elements
+    """
+
+    __slots__ = ('factory', 'elt_factory', 'stamps', 'deps', 'names',
+                 'missing')
+
+
+class DependencyGraph(object):
+    """ Dependencies between the factories of a package manager """
+
+    def __init__(self, pkgmanager):
+        self.pkgmanager = pkgmanager
+        self.clear()
+
+    def clear(self):
+        """ Forget all the entries """
+        # id(factory) -> Entry
+        self.entries = {}
+        # id(factory) -> ids of the composite nodes using the factory
+        self.users = {}
+
+    def _package(self, pkg_id):
+        try:
+            return self.pkgmanager.pkgs[pkg_id]
+        except KeyError:
+            return None
+
+    def is_valid(self, entry, factory):
+        """ Return True if entry is up to date with factory """
+        if entry.factory is not factory or \
+                entry.elt_factory != factory.elt_factory:
+            return False
+        package = self._package
+        for pkg_id, pkg, size in entry.stamps:
+            p = package(pkg_id)
+            if p is not pkg or (p is not None and len(p) != size):
+                return False
+        return True
+
+    def entry(self, factory):
+        """ Return the entry of a composite node factory """
+        key = id(factory)
+        entry = self.entries.get(key)
+        if entry is not None and self.is_valid(entry, factory):
+            return entry
+
+        self.discard(factory)
+        entry = self.resolve(factory)
+        self.entries[key] = entry
+        users = self.users
+        for f in entry.deps:
+            users.setdefault(id(f), set()).add(key)
+        return entry
+
+    def discard(self, factory):
+        """ Remove the entry of factory """
+        key = id(factory)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for f in entry.deps:
+            s = self.users.get(id(f))
+            if s is not None:
+                s.discard(key)
+                if not s:
+                    del self.users[id(f)]
+
+    def resolve(self, factory):
+        """ Compute the entry of a composite node factory """
+        pm = self.pkgmanager
+        deps = {}
+        missing = set()
+        pkg_ids = set()
+        for p, n in factory.elt_factory.itervalues():
+            if is_protected(p) or is_protected(n):
+                continue
+            pkg_ids.add(p)
+            try:
+                fact = pm[p][n]
+            except:
+                missing.add((p, n))
+                continue
+            deps[id(fact)] = fact
+
+        entry = Entry()
+        entry.factory = factory
+        entry.elt_factory = dict(factory.elt_factory)
+        entry.stamps = []
+        for p in pkg_ids:
+            pkg = self._package(p)
+            entry.stamps.append((p, pkg, 0 if pkg is None else len(pkg)))
+        entry.deps = tuple(deps.itervalues())
+        entry.names = frozenset((f.package.name, f.name)
+                                for f in entry.deps)
+        entry.missing = frozenset(missing)
+        return entry
+
+    def reach(self, factories):
+        """ Return the entries of the composite nodes used by factories,
+        directly or not, including factories themselves.
+        """
+        seen = {}
+        stack = list(factories)
+        while stack:
+            f = stack.pop()
+            if id(f) in seen or not f.is_composite_node():
+                continue
+            entry = self.entry(f)
+            seen[id(f)] = entry
+            stack.extend(entry.deps)
+        return seen.values()
+
+    ###########################################################################
+    # Queries
+    ###########################################################################
+
+    def dependencies(self, factories):
+        """ Return the set of (package name, factory name) used by
+        factories, directly or not.
+        """
+        names = set()
+        for entry in self.reach(factories):
+            names.update(entry.names)
+        return names
+
+    def missing(self, factories):
+        """ Return the set of (package id, factory id) used by factories,
+        directly or not, which are not in the package manager.
+        """
+        missing = set()
+        for entry in self.reach(factories):
+            missing.update(entry.missing)
+        return missing
+
+    def composite_nodes(self):
+        """ Return the public composite node factories of the package
+        manager, as (package, factory) in the order of get_packages.
+        """
+        return [(pkg, f) for pkg in self.pkgmanager.get_packages()
+                for f in pkg.itervalues() if f.is_composite_node()]
+
+    def update(self):
+        """ Compute the entries of all the composite nodes of the package
+        manager and remove the other ones.
+        """
+        cns = self.composite_nodes()
+        keep = set()
+        for pkg, f in cns:
+            self.entry(f)
+            keep.add(id(f))
+        for key in self.entries.keys():
+            if key not in keep:
+                self.discard(self.entries[key].factory)
+        return cns
+
+    def who_use(self, factory_name):
+        """ Return the (package name, composite name) of the composite
+        nodes using a factory named factory_name, directly or not.
+
+        A composite node is listed once for each (package name, name)
+        of such factories.
+        """
+        cns = self.update()
+
+        # factories named factory_name, grouped by package name
+        targets = {}
+        for entry in self.entries.itervalues():
+            for f in entry.deps:
+                if f.name == factory_name:
+                    targets.setdefault((f.package.name, f.name), {})[id(f)] = f
+
+        # reverse walk from each group
+        count = {}
+        for group in targets.itervalues():
+            seen = set()
+            stack = list(group)
+            while stack:
+                key = stack.pop()
+                for user in self.users.get(key, ()):
+                    if user not in seen:
+                        seen.add(user)
+                        stack.append(user)
+            for user in seen:
+                count[user] = count.get(user, 0) + 1
+
+        res = []
+        for pkg, cn in cns:
+            res.extend([(pkg.name, cn.name)] * count.get(id(cn), 0))
+        return res
+
+    def to_dict(self):
+        """ Return the graph of the package manager as a dict:
+
+        'package name:factory name' -> {'depends': [[package, factory]],
+                                       'missing': [[package, factory]]}
+        """
+        d = {}
+        for pkg, cn in self.update():
+            entry = self.entry(cn)
+            d['%s:%s' % (pkg.name, cn.name)] = dict(
+                depends=sorted(list(x) for x in entry.names),
+                missing=sorted(list(x) for x in entry.missing))
+        return d
@@ -212,10 +212,19 @@ class Graph (IGraph,
 
     def add_vertex(self, vid=None):
         vid=self._vid_generator.get_id(vid)
-        self._vertices[vid]=(set(), set())
+        # in and out edges, lists are much smaller than sets for the
+        # few edges of a vertex
+        self._vertices[vid]=([], [])
         return vid
     add_vertex.__doc__=IMutableVertexGraph.add_vertex.__doc__
 
+    def reserve_vertices(self, vids):
+        """Reserve vertex ids for vertices added next with add_vertex(vid).
+
+        Faster than adding many sparse explicit ids one by one.
+        """
+        self._vid_generator.reserve(vids)
+
     def remove_vertex(self, vid):
         if vid not in self:
             raise InvalidVertex(vid)
@@ -249,8 +258,8 @@ class Graph (IGraph,
             raise InvalidVertex(vt)
         eid = self._eid_generator.get_id(eid)
         self._edges[eid]=(vs, vt)
-        self._vertices[vs][1].add(eid)
-        self._vertices[vt][0].add(eid)
+        self._vertices[vs][1].append(eid)
+        self._vertices[vt][0].append(eid)
         return eid
     add_edge.__doc__=IMutableEdgeGraph.add_edge.__doc__
 
@@ -275,6 +284,23 @@ class Graph (IGraph,
     #
     # ##########################################################
 
+    def _rebuild_adjacency(self):
+        """ Rebuild the in and out edges of each vertex from the edges
+        (e.g. for graphs pickled with set adjacency).
+        """
+        for vid in self._vertices:
+            self._vertices[vid] = ([], [])
+        for eid, (vs, vt) in self._edges.iteritems():
+            self._vertices[vs][1].append(eid)
+            self._vertices[vt][0].append(eid)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for link_in, link_out in self._vertices.itervalues():
+            if not isinstance(link_in, list):
+                self._rebuild_adjacency()
+                break
+
     def extend(self, graph):
         #vertex adding
         trans_vid={}
@@ -22,38 +22,125 @@ This module provide a generator for id numbers
 __license__= "Cecill-C"
 __revision__=" $Id$ "
 
+from bisect import bisect_right
+
 
 class IdGenerator(object):
+    """Generate and recycle integer ids.
+
+    Released ids are reused last released first. Ids skipped by an explicit
+    get_id are kept as ranges and reused after them, highest first. Ids
+    reserved in bulk are only returned by an explicit get_id.
+    """
 
     def __init__(self):
         self._id_max=0
+        # stack of released ids, may contain ids reused since (see _id_set)
         self._id_list=[]
+        self._id_set=set()
+        # ranges [start, stop) of skipped ids, sorted and disjoint, ranges
+        # are never split: ids used inside a range are kept in _gap_taken
+        self._gap_starts=[]
+        self._gap_stops=[]
+        self._gap_taken=set()
+        self._reserved=set()
+
+    def _find_gap(self, id):
+        """Index of the gap containing id or None"""
+        ind=bisect_right(self._gap_starts, id)-1
+        if ind>=0 and id<self._gap_stops[ind] and id not in self._gap_taken:
+            return ind
+        return None
+
+    def _take_from_gap(self, ind, id):
+        """Mark id of gap ind as used, in amortized constant time
+
+        The bounds of a gap are always free ids, emptied gaps are kept
+        with start==stop until they are the last one.
+        """
+        taken=self._gap_taken
+        if id==self._gap_starts[ind]:
+            id+=1
+            while id in taken:
+                taken.remove(id)
+                id+=1
+            self._gap_starts[ind]=id
+        elif id==self._gap_stops[ind]-1:
+            while id-1 in taken:
+                taken.remove(id-1)
+                id-=1
+            self._gap_stops[ind]=id
+        else:
+            taken.add(id)
+        while self._gap_stops and self._gap_starts[-1]==self._gap_stops[-1]:
+            self._gap_starts.pop()
+            self._gap_stops.pop()
 
     def get_id(self, id=None):
         if id is None:
-            if len(self._id_list)==0:
-                ret=self._id_max
-                self._id_max+=1
+            while self._id_list:
+                ret=self._id_list.pop()
+                if ret in self._id_set:
+                    self._id_set.remove(ret)
+                    return ret
+            if self._gap_stops:
+                ret=self._gap_stops[-1]-1
+                self._take_from_gap(len(self._gap_stops)-1, ret)
                 return ret
-            else:
-                return self._id_list.pop()
+            ret=self._id_max
+            self._id_max+=1
+            return ret
         else:
             if id>=self._id_max:
-                self._id_list.extend(range(self._id_max, id))
+                if id>self._id_max:
+                    self._gap_starts.append(self._id_max)
+                    self._gap_stops.append(id)
                 self._id_max=id+1
                 return id
+            elif id in self._id_set:
+                # the stale entry of _id_list is skipped by get_id
+                self._id_set.remove(id)
+                return id
+            elif id in self._reserved:
+                self._reserved.remove(id)
+                return id
             else:
-                try:
-                    ind=self._id_list.index(id)
-                    del self._id_list[ind]
-                    return id
-                except ValueError:
+                ind=self._find_gap(id)
+                if ind is None:
                     raise IndexError("id %d already used" % id)
+                self._take_from_gap(ind, id)
+                return id
+
+    def reserve(self, ids):
+        """Reserve explicit ids, to be taken next by get_id(id).
+
+        Ids are taken in increasing order, so that the ranges of skipped
+        ids are created once and never split, whatever the order of ids.
+        Raise IndexError if an id is already used.
+        """
+        for id in sorted(ids):
+            self._reserved.add(self.get_id(id))
 
     def release_id(self, id):
-        if id>self._id_max:
+        if id>=self._id_max:
             raise IndexError("id out of range")
-        elif id in self._id_list:
+        elif id in self._id_set or self._find_gap(id) is not None:
             raise IndexError("id already not used")
         else:
+            self._reserved.discard(id)
+            if len(self._id_list)>2*len(self._id_set)+32:
+                # drop the stale entries
+                self._id_list=[i for i in self._id_list if i in self._id_set]
             self._id_list.append(id)
+            self._id_set.add(id)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_id_set' not in state:
+            # generators pickled with a plain list of free ids
+            self._id_set=set(self._id_list)
+            self._gap_starts=[]
+            self._gap_stops=[]
+        if '_gap_taken' not in state:
+            self._gap_taken=set()
+            self._reserved=set()
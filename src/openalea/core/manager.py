@@ -6,6 +6,130 @@ class UnknownItemError(Exception):
     pass
 
 
+_plain_types = (str, unicode, int, long, float, bool, type(None))
+
+
+def _is_indexable(value):
+    """ Return True if value can be looked up in a dict with the same result as == """
+    if isinstance(value, tuple):
+        return all(_is_indexable(v) for v in value)
+    # value != value for nan
+    return isinstance(value, _plain_types) and value == value
+
+
+def _match(item, tags, criteria):
+    """ Return True if item has all tags and matches all criteria """
+    # Check tags. If one tag dont match, ignore this item
+    if tags is not None and all(tag in item.tags for tag in tags) is False:
+        return False
+
+    # Check all criteria. If one criteria dont match, ignore item
+    return all(hasattr(item, criterion) and getattr(item, criterion)
+               == criteria[criterion] for criterion in criteria)
+
+
+class _GroupView(object):
+    """
+    Items of a group, in the order of the group dict, with indexes built on
+    first query: name -> position, tag -> positions,
+    criterion -> value -> positions.
+    An index is None if a value cannot be indexed, queries then scan items.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.values = items.values()
+        self._names = False
+        self._tags = False
+        self._criteria = {}
+        self._sorted = None
+
+    def names(self):
+        if self._names is False:
+            names = {}
+            for i, item in enumerate(self.values):
+                try:
+                    name = item.name
+                except Exception:
+                    names = None
+                    break
+                if not _is_indexable(name):
+                    names = None
+                    break
+                names.setdefault(name, i)
+            self._names = names
+        return self._names
+
+    def tags(self):
+        if self._tags is False:
+            index = {}
+            for i, item in enumerate(self.values):
+                try:
+                    tags = item.tags
+                except Exception:
+                    index = None
+                    break
+                if not isinstance(tags, (list, tuple, set, frozenset)) or \
+                        not all(_is_indexable(tag) for tag in tags):
+                    index = None
+                    break
+                for tag in set(tags):
+                    index.setdefault(tag, []).append(i)
+            self._tags = index
+        return self._tags
+
+    def criterion(self, key):
+        if key not in self._criteria:
+            index = {}
+            for i, item in enumerate(self.values):
+                try:
+                    value = getattr(item, key)
+                except Exception:
+                    # item without this criterion never matches
+                    continue
+                if not _is_indexable(value):
+                    index = None
+                    break
+                index.setdefault(value, []).append(i)
+            self._criteria[key] = index
+        return self._criteria[key]
+
+    def select(self, tags, criteria):
+        """
+        :return: positions of items matching tags and criteria,
+            None if indexes cannot be used
+        """
+        selections = []
+        if tags:
+            if not isinstance(tags, (list, tuple, set, frozenset)) or \
+                    not all(_is_indexable(tag) for tag in tags):
+                return None
+            index = self.tags()
+            if index is None:
+                return None
+            selections += [index.get(tag, ()) for tag in tags]
+        for key, value in criteria.iteritems():
+            if not _is_indexable(value):
+                return None
+            index = self.criterion(key)
+            if index is None:
+                return None
+            selections.append(index.get(value, ()))
+
+        selections.sort(key=len)
+        positions = set(selections[0])
+        for selection in selections[1:]:
+            if not positions:
+                break
+            positions.intersection_update(selection)
+        return sorted(positions)
+
+    def sorted_items(self, sort):
+        if self._sorted is None:
+            self._sorted = sort(self.values)
+        return self._sorted
+
+
 class GenericManager(Observed, AbstractListener):
 
     def __init__(self, items=None, item_proxy=None, autoload=['entry_points']):
@@ -24,6 +148,7 @@ class GenericManager(Observed, AbstractListener):
 
         self.debug = False
         self._proxies = {}
+        self._views = {}  # dict group -> _GroupView, indexes of items
 
         self.item_proxy = item_proxy
 
@@ -60,6 +185,36 @@ class GenericManager(Observed, AbstractListener):
         self._item = {}  # dict group -> item name -> item class or item proxy
         self._item_loaded = {}
         self._proxies = {}
+        self._views = {}
+
+    def reindex(self, group=None):
+        """
+        Drop indexes of items of group (all groups if None).
+        Indexes are updated when items are added, call this method when
+        name, tags or criteria of items already added change.
+        """
+        if group is None:
+            self._views = {}
+        else:
+            self._views.pop(group, None)
+
+    def _view(self, group):
+        items = self._item[group]
+        view = self._views.get(group)
+        if view is None or view.items is not items:
+            view = self._views[group] = _GroupView(items)
+        return view
+
+    def _group_items(self, group):
+        """
+        :return: dict identifier -> item of group, discover items if needed
+        """
+        try:
+            return self._item[group]
+        except KeyError:
+            self._item.setdefault(group, {})
+            self.discover(group)
+            return self._item[group]
 
     def add(self, item, group, item_proxy=None, **kwds):
         if item_proxy is None and group in self._item_proxy:
@@ -72,6 +227,7 @@ class GenericManager(Observed, AbstractListener):
 
         self.patch_item(item)
         self._item.setdefault(group, {})[item.identifier] = item
+        self._views.pop(group, None)
         return item
 
     def add_items(self, items, group):
@@ -85,11 +241,18 @@ class GenericManager(Observed, AbstractListener):
         """
         if group is None:
             group = self.default_group
-        items = self.items(group)
-        if identifier in self._item[group]:
-            return self._item[group][identifier]
+        items = self._group_items(group)
+        if identifier in items:
+            return items[identifier]
         else:
-            for item in items:
+            view = self._view(group)
+            names = view.names()
+            if names is not None and _is_indexable(identifier):
+                i = names.get(identifier)
+                if i is not None and view.values[i].name == identifier:
+                    return view.values[i]
+            # name not indexed or changed since indexation
+            for item in view.values:
                 if item.name == identifier:
                     return item
             args = dict(identifier=identifier, group=group)
@@ -98,30 +261,22 @@ class GenericManager(Observed, AbstractListener):
     def items(self, group=None, tags=None, criteria=None, **kwds):
         if group is None:
             group = self.default_group
-        try:
-            items = self._item[group].values()
-        except KeyError:
-            self._item.setdefault(group, {})
-            self.discover(group)
-            items = self._item[group].values()
+        self._group_items(group)
+        view = self._view(group)
 
         if criteria is None:
             criteria = {}
 
-        valid_items = []
-        for pl in items:
-            # Check tags. If one tag dont match, ignore this item
-            if tags is not None and all(tag in pl.tags for tag in tags) is False:
-                continue
-
-            # Check all criteria. If one criteria dont match, ignore item
-            if not all(hasattr(pl, criterion) and getattr(pl, criterion)
-                       == criteria[criterion] for criterion in criteria):
-                continue
+        if not tags and not criteria:
+            return list(view.values)
 
-            valid_items.append(pl)
-
-        return valid_items
+        positions = view.select(tags, criteria)
+        if positions is None:
+            candidates = view.values
+        else:
+            # items may have changed since indexation
+            candidates = [view.values[i] for i in positions]
+        return [pl for pl in candidates if _match(pl, tags, criteria)]
 
     def patch_item(self, item):
         if hasattr(item, '__patched__'):
@@ -144,6 +299,16 @@ class GenericManager(Observed, AbstractListener):
         """
         self._item_proxy[group] = item_proxy
 
+    def sorted_items(self, group=None):
+        """
+        :return: items of group sorted by name, one item per name.
+            The list is shared until the group changes, do not modify it.
+        """
+        if group is None:
+            group = self.default_group
+        self._group_items(group)
+        return self._view(group).sorted_items(self._sorted_items)
+
     def _sorted_items(self, items):
         item_dict = {}
         for item in items:
@@ -1,5 +1,14 @@
 # Cache index : { vid: time/ cost to get} - if vid in index -> cache exist
 
+import os
+import cPickle
+import hashlib
+import marshal
+import threading
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+
 class Cache_item():
     def __init__(self, vid=None, size=0, site=None):
         self.vid = vid
@@ -35,4 +44,369 @@ class Cache_index():
         if vid in self.cache_index:
             return self.cache_index[vid]
         else:
-            return None
\ No newline at end of file
+            return None
+
+
+###############################################################################
+# Memoization of node evaluation
+
+# types encoded with marshal: its version 0 has no references
+_marshal_types = frozenset([type(None), bool, int, long, float, complex,
+                            str, unicode])
+# sets and dict keys of these types are sorted in C
+_sortable_types = (frozenset([str]), frozenset([unicode]),
+                   frozenset([int, long]))
+
+
+def _sortable(items):
+    types = set(map(type, items))
+    return any(types <= sortable for sortable in _sortable_types)
+
+
+class InputTooLarge(Exception):
+    pass
+
+
+class InputEncoder(object):
+    """ Canonical encoding of the input values of a node.
+
+    Equal values of the python types (None, numbers, strings, lists,
+    tuples, dicts and sets) have the same encoding, whatever the order of
+    their dicts and sets. The other values are pickled: equal values may
+    then have different encodings (a cache miss, not a wrong hit).
+
+    The lists and tuples of numbers and strings are encoded with marshal,
+    containers are encoded as '\\0', a type letter, their length and the
+    encoding of their items.
+
+    InputTooLarge is raised as soon as the encoding exceeds limit bytes.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.size = 0
+
+    def encode(self, value):
+        """ Return the encoding of value as a list of strings """
+        chunks = []
+        self._encode(value, chunks)
+        return chunks
+
+    def _check(self, size):
+        """ Reject a value before encoding it in at least size bytes """
+        if self.size + size > self.limit:
+            raise InputTooLarge()
+
+    def _add(self, chunks, s):
+        self._check(len(s))
+        self.size += len(s)
+        chunks.append(s)
+
+    def _encode(self, value, chunks):
+        cls = type(value)
+        if cls in _marshal_types:
+            if cls is str or cls is unicode:
+                self._check(len(value))
+            self._add(chunks, marshal.dumps(value, 0))
+        elif cls is list or cls is tuple:
+            self._encode_sequence(value, 'L' if cls is list else 'T', chunks)
+        elif cls is dict:
+            self._check(len(value))
+            keys = value.keys()
+            if _sortable(keys):
+                keys.sort()
+                self._add(chunks, '\0D%d:' % len(value))
+                self._encode_sequence(keys, 'L', chunks)
+                self._encode_sequence([value[k] for k in keys], 'L', chunks)
+            else:
+                # the encodings are prefix free: sorting the key, value
+                # pairs sorts the keys
+                items = [''.join(self.encode(k) + self.encode(value[k]))
+                         for k in keys]
+                items.sort()
+                self._add(chunks, '\0E%d:' % len(value))
+                chunks.extend(items)
+        elif cls is set or cls is frozenset:
+            self._check(len(value))
+            tag = 'S' if cls is set else 'F'
+            if _sortable(value):
+                self._add(chunks, '\0%s:' % tag)
+                self._encode_sequence(sorted(value), 'L', chunks)
+            else:
+                items = [''.join(self.encode(v)) for v in value]
+                items.sort()
+                self._add(chunks, '\0%s%d:' % (tag, len(value)))
+                chunks.extend(items)
+        else:
+            # e.g. arrays: do not copy large buffers to reject them
+            nbytes = getattr(value, 'nbytes', None)
+            if isinstance(nbytes, (int, long)):
+                self._check(nbytes)
+            data = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+            self._add(chunks, '\0P%d:' % len(data))
+            self._add(chunks, data)
+
+    def _encode_sequence(self, value, tag, chunks):
+        # at least one byte per item: reject large sequences at once
+        self._check(len(value))
+        if set(map(type, value)) <= _marshal_types:
+            self._add(chunks, marshal.dumps(value, 0))
+            return
+        self._add(chunks, '\0%s%d:' % (tag, len(value)))
+        for v in value:
+            self._encode(v, chunks)
+
+
+class ResultCache(object):
+    """ Content addressed cache of node outputs.
+
+    Outputs are indexed by the identity of the node factory (package, name
+    and hash of the source) and a hash of the inputs of the node (see
+    InputEncoder). Nodes whose inputs are larger than max_input_size bytes
+    are not cached: hashing them would cost about as much as many
+    evaluations.
+    They are stored pickled in memory in a LRU of max_items entries and, if
+    path is set, written in a directory whose size is limited to
+    max_disk_size bytes. Each hit returns new output values: nodes can
+    modify them in place. Outputs which cannot be pickled are not cached.
+
+    The cache can be used by several threads.
+    """
+
+    def __init__(self, max_items=1000, path=None, max_disk_size=100 * 2 ** 20,
+                 max_input_size=2 ** 20):
+        self.max_items = max_items
+        self.path = path
+        self.max_disk_size = max_disk_size
+        self.max_input_size = max_input_size
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # key -> pickled outputs
+        self._disk = OrderedDict()  # key -> file size
+        self._disk_size = 0
+        self._factory_keys = WeakKeyDictionary()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+        if path is not None:
+            self._load_disk_index()
+
+    def stats(self):
+        """ Return a dict of the cache counters """
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions,
+                    disk_hits=self.disk_hits,
+                    disk_evictions=self.disk_evictions,
+                    nb_items=len(self._memory),
+                    nb_disk_items=len(self._disk),
+                    disk_size=self._disk_size)
+
+    def clear(self):
+        """ Remove all the entries (memory and disk) and reset counters """
+        with self._lock:
+            self._memory.clear()
+            for key in list(self._disk):
+                self._remove_file(key)
+            self._factory_keys = WeakKeyDictionary()
+            self.hits = self.misses = self.evictions = 0
+            self.disk_hits = self.disk_evictions = 0
+
+    ###########################################################################
+    # keys
+
+    def factory_key(self, factory):
+        """ Return a string identifying the factory and its source """
+        src_cache = getattr(factory, 'src_cache', None)
+        with self._lock:
+            entry = self._factory_keys.get(factory)
+        if entry is not None and entry[1] is src_cache:
+            return entry[0]
+
+        try:
+            src = factory.get_node_src()
+        except Exception:
+            src = repr((getattr(factory, 'nodemodule_name', None),
+                        getattr(factory, 'nodeclass_name', None)))
+
+        try:
+            pkg_name = factory.package.name
+        except AttributeError:
+            pkg_name = None
+
+        if isinstance(src, unicode):
+            src = src.encode('utf-8')
+        key = '%s:%s:%s' % (pkg_name, factory.name,
+                            hashlib.sha1(src).hexdigest())
+        with self._lock:
+            self._factory_keys[factory] = (key, src_cache)
+        return key
+
+    def invalidate_factory(self, factory):
+        """ Forget the source hash of factory (e.g. after a reload) """
+        with self._lock:
+            self._factory_keys.pop(factory, None)
+
+    def node_key(self, node):
+        """ Return the key of the current evaluation of node or None
+        if the result of node can not be cached.
+
+        Only lazy nodes without delay built by a NodeFactory, whose inputs
+        can be encoded in max_input_size bytes, are cached.
+        """
+        factory = node.factory
+        if factory is None or not factory.is_node():
+            return None
+        if not node.lazy or node.delay:
+            return None
+
+        try:
+            inputs = InputEncoder(self.max_input_size).encode(node.inputs)
+        except Exception:
+            # too large or can not be pickled
+            return None
+
+        h = hashlib.sha1(self.factory_key(factory))
+        for chunk in inputs:
+            h.update(chunk)
+        return h.hexdigest()
+
+    ###########################################################################
+    # storage
+
+    def get(self, key):
+        """ Return (True, outputs) if key is in the cache else (False, None) """
+        data = self._get_data(key)
+        if data is None:
+            return False, None
+        try:
+            return True, cPickle.loads(data)
+        except Exception:
+            # corrupted file or class not available anymore
+            with self._lock:
+                self._memory.pop(key, None)
+                self._remove_file(key)
+            return False, None
+
+    def _get_data(self, key):
+        """ Return the pickled outputs of key or None """
+        with self._lock:
+            try:
+                data = self._memory.pop(key)
+                self._memory[key] = data
+                self.hits += 1
+                return data
+            except KeyError:
+                pass
+
+            if key in self._disk:
+                try:
+                    f = open(self._filename(key), 'rb')
+                    try:
+                        data = f.read()
+                    finally:
+                        f.close()
+                except IOError:
+                    self._remove_file(key)
+                else:
+                    self._disk[key] = self._disk.pop(key)
+                    self._store_memory(key, data)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return data
+
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def put(self, key, outputs):
+        """ Store outputs (list of output values) for key """
+        try:
+            data = cPickle.dumps(outputs, cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        with self._lock:
+            self._store_memory(key, data)
+            if self.path is not None and key not in self._disk:
+                self._store_disk(key, data)
+
+    def eval_node(self, node):
+        """ Evaluate node, using the cached outputs if any.
+        Return the same value as node.eval.
+        """
+        if node.is_up_to_date():
+            return False
+
+        key = self.node_key(node)
+        if key is None:
+            return node.eval()
+
+        found, outputs = self.get(key)
+        if found:
+            node.notify_listeners(("start_eval",))
+            return node.end_eval(outputs)
+
+        ret = node.eval()
+        self.put(key, list(node.outputs))
+        return ret
+
+    def _store_memory(self, key, data):
+        self._memory.pop(key, None)
+        self._memory[key] = data
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def _load_disk_index(self):
+        """ Read the entries already on disk, oldest first """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        entries = []
+        for fn in os.listdir(self.path):
+            if not fn.endswith('.pkl'):
+                continue
+            st = os.stat(os.path.join(self.path, fn))
+            entries.append((st.st_mtime, fn[:-4], st.st_size))
+        entries.sort()
+
+        for mtime, key, size in entries:
+            self._disk[key] = size
+            self._disk_size += size
+        self._shrink_disk()
+
+    def _store_disk(self, key, data):
+        if len(data) > self.max_disk_size:
+            return
+
+        f = open(self._filename(key), 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        self._disk[key] = len(data)
+        self._disk_size += len(data)
+        self._shrink_disk()
+
+    def _shrink_disk(self):
+        while self._disk and self._disk_size > self.max_disk_size:
+            key = next(iter(self._disk))
+            self._remove_file(key)
+            self.disk_evictions += 1
+
+    def _remove_file(self, key):
+        self._disk_size -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
@@ -45,7 +45,9 @@ def link_two_sites(site1, site2, transfer_cost):
 
 
 class MultiSiteCloud():
-    def __init__(self, list_sites=dict()):
+    def __init__(self, list_sites=None):
+        if list_sites is None:
+            list_sites = dict()
         self.list_sites = list_sites
 
     def add_site(self, site):
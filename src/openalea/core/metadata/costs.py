@@ -39,7 +39,7 @@ def minimum_cost_site(vid, provenance, multisites):
 
         possible_cost[s1] = total_cost
 
-    best_site = min(possible_cost)
+    best_site = min(possible_cost, key=possible_cost.get)
     best_cost = possible_cost[best_site]
 
     return best_site, best_cost
\ No newline at end of file
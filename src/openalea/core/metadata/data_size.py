@@ -18,17 +18,11 @@ def total_size(o, handlers={}, verbose=False):
                     OtherContainerClass: OtherContainerClass.get_elements}
 
     """
-    dict_handler = lambda d: chain.from_iterable(d.items())
-    all_handlers = {tuple: iter,
-                    list: iter,
-                    deque: iter,
-                    dict: dict_handler,
-                    set: iter,
-                    frozenset: iter,
-                   }
+    all_handlers = dict(_default_handlers)
     all_handlers.update(handlers)     # user handlers take precedence
     seen = set()                      # track which object id's have already been seen
     default_size = getsizeof(0)       # estimate sizeof object without __sizeof__
+    type_handlers = {}                # type -> handler (or None), resolved once
 
     def sizeof(o):
         if id(o) in seen:       # do not double count the same object
@@ -39,10 +33,27 @@ def total_size(o, handlers={}, verbose=False):
         if verbose:
             print(s, type(o), repr(o), file=stderr)
 
-        for typ, handler in all_handlers.items():
-            if isinstance(o, typ):
-                s += sum(map(sizeof, handler(o)))
-                break
+        typ = type(o)
+        try:
+            handler = type_handlers[typ]
+        except KeyError:
+            handler = None
+            for t, h in all_handlers.items():
+                if isinstance(o, t):
+                    handler = h
+                    break
+            type_handlers[typ] = handler
+        if handler is not None:
+            s += sum(map(sizeof, handler(o)))
         return s
 
-    return sizeof(o)
\ No newline at end of file
+    return sizeof(o)
+
+
+_default_handlers = {tuple: iter,
+                     list: iter,
+                     deque: iter,
+                     dict: lambda d: chain.from_iterable(d.items()),
+                     set: iter,
+                     frozenset: iter,
+                    }
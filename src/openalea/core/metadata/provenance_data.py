@@ -46,4 +46,259 @@ class Prov():
         list_items.append(item2)
         list_items.append(item3)
 
-        self.add_prov_itemlist(list_items)
\ No newline at end of file
+        self.add_prov_itemlist(list_items)
+
+
+###############################################################################
+# Store of the measured provenance
+
+import atexit
+import sqlite3
+import threading
+import weakref
+from collections import deque
+from itertools import count
+
+from openalea.core import logger
+from openalea.core.metadata.data_size import total_size
+
+
+def factory_name(factory):
+    """ Return 'package id:factory name' """
+    if factory is None:
+        return None
+    # the package itself may not be loaded anymore
+    pkg_id = getattr(factory, '__pkg_id__', None)
+    if pkg_id is None:
+        return factory.name
+    return '%s:%s' % (pkg_id, factory.name)
+
+
+class ProvenanceStore(object):
+    """ Record node and workflow executions in a SQLite database.
+
+    Records are buffered in memory and written in batched transactions by a
+    background thread, every flush_interval seconds or as soon as flush_size
+    records are waiting. The tables are those of
+    algo.dataflow_evaluation.db_create: CompositeNodeExec for the workflow
+    executions, NodeExec for the node executions and Data for their outputs.
+    Row ids are assigned by SQLite, several stores can share a database.
+
+    Input and output sizes are measured by the writer thread with the size
+    function (None by default, to not measure them, data_size.total_size
+    for instance). Values modified in place after their evaluation may be
+    measured with their new size.
+    """
+
+    def __init__(self, filename=None, flush_size=1000, flush_interval=1.,
+                 size=None):
+        from openalea.core.algo.dataflow_evaluation import (db_create,
+                                                            get_database_name)
+        if filename is None:
+            filename = get_database_name()
+        self.filename = filename
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.size = size
+
+        # transactions lock the database for writing from their start, rows
+        # inserted in a transaction have consecutive ids
+        self._conn = sqlite3.connect(filename, check_same_thread=False,
+                                     isolation_level='IMMEDIATE')
+        # commits do not wait for the disk
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        db_create(self._conn.cursor())
+        self._conn.commit()
+
+        # local ids of the workflow executions, exec id -> row id
+        self._exec_ids = count(1)
+        self._exec_rows = {}
+
+        # records in execution order, appends and pops of deques are thread safe
+        self._records = deque()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._run)
+        self._writer.daemon = True
+        self._writer.start()
+        _open_stores.add(self)
+
+    ###########################################################################
+    # recording
+
+    def new_exec_id(self):
+        """ Return a new workflow execution id, local to this store.
+        The id of the row in the database is assigned when it is written.
+        """
+        return self._exec_ids.next()
+
+    def workflow_start(self, exec_id, name, start_time):
+        """ Record the start of the execution exec_id of the workflow name """
+        self._records.append(('start', exec_id, name, start_time, None))
+
+    def workflow_exec(self, exec_id, name, start_time, end_time):
+        """ Record the execution exec_id of the workflow name """
+        self._records.append(('end', exec_id, name, start_time, end_time))
+
+    def node_exec(self, exec_id, vid, node, start_time, end_time):
+        """ Record the execution of the vertex vid, evaluated by node during
+        the workflow execution exec_id """
+        factory = getattr(node, 'factory', None)
+        if self.size is None:
+            values = None
+        else:
+            # measured by the writer
+            values = (list(node.inputs), list(node.outputs))
+        self._records.append(('node', exec_id, start_time, end_time, vid,
+                              factory, values))
+        if len(self._records) >= self.flush_size:
+            self._wakeup.set()
+
+    ###########################################################################
+    # writing
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception, e:
+                # the writer must not die, records would pile up
+                logger.error('Provenance writer error: %s' % e)
+
+    def _exec_row(self, cur, exec_id, name=None, start_time=None):
+        """ Return the row id of the execution exec_id, insert it if needed """
+        row = self._exec_rows.get(exec_id)
+        if row is None:
+            cur.execute("INSERT INTO CompositeNodeExec (createtime, name) VALUES (?, ?)",
+                        (start_time, name))
+            row = self._exec_rows[exec_id] = cur.lastrowid
+        return row
+
+    def _write(self, records):
+        size = self.size
+        cur = self._conn.cursor()
+        nodes = []
+        for record in records:
+            kind, exec_id = record[:2]
+            if kind == 'node':
+                t0, t1, vid, factory, values = record[2:]
+                if values is None or size is None:
+                    input_size = output_size = None
+                else:
+                    input_size, output_size = size(values[0]), size(values[1])
+                nodes.append((t0, t1, vid, self._exec_row(cur, exec_id, None, t0),
+                              factory_name(factory), input_size, output_size))
+            elif kind == 'start':
+                name, start_time = record[2:4]
+                self._exec_row(cur, exec_id, name, start_time)
+            else:
+                name, start_time, end_time = record[2:]
+                row = self._exec_row(cur, exec_id, name, start_time)
+                cur.execute("UPDATE CompositeNodeExec SET createtime = ?, endtime = ?, name = ? WHERE CompositeNodeExecid = ?",
+                            (start_time, end_time, name, row))
+                del self._exec_rows[exec_id]
+        if not nodes:
+            return
+
+        nb = len(nodes)
+        cur.executemany(
+            "INSERT INTO NodeExec (createtime, endtime, Nodeid, CompositeNodeExecid, NodeFactory, input_size) VALUES (?, ?, ?, ?, ?, ?)",
+            (node[:6] for node in nodes))
+        first_node = cur.execute("SELECT last_insert_rowid()").fetchone()[0] - nb + 1
+        cur.executemany(
+            "INSERT INTO Data (createtime, NodeExecid, size) VALUES (?, ?, ?)",
+            ((node[1], first_node + i, node[6]) for i, node in enumerate(nodes)))
+        first_data = cur.execute("SELECT last_insert_rowid()").fetchone()[0] - nb + 1
+        cur.executemany("UPDATE NodeExec SET dataid = ? WHERE NodeExecid = ?",
+                        ((first_data + i, first_node + i) for i in xrange(nb)))
+
+    def flush(self):
+        """ Write the buffered records. Records which cannot be written are
+        logged and dropped. """
+        with self._write_lock:
+            popleft = self._records.popleft
+            records = [popleft() for i in xrange(len(self._records))]
+            if not records:
+                return
+            exec_rows = dict(self._exec_rows)
+            try:
+                with self._conn:
+                    self._write(records)
+            except Exception, e:
+                # rows inserted by this transaction are rolled back
+                self._exec_rows = exec_rows
+                logger.error('Cannot write %d provenance records in %s: %s'
+                             % (len(records), self.filename, e))
+
+    def close(self):
+        """ Stop the writer and write the buffered records """
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        self._conn.close()
+        _open_stores.discard(self)
+
+    ###########################################################################
+    # queries
+
+    def _query(self, sql, args=()):
+        self.flush()
+        with self._write_lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def executions(self, name=None):
+        """ Return the list of (exec id, workflow name, start time, end time)
+        of the executions of the workflow name (all if None) """
+        sql = "SELECT CompositeNodeExecid, name, createtime, endtime FROM CompositeNodeExec"
+        if name is None:
+            return self._query(sql + " ORDER BY CompositeNodeExecid")
+        return self._query(sql + " WHERE name = ? ORDER BY CompositeNodeExecid", (name,))
+
+    def node_executions(self, exec_id):
+        """ Return the list of (vid, factory, start time, end time, input size,
+        output size) of the nodes executed during the execution exec_id """
+        return self._query(
+            "SELECT Nodeid, NodeFactory, NodeExec.createtime, endtime, input_size, size "
+            "FROM NodeExec LEFT JOIN Data ON NodeExec.dataid = Data.dataid "
+            "WHERE CompositeNodeExecid = ? ORDER BY NodeExec.NodeExecid", (exec_id,))
+
+    def get_prov(self, name=None):
+        """ Return a Prov of the mean exec time, input size and output size of
+        each vertex over the executions of the workflow name (all if None).
+
+        Items are indexed by str(vid), as expected by costs.minimum_cost_site.
+        """
+        sql = ("SELECT Nodeid, avg(NodeExec.endtime - NodeExec.createtime), "
+               "avg(input_size), avg(size) "
+               "FROM NodeExec LEFT JOIN Data ON NodeExec.dataid = Data.dataid ")
+        if name is None:
+            rows = self._query(sql + "GROUP BY Nodeid")
+        else:
+            rows = self._query(
+                sql + "JOIN CompositeNodeExec ON "
+                "NodeExec.CompositeNodeExecid = CompositeNodeExec.CompositeNodeExecid "
+                "WHERE name = ? GROUP BY Nodeid", (name,))
+
+        prov = Prov()
+        prov.add_prov_itemlist(Prov_item(str(vid), exec_time, input_size or 0,
+                                         output_size or 0)
+                               for vid, exec_time, input_size, output_size in rows)
+        return prov
+
+
+_open_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _close_stores():
+    """ Write the buffered records before exit """
+    for store in list(_open_stores):
+        store.close()
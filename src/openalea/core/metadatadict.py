@@ -25,6 +25,15 @@ class MetaDataDict(observer.Observed):
     """Attach meta data of a graphical representation
     of a graph component. This metadata can be
     used to customize the appearance of the node."""
+
+    # One per port: no instance __dict__ unless the dictionary is observed.
+    __slots__ = ('_metaValues', '_metaTypes', '__doTypeChecking',
+                 '__sharedTypes')
+
+    # The types of the dictionaries built from the same slots are shared
+    # until one of them adds or removes a metadata.
+    _shared_types = {}
+
     def __init__(self, **kwargs):
         """Use kwargs to construct the dictionnary.
         Supported keywords are :
@@ -38,6 +47,7 @@ class MetaDataDict(observer.Observed):
         self._metaValues = {}
         self._metaTypes = {}
         self.__doTypeChecking = False
+        self.__sharedTypes = False
 
         if kwargs.get("dict", False):
             values = kwargs.get("dict")
@@ -59,14 +69,47 @@ class MetaDataDict(observer.Observed):
             self.set_slots(slots)
 
 
+    def __getstate__(self):
+        getstate = getattr(observer.Observed, '__getstate__', None)
+        state = getstate(self) if getstate else self.__dict__.copy()
+        state['_metaValues'] = self._metaValues
+        state['_metaTypes'] = self._metaTypes
+        state['_MetaDataDict__doTypeChecking'] = self.__doTypeChecking
+        state['_MetaDataDict__sharedTypes'] = self.__sharedTypes
+        return state
+
+    def __setstate__(self, state):
+        self.__sharedTypes = False
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
+    def _own_types(self):
+        """ Copy the shared types before changing them """
+        if self.__sharedTypes:
+            self._metaTypes = self._metaTypes.copy()
+            self.__sharedTypes = False
+
     def update(self, other):
         assert isinstance(other, self.__class__)
         # self._metaValues = other._metaValues.copy()
         # self._metaTypes = other._metaTypes.copy()
+        self._own_types()
         self._metaValues.update(other._metaValues.copy())
         self._metaTypes.update(other._metaTypes.copy())
 
     def set_slots(self, slots, useSlotDefaults=True):
+        if not self._metaTypes:
+            key = frozenset((name, typ) for name, (typ, val)
+                            in slots.iteritems())
+            self._metaTypes = MetaDataDict._shared_types.setdefault(
+                key, dict(key))
+            self.__sharedTypes = True
+            if useSlotDefaults:
+                for name, (typ, val) in slots.iteritems():
+                    self._metaValues[name] = val
+            return
+
+        self._own_types()
         for name, value in slots.iteritems():
             typ, val = value
             self._metaTypes[name] = typ
@@ -91,6 +134,7 @@ class MetaDataDict(observer.Observed):
         if key in self._metaTypes :
             raise Exception("This key already exists : " + key)
 
+        self._own_types()
         self._metaTypes[key] = valType
         if(notify):
             self.notify_listeners(("metadata_added", key, valType))
@@ -104,6 +148,7 @@ class MetaDataDict(observer.Observed):
 
         if valType and (self._metaTypes[key] != valType): raise Exception("Type mismatch.")
 
+        self._own_types()
         del self._metaTypes[key]
         del self._metaValues[key]
         if(notify):
@@ -182,8 +227,13 @@ class HasAdHoc(object):
             cls.__ad_hoc_from_old_map__[name] = args
 
     def __init__(self):
-        self.__ad_hoc_dict = MetaDataDict(slots= {} if not hasattr(self,'__ad_hoc_slots__') else self.__ad_hoc_slots__)
+        # the dictionary is created on first use
+        pass
 
     def get_ad_hoc_dict(self):
-        return self.__ad_hoc_dict
+        try:
+            return self.__ad_hoc_dict
+        except AttributeError:
+            self.__ad_hoc_dict = MetaDataDict(slots= {} if not hasattr(self,'__ad_hoc_slots__') else self.__ad_hoc_slots__)
+            return self.__ad_hoc_dict
 
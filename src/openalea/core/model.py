@@ -46,10 +46,49 @@ Two convenience methods, see :meth:`~openalea.core.model.IModel.run` and "call"
 can be used to reset internal state and run a given number of step (one by default)
 
 By default, functions are generated for "init", "run" and "animate"
+
+Code is compiled once, when it is set, and runs directly in the model
+namespace: the interpreter namespace is only read when the model is
+initialized. Code which is not plain python (IPython magics, syntax errors)
+is run by the interpreter, as before.
 """
 
+import threading
 from ast import literal_eval
-from copy import copy
+
+# source -> code object, None if source can not be compiled
+_code_cache = {}
+_max_cached_code = 1024
+
+# stack of the namespaces of the models being run, by thread
+_running = threading.local()
+
+
+def compile_code(source):
+    """
+    :return: code object of source, compiled once for all models, or None
+        if source is not plain python.
+    """
+    try:
+        return _code_cache[source]
+    except KeyError:
+        pass
+    try:
+        code = compile(source, '<model>', 'exec')
+    except (SyntaxError, ValueError, TypeError, OverflowError):
+        code = None
+    if len(_code_cache) >= _max_cached_code:
+        _code_cache.clear()
+    _code_cache[source] = code
+    return code
+
+
+def _namespaces():
+    try:
+        return _running.namespaces
+    except AttributeError:
+        _running.namespaces = []
+        return _running.namespaces
 
 
 class IModel(object):
@@ -148,6 +187,7 @@ class Model(object):
 
         self._ns = {}
         self._code = {}
+        self._compiled = {}
         self._initial_code = ''
 
         self.outputs = []
@@ -163,35 +203,70 @@ class Model(object):
             m.set_func_code(fname, code)
         return m
 
-    def _run_code(self, code):
-        if isinstance(code, basestring):
+    def _run_code(self, code, namespace, code_obj=None):
+        # Run code in namespace. Errors are displayed, like the interpreter does.
+        if code_obj is None and isinstance(code, basestring):
+            code_obj = compile_code(code)
+        elif code_obj is None:
+            code_obj = code
+
+        namespaces = _namespaces()
+        if code_obj is None:
+            self._run_cell(code, namespace, namespaces)
+            return
+
+        namespaces.append(namespace)
+        try:
+            exec code_obj in namespace
+        except:
+            getattr(self.interp, 'shell', self.interp).showtraceback()
+        finally:
+            namespaces.pop()
+
+    def _run_cell(self, code, namespace, namespaces):
+        # Let interpreter run code in its namespace, filled with namespace
+        user_ns = self.interp.user_ns
+        old_ns = dict(user_ns)
+        user_ns.clear()
+        user_ns.update(namespace)
+        namespaces.append(user_ns)
+        try:
             self.interp.run_cell(code)
-        else:
-            self.interp.run_code(code)
+            namespace.update(user_ns)
+        finally:
+            namespaces.pop()
+            user_ns.clear()
+            user_ns.update(old_ns)
 
     def set_code(self, code):
         self.set_step_code(code)
 
     def set_func_code(self, fname, code):
         self._code[fname] = code
+        if isinstance(code, basestring):
+            self._compiled[fname] = compile_code(code)
+        else:
+            self._compiled[fname] = code
 
     def set_step_code(self, code):
         self.set_func_code('step', code)
 
-    def _push_ns(self):
-        # Save default namespace
-        self._old_ns = copy(self.interp.user_ns)
-
     def _fill_namespace(self, *args, **kwds):
         # Create a new namespace with
-        #  - interpreter namespace
+        #  - interpreter namespace, or namespace of the model running this one
         #  - initial namespace given by user (namespace keyword)
         #  - passed variables
         # Then, replace input variable names with right values
         initial_ns = kwds.pop('namespace', {})
 
+        namespaces = _namespaces()
+        if namespaces:
+            parent_ns = namespaces[-1]
+        else:
+            parent_ns = self.interp.user_ns
+
         global_ns = {}
-        global_ns.update(self._old_ns)
+        global_ns.update(parent_ns)
         global_ns.update(initial_ns)
         global_ns.update(kwds)
         global_ns['this'] = self
@@ -201,31 +276,12 @@ class Model(object):
 
         self._ns = global_ns
 
-        self.interp.user_ns.clear()
-        self.interp.user_ns.update(self._ns)
-
-    def _populate_ns(self):
-        # add vars defined in init function
-        self._ns.update(self.interp.user_ns)
-        #for k in self.interp.user_ns:
-        #    if k not in self._ns:
-        #        self._ns[k] = self.interp.user_ns[k]
-
-    def _pop_ns(self):
-        # Restore original namespace
-        self.interp.user_ns.clear()
-        self.interp.user_ns.update(self._old_ns)
-
     def init(self, *args, **kwds):
-        self._push_ns()
         self._fill_namespace(*args, **kwds)
 
         # Run init code
         if 'init' in self._code:
-            self._run_code(self._code['init'])
-
-        self._populate_ns()
-        self._pop_ns()
+            self._run_code(self._code['init'], self._ns, self._compiled.get('init'))
 
         return self.output_from_ns(self._ns)
 
@@ -233,35 +289,23 @@ class Model(object):
         return self.run(*args, **kwds)
 
     def _exec(self, fname='step'):
-        # Save namespace
-        old_ns = {}
-        old_ns.update(self.interp.user_ns)
-        self.interp.user_ns.clear()
-        self.interp.user_ns.update(self._ns)
-
-        # Run code
+        # Run code in model namespace, variables are kept from one step to the next
         if fname in self._code:
-            self._run_code(self._code[fname])
-        outputs = self.output_from_ns(self.interp.user_ns)
-
-        self.interp.user_ns.clear()
-        self.interp.user_ns.update(old_ns)
+            self._run_code(self._code[fname], self._ns, self._compiled.get(fname))
+        outputs = self.output_from_ns(self._ns)
 
         self.outputs = outputs
         return outputs
 
     def run_code(self, code, namespace):
-        # Save namespace
         ns = {}
         ns.update(namespace)
-        old_ns = self.interp.user_ns
-        self.interp.user_ns = ns
-        self._run_code(code)
-        self.interp.user_ns = old_ns
+        self._run_code(code, ns)
 
+        old_ns = self.interp.user_ns
         final_ns = {}
         for key in ns:
-            if key in old_ns:
+            if key in old_ns or key == '__builtins__':
                 continue
             final_ns[key] = ns[key]
         return final_ns
@@ -270,6 +314,7 @@ class Model(object):
         self.set_func_code('selection', code)
         outputs = self._exec('selection')
         del self._code['selection']
+        del self._compiled['selection']
         return outputs
 
     def step(self, *args, **kwds):
@@ -357,7 +402,7 @@ class Model(object):
 
     @step_code.setter
     def step_code(self, code):
-        self._code['step'] = code
+        self.set_func_code('step', code)
 
     def _set_code(self, code):
         self.set_code(code)
@@ -406,14 +451,17 @@ class PythonModel(Model):
             return code
 
     def set_code(self, code):
-        from openalea.core.model_inout import parse_docstring, get_docstring, extract_functions
+        from openalea.core.model_inout import parse_code
         self._initial_code = code
-        model, self.inputs_info, self.outputs_info = parse_docstring(code)
-        funcs = extract_functions(code)
-        self.set_func_code('init', code)
+        parsed = parse_code(code)
+        self.inputs_info = parsed.inputs
+        self.outputs_info = parsed.outputs
+        funcs = parsed.funcs
+        self._code['init'] = code
+        self._compiled['init'] = parsed.code
 
         for fname in ['step', 'run', 'animate']:
             if fname in funcs:
                 self.set_func_code(fname, funcs[fname])
 
-        self._doc = get_docstring(code)
+        self._doc = parsed.docstring
@@ -18,9 +18,13 @@
 """ Definition of Input and Output objects.
 
 Code to parse the functions.
+
+Parse results are cached by hash of the source, see :func:`parse_code`.
 """
 import ast
+import hashlib
 import re
+from collections import OrderedDict, namedtuple
 from openalea.core import logger
 from openalea.core.service.interface import interface_class, guess_interface
 import textwrap
@@ -227,6 +231,12 @@ def parse_doc(docstring):
 
     :return: model, inputs, outputs
     """
+    model, inputs, outputs = _parse_doc(docstring)
+    return model, [InputObj(inp) for inp in inputs], [OutputObj(outp) for outp in outputs]
+
+
+def _parse_doc(docstring):
+    # model, inputs, outputs as strings
     model, inputs, outputs = parse_function(docstring)
 
     inputs2, outputs2 = parse_input_and_output(docstring)
@@ -237,14 +247,7 @@ def parse_doc(docstring):
     if outputs2:
         outputs = outputs2
 
-    ret_inputs = []
-    ret_outputs = []
-    if inputs:
-        ret_inputs = [InputObj(inp) for inp in inputs]
-    if outputs:
-        ret_outputs = [OutputObj(outp) for outp in outputs]
-
-    return model, ret_inputs, ret_outputs
+    return model, list(inputs or []), list(outputs or [])
 
 
 
@@ -321,10 +324,12 @@ def extract_functions(codestring, filename='tmp'):
     #    return 1
     # TODO: support IPython %magic
 
-    funcs = {}
+    return _extract_functions(ast_parse(codestring), filename)
+
 
-    r = ast_parse(codestring)
-    for statement in ast.walk(r):
+def _extract_functions(tree, filename='tmp'):
+    funcs = {}
+    for statement in ast.walk(tree):
         if isinstance(statement, ast.FunctionDef):
             wrapped = ast.Interactive(body=statement.body)
             try:
@@ -336,6 +341,110 @@ def extract_functions(codestring, filename='tmp'):
 
     return funcs
 
+
+#########################################
+# Cache of parse results
+#########################################
+
+ParsedCode = namedtuple('ParsedCode', 'model inputs outputs funcs docstring code')
+
+
+def source_key(string):
+    """
+    :return: hash of source code *string*, used as key of the parse cache
+    """
+    if isinstance(string, unicode):
+        string = string.encode('utf-8')
+    return hashlib.sha1(string).hexdigest()
+
+
+class ParseCache(object):
+    """
+    Results of the parsing of model sources, indexed by hash of the source.
+
+    An entry stores the docstring, the model name, the inputs and outputs
+    (as strings), the functions extracted by :func:`extract_functions` and
+    the whole source compiled. Entries are kept in a LRU of max_items
+    entries.
+    """
+
+    def __init__(self, max_items=2000):
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        # number of entries computed since creation
+        self.nb_parsed = 0
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def _compile(self, string):
+        """
+        :return: functions extracted from string and string compiled
+            (None if it has syntax errors)
+        """
+        try:
+            tree = ast.parse(string)
+        except (SyntaxError, ValueError, TypeError):
+            return extract_functions(string), None
+        try:
+            code = compile(tree, '<model>', 'exec')
+        except (SyntaxError, ValueError, TypeError, OverflowError):
+            code = None
+        return _extract_functions(tree), code
+
+    def _parse(self, string):
+        docstring = get_docstring(string)
+        model, inputs, outputs = _parse_doc(docstring)
+        funcs, code = self._compile(string)
+        return (model, tuple(inputs), tuple(outputs), funcs, docstring, code)
+
+    def entry(self, string):
+        """
+        :return: cached parse result of string (tuple of plain python objects)
+        """
+        key = source_key(string)
+        entries = self.entries
+        try:
+            entry = entries.pop(key)
+        except KeyError:
+            entry = self._parse(string)
+            self.nb_parsed += 1
+            if len(entries) >= self.max_items:
+                entries.popitem(last=False)
+        entries[key] = entry
+        return entry
+
+    def parse(self, string):
+        """
+        :return: ParsedCode of string. Inputs and outputs are new
+            InputObj and OutputObj, the other fields are shared.
+        """
+        model, inputs, outputs, funcs, docstring, code = self.entry(string)
+        return ParsedCode(model, [InputObj(inp) for inp in inputs],
+                          [OutputObj(outp) for outp in outputs], dict(funcs),
+                          docstring, code)
+
+
+parse_cache = ParseCache()
+
+
+def parse_code(string):
+    """
+    Parse model source *string* with the shared parse cache.
+    Unchanged sources are not parsed again.
+
+    :return: ParsedCode (model, inputs, outputs, funcs, docstring, code).
+        funcs is the result of :func:`extract_functions`, code is string
+        compiled or None if it has syntax errors.
+    """
+    return parse_cache.parse(string)
+
 #################################################
 
 def _replace_regex(line, regex, replaced="_"):
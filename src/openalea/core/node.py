@@ -152,6 +152,10 @@ class AbstractPort(dict, Observed, HasAdHoc):
     AbstractPort is a dict for historical reason.
     """
 
+    # No instance __dict__ for the bookkeeping of the many ports
+    # (it is only created if the port is observed).
+    __slots__ = ('vertex', '__id', '_HasAdHoc__ad_hoc_dict')
+
     def __init__(self, vertex):
         dict.__init__(self)
         HasAdHoc.__init__(self)
@@ -160,6 +164,18 @@ class AbstractPort(dict, Observed, HasAdHoc):
         self.vertex = ref(vertex)
         self.__id = None
 
+    def __getstate__(self):
+        getstate = getattr(Observed, '__getstate__', None)
+        state = getstate(self) if getstate else self.__dict__.copy()
+        for k in ('vertex', '_AbstractPort__id', '_HasAdHoc__ad_hoc_dict'):
+            if hasattr(self, k):
+                state[k] = getattr(self, k)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
     def __hash__(self):
         return id(self)
 
@@ -240,6 +256,29 @@ class OutputPort(AbstractPort):
         AbstractPort.__init__(self, node)
 
 
+class PortIndexMap(dict):
+    """ Translation of the port names to their index.
+    The indices are translated to themselves without being stored.
+    """
+
+    __slots__ = ('nb_ports',)
+
+    def __init__(self):
+        dict.__init__(self)
+        self.nb_ports = 0
+
+    def __missing__(self, key):
+        if isinstance(key, (int, long)) and 0 <= key < self.nb_ports:
+            return key
+        raise KeyError(key)
+
+    def __getstate__(self):
+        return self.nb_ports
+
+    def __setstate__(self, nb_ports):
+        self.nb_ports = nb_ports
+
+
 class Annotation(AbstractNode):
     def __init__(self):
         AbstractNode.__init__(self)
@@ -404,6 +443,22 @@ class Node(AbstractNode):
 
     user_application = property(get_user_application, set_user_application)
 
+    # vectorizable flag set on the node, the one of the factory if None
+    _vectorizable = None
+
+    def get_vectorizable(self):
+        """ Return True if __call__ accepts a list of values for each input
+        (see CompositeNode.eval_batch) """
+        if self._vectorizable is not None:
+            return self._vectorizable
+        return getattr(self.factory, 'vectorizable', False)
+
+    def set_vectorizable(self, data):
+        """ Override the flag of the factory, the flag is not saved """
+        self._vectorizable = data
+
+    vectorizable = property(get_vectorizable, set_vectorizable)
+
     def set_caption(self, newcaption):
         """ Define the node caption """
         self.internal_data['caption'] = newcaption
@@ -494,7 +549,7 @@ class Node(AbstractNode):
         # Description (list of dict (name=, interface=, ...))
         self.input_desc = []
         # translation of name to id or id to id (identity)...
-        self.map_index_in = {}
+        self.map_index_in = PortIndexMap()
         # Input states : "connected", "hidden"
         self.input_states = []
         self.notify_listeners(("cleared_input_ports",))
@@ -505,7 +560,7 @@ class Node(AbstractNode):
         # Description (list of dict (name=, interface=, ...))
         self.output_desc = []
         # translation of name to id or id to id (identity)...
-        self.map_index_out = {}
+        self.map_index_out = PortIndexMap()
         self.notify_listeners(("cleared_output_ports",))
 
 
@@ -540,7 +595,7 @@ class Node(AbstractNode):
         self.input_states.append(None)
         index = len(self.inputs) - 1
         self.map_index_in[name] = index
-        self.map_index_in[index] = index
+        self.map_index_in.nb_ports = index + 1
         port.set_id(index)
 
         self.set_input(name, value, False)
@@ -561,7 +616,7 @@ class Node(AbstractNode):
         self.output_desc.append(port)
         index = len(self.outputs) - 1
         self.map_index_out[name] = index
-        self.map_index_out[index] = index
+        self.map_index_out.nb_ports = index + 1
         port.set_id(index)
         self.notify_listeners(("output_port_added", port))
         return port
@@ -636,9 +691,7 @@ class Node(AbstractNode):
         and a timed delay if the node needs a reevaluation at a later time.
         """
         # lazy evaluation
-        if self.block and self.get_nb_output() != 0 and self.output(0) is not None:
-            return False
-        if (self.delay == 0 and self.lazy) and not self.modified:
+        if self.is_up_to_date():
             return False
 
         self.notify_listeners(("start_eval",))
@@ -646,35 +699,57 @@ class Node(AbstractNode):
         # Run the node
         outlist = self.__call__(self.inputs)
 
+        return self.end_eval(outlist)
+
+    def is_up_to_date(self):
+        """
+        Return True if the evaluation of the node can be skipped
+        (blocked node with outputs or lazy node not modified).
+        """
+        if self.block and self.get_nb_output() != 0 and self.output(0) is not None:
+            return True
+        if (self.delay == 0 and self.lazy) and not self.modified:
+            return True
+        return False
+
+    def end_eval(self, outlist):
+        """
+        Copy the result of __call__ into the outputs and set the node state.
+        Return the same value as eval.
+        """
         # Copy outputs
+        for i, value in enumerate(self.split_outputs(outlist)):
+            self.outputs[i] = value
+            self.output_desc[i].notify_listeners(("tooltip_modified",))
+
+        # Set State
+        self.modified = False
+        self.notify_listeners(("stop_eval",))
+
+        if self.delay == 0:
+            return False
+        return self.delay
+
+    def split_outputs(self, outlist):
+        """
+        Return the list of output values contained in outlist, the result of
+        __call__. The list may be shorter than the number of outputs.
+        """
         # only one output
         if len(self.outputs) == 1:
             try:
                 if hasattr(outlist, "__getitem__") and len(outlist) == 1:
-                    self.outputs[0] = outlist[0]
-                else:
-                    self.outputs[0] = outlist
+                    return [outlist[0]]
             except TypeError:
-                self.outputs[0] = outlist
-
-            self.output_desc[0].notify_listeners(("tooltip_modified",))
+                pass
+            return [outlist]
 
         else: # multi output
             if(not isinstance(outlist, tuple) and
                not isinstance(outlist, list)):
                 outlist = (outlist,)
 
-            for i in range(min(len(outlist), len(self.outputs))):
-                self.output_desc[i].notify_listeners(("tooltip_modified",))
-                self.outputs[i] = outlist[i]
-
-        # Set State
-        self.modified = False
-        self.notify_listeners(("stop_eval",))
-
-        if self.delay == 0:
-            return False
-        return self.delay
+            return list(outlist[:len(self.outputs)])
 
     def __getstate__(self):
         """ Pickle function : remove not saved data"""
@@ -816,6 +891,7 @@ class AbstractFactory(Observed):
                  view=None,
                  alias=None,
                  authors=None,
+                 vectorizable=False,
                  **kargs):
         """
         Create a factory.
@@ -829,6 +905,7 @@ class AbstractFactory(Observed):
         :param view: custom view (default = None)
         :param alias: list of alias name
         :param authors: authors of the node. If Node, it should be replaced by the package authors.
+        :param vectorizable: the node accepts lists of values (default = False)
 
         .. note:: inputs and outputs parameters are list of dictionnary such
 
@@ -853,6 +930,7 @@ class AbstractFactory(Observed):
         self.delay = delay
         self.alias = alias
         self.authors = authors
+        self.vectorizable = vectorizable
     # Package property
 
     def set_pkg(self, port):
@@ -997,7 +1075,12 @@ class AbstractFactory(Observed):
 
     def __setstate__(self, dict):
         self.__dict__.update(dict)
-        self.get_pkg()
+        from openalea.core.pkgmanager import UnknownPackageError
+        try:
+            self.get_pkg()
+        except UnknownPackageError:
+            # the package is not registered yet (e.g. wralea index)
+            pass
 
 
 def Alias(factory, name):
@@ -1100,8 +1183,7 @@ class NodeFactory(AbstractFactory):
         return odict
 
     def __setstate__(self, dict):
-        self.__dict__.update(dict)
-        self.get_pkg()
+        AbstractFactory.__setstate__(self, dict)
 
     def copy(self, **args):
         """ Copy factory
@@ -19,6 +19,56 @@
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
+import threading
+from contextlib import contextmanager
+from operator import itemgetter
+
+
+class _NotificationModes(threading.local):
+    """ Notification modes of a thread (see quiet_notifications,
+    batch_notifications and queued_notifications) """
+    quiet = 0
+    batch = None
+    queue = None
+
+
+_modes = _NotificationModes()
+
+
+def _hold_notification(sender, event):
+    """ Drop, queue or batch (sender, event) according to the notification
+    modes of the current thread. Return False if the event has to be sent """
+    modes = _modes
+    if modes.quiet:
+        return True
+    if modes.queue is not None:
+        modes.queue.append((sender, event))
+        return True
+    if modes.batch is not None:
+        modes.batch.add(sender, event)
+        return True
+    return False
+
+
+def _with_notification_modes(base):
+    """ Return a subclass of the Observed class base which applies the
+    notification modes of this module before sending the notifications """
+
+    class Observed(base):
+        __doc__ = base.__doc__
+
+        def notify_listeners(self, event=None):
+            if _hold_notification(self, event):
+                return
+            base.notify_listeners(self, event)
+
+        def send_notification(self, event=None):
+            """ Send event to the listeners whatever the notification modes """
+            base.notify_listeners(self, event)
+
+    return Observed
+
+
 try:
     import openalea.grapheditor
     graphobserver = True
@@ -30,6 +80,7 @@ except ImportError, e:
 
 if graphobserver:
     from openalea.grapheditor.observer import *
+    Observed = _with_notification_modes(Observed)
 else:
    import weakref
    from collections import deque
@@ -38,13 +89,22 @@ else:
    class Observed(object):
        """ Observed Object """
 
+       # Class defaults: the instance attributes are only created when
+       # needed, most nodes and ports are never observed.
+       listeners = frozenset()
+       __isNotifying = False
+       __postNotifs = () #calls to execute after a notication is done
+       __exclusive = None
+       __blockNotifs = False
+
        def __init__(self):
+           pass
 
-           self.listeners = set()
-           self.__isNotifying = False
-           self.__postNotifs = [] #calls to execute after a notication is done
-           self.__exclusive = None
-           self.__blockNotifs = False
+       def __post(self, action):
+           """ Execute action after the current notification """
+           if not self.__postNotifs:
+               self.__postNotifs = []
+           self.__postNotifs.append(action)
 
        def register_listener(self, listener):
            """ Add listener to list of listeners.
@@ -52,14 +112,18 @@ else:
            is delayed until it finishes."""
            if(not self.__isNotifying):
                wr = weakref.ref(listener, self.unregister_listener)
+               if self.listeners is Observed.listeners:
+                   self.listeners = set()
                self.listeners.add(wr)
            else:
                def push_listener_after():
                    self.register_listener(listener)
-               self.__postNotifs.append(push_listener_after)
+               self.__post(push_listener_after)
 
        def unregister_listener(self, listener):
            """ Remove listener from the list of listeners """
+           if(not self.listeners):
+               return
            if(not self.__isNotifying):
                if isinstance(listener, weakref.ref):
                    self.listeners.discard(listener)
@@ -73,7 +137,7 @@ else:
            else:
                def discard_listener_after():
                    self.unregister_listener(listener)
-               self.__postNotifs.append(discard_listener_after)
+               self.__post(discard_listener_after)
 
        def transfer_listeners(self, newObs):
            """Takes all this observed's listeners, unregisters them
@@ -104,7 +168,15 @@ else:
 
            :param event: an object to pass to the notify function
            """
-
+           # fast path: nobody to notify
+           if not self.listeners and self.__exclusive is None:
+               return
+           if self.__exclusive is None and _hold_notification(self, event):
+               return
+           self.send_notification(event)
+
+       def send_notification(self, event=None):
+           """ Send event to the listeners whatever the notification modes """
            self.__isNotifying = True
 
            #If an exclusive handler is set let's only
@@ -131,14 +203,16 @@ else:
            self.post_notification()
 
        def post_notification(self):
+           if not self.__postNotifs:
+               return
            for action in self.__postNotifs:
                action()
-           self.__postNotifs = []
+           self.__postNotifs = ()
 
        def __getstate__(self):
            """ Pickle function """
            odict = self.__dict__.copy()
-           odict['listeners'] = set()
+           odict.pop('listeners', None)
            return odict
 
    class AbstractListener(object):
@@ -223,3 +297,100 @@ else:
 
        return wrapped
 
+
+###############################################################################
+# Notification modes
+
+class NotificationBatch(object):
+    """ Coalesced notifications.
+
+    An event sent several times by the same observed object is delivered
+    once, at the position of its last occurrence.
+    """
+
+    def __init__(self):
+        # (id(sender), event) -> (seq, sender, event)
+        self.pending = {}
+        self.seq = 0
+
+    def add(self, sender, event):
+        """ Queue event of sender """
+        try:
+            key = (id(sender), event)
+            hash(key)
+        except TypeError:
+            # unhashable events are not coalesced
+            key = object()
+
+        self.seq += 1
+        self.pending[key] = (self.seq, sender, event)
+
+    def deliver(self):
+        """ Send the queued events """
+        pending, self.pending = self.pending, {}
+        for seq, sender, event in sorted(pending.itervalues(), key=itemgetter(0)):
+            sender.send_notification(event)
+
+
+@contextmanager
+def quiet_notifications():
+    """ Drop all the notifications sent by the current thread in the block """
+    _modes.quiet += 1
+    try:
+        yield
+    finally:
+        _modes.quiet -= 1
+
+
+@contextmanager
+def batch_notifications():
+    """ Coalesce the notifications sent by the current thread in the block
+    and deliver them at the end of the (outermost) block """
+    if _modes.batch is not None:
+        yield
+        return
+
+    _modes.batch = NotificationBatch()
+    try:
+        yield
+    finally:
+        batch, _modes.batch = _modes.batch, None
+        batch.deliver()
+
+
+@contextmanager
+def queued_notifications(queue):
+    """ Append the notifications sent by the current thread in the block to
+    queue, as (sender, event), instead of sending them.
+
+    Used to send from the main thread the notifications of code run in
+    worker threads: sender.notify_listeners(event) for each item of queue.
+    """
+    previous = _modes.queue
+    _modes.queue = queue
+    try:
+        yield queue
+    finally:
+        _modes.queue = previous
+
+
+@contextmanager
+def _all_notifications():
+    yield
+
+
+def notification_mode(mode=None):
+    """ Return a context manager for the notification mode:
+    None (all the notifications), 'quiet' or 'batch'.
+
+    Modes apply to the current thread. The notifications that worker threads
+    queue for the calling thread (see queued_notifications) follow the mode
+    of the calling thread once they are sent.
+    """
+    if mode is None:
+        return _all_notifications()
+    elif mode == 'quiet':
+        return quiet_notifications()
+    elif mode == 'batch':
+        return batch_notifications()
+    raise ValueError('Unknown notification mode %r' % (mode,))
@@ -184,6 +184,7 @@ class Package(PackageDict):
                 if (modulefile in s):
                     module.oa_invalidate = True
                     reload(module)
+                    self.nb_changes += 1
                     print "Reloaded ", module.__name__
             except:
                 pass
@@ -525,6 +526,18 @@ class AbstractPackageReader(object):
         """ Create and add a package in the package manager. """
         raise NotImplementedError()
 
+    def register_aliases(self, pkg, palias, pkgmanager):
+        """ Register the package aliases of pkg in pkgmanager. """
+        for name in palias:
+            if protected(name) in pkgmanager:
+                alias_pkg = pkgmanager[protected(name)]
+                for name_factory, factory in pkg.iteritems():
+                    if (name_factory not in alias_pkg and
+                       (alias_pkg.name + '.' + name_factory) not in pkgmanager):
+                        alias_pkg[name_factory] = factory
+            else:
+                pkgmanager[protected(name)] = pkg
+
 
 class PyPackageReader(AbstractPackageReader):
     """
@@ -665,15 +678,35 @@ class PyPackageReaderWralea(PyPackageReader):
 
         # Add Package Aliases
         palias = wraleamodule.__dict__.get('__alias__', [])
-        for name in palias:
-            if protected(name) in pkgmanager:
-                alias_pkg = pkgmanager[protected(name)]
-                for name_factory, factory in p.iteritems():
-                    if (name_factory not in alias_pkg and
-                       (alias_pkg.name + '.' + name_factory) not in pkgmanager):
-                        alias_pkg[name_factory] = factory
-            else:
-                pkgmanager[protected(name)] = p
+        self.register_aliases(p, palias, pkgmanager)
+
+
+class CompactPackageReader(AbstractPackageReader):
+    """
+    Build a package of composite nodes from a __wralea__.json or
+    __wralea__.bin file (see cnformat).
+    """
+
+    def register_packages(self, pkgmanager):
+        """ Create and add a package in the package manager. """
+        from openalea.core.cnformat import read_package
+
+        try:
+            name, metainfo, palias, factories = read_package(self.filename)
+        except Exception, e:
+            pkgmanager.log.add('%s is invalid : %s' % (self.filename, e))
+            return None
+
+        p = Package(name, metainfo, os.path.abspath(self.filename))
+        for f in factories:
+            try:
+                p.add_factory(f)
+            except Exception, e:
+                pkgmanager.log.add(str(e))
+
+        pkgmanager.add_package(p)
+        self.register_aliases(p, palias, pkgmanager)
+        return p
 
 
 ######################
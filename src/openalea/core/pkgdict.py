@@ -46,6 +46,11 @@ class PackageDict(dict):
     This object is able to handle protected entry begining with an '#'
     """
 
+    # items are set before the attributes when unpickled
+    nb_public = None
+    # number of changes of the items (see searchindex)
+    nb_changes = 0
+
     def __init__(self, *args):
         self.nb_public = None
         dict.__init__(self, *args)
@@ -67,6 +72,7 @@ class PackageDict(dict):
            not is_protected(item)):
             self.nb_public += 1
 
+        self.nb_changes += 1
         return dict.__setitem__(self, lower(item), y)
 
     def __contains__(self, key):
@@ -86,6 +92,7 @@ class PackageDict(dict):
         if (self.nb_public and not is_protected(key)):
             self.nb_public -= 1
 
+        self.nb_changes += 1
         return dict.__delitem__(self, lower(key))
 
     def get(self, key, default=None):
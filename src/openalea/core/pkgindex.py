@@ -0,0 +1,292 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Persistent index of the wralea files.
+
+The index stores the directories walked to find the wralea files, with
+their modification time, and the packages registered by each wralea
+file, keyed on the file modification time and size.
+When nothing has changed, the packages are registered from the index
+without importing the wralea modules.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import cPickle
+from fnmatch import fnmatch
+
+from openalea.core import logger
+from openalea.core.pkgdict import is_protected
+from openalea.core.settings import get_openalea_home_dir
+
+INDEX_VERSION = 2
+WRALEA_PATTERNS = ('*wralea*.py', '__wralea__.json', '__wralea__.bin')
+
+
+def get_index_filename():
+    """ Return the default filename of the wralea index """
+    return os.path.join(get_openalea_home_dir(), 'wralea_index.pkl')
+
+
+def mtime(filename):
+    """ Return the modification time of filename or None """
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+class WraleaIndex(object):
+    """ On disk index of the wralea files and of their packages.
+
+    - dirs: directory -> (mtime, wralea files, sub directories)
+    - files: wralea file -> (mtime, size, directory mtime, record)
+
+    A record is the pickled list of the packages registered by the file
+    with their keys in the package manager, or None when the packages
+    can not be stored (the file is then imported at each startup).
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = get_index_filename()
+        self.filename = filename
+
+        self.dirs = {}
+        self.files = {}
+        self.modified = False
+
+        self.hits = 0
+        self.misses = 0
+
+        self.load()
+
+    def load(self):
+        """ Read the index file """
+        try:
+            f = open(self.filename, 'rb')
+            try:
+                version, dirs, files = cPickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            return
+
+        if version == INDEX_VERSION:
+            self.dirs, self.files = dirs, files
+
+    def save(self):
+        """ Write the index file if it has been modified """
+        if not self.modified:
+            return
+
+        tmp = self.filename + '.%d' % os.getpid()
+        f = open(tmp, 'wb')
+        try:
+            cPickle.dump((INDEX_VERSION, self.dirs, self.files), f, 2)
+        finally:
+            f.close()
+
+        try:
+            os.rename(tmp, self.filename)
+        except OSError:
+            # Windows does not replace existing files
+            os.remove(self.filename)
+            os.rename(tmp, self.filename)
+        self.modified = False
+
+    def clear(self):
+        """ Forget all the entries """
+        self.dirs = {}
+        self.files = {}
+        self.modified = True
+
+    ###########################################################################
+    # Directories
+    ###########################################################################
+
+    def listdir(self, dirname):
+        """ Return (wralea files, sub directories) of dirname.
+
+        The directory is only read if it changed since the last call.
+        """
+        t = mtime(dirname)
+        if t is None:
+            return None
+
+        entry = self.dirs.get(dirname)
+        if entry is None or entry[0] != t:
+            try:
+                names = os.listdir(dirname)
+            except OSError:
+                return None
+
+            wraleas, subdirs = [], []
+            for name in names:
+                p = os.path.join(dirname, name)
+                if os.path.isdir(p):
+                    subdirs.append(p)
+                elif any(fnmatch(name, pat) for pat in WRALEA_PATTERNS):
+                    wraleas.append(p)
+
+            entry = (t, wraleas, subdirs)
+            self.dirs[dirname] = entry
+            self.modified = True
+
+        return entry
+
+    def find_files(self, directories, recursive=True):
+        """ Return the set of wralea files found in directories """
+        files = set()
+        visited = set()
+
+        stack = [os.path.abspath(d) for d in directories]
+        while stack:
+            d = stack.pop()
+            if d in visited:
+                continue
+            visited.add(d)
+
+            entry = self.listdir(d)
+            if entry is None:
+                continue
+
+            files.update(entry[1])
+            if recursive:
+                stack.extend(entry[2])
+
+        # remove directories which are not on the wralea path anymore
+        if len(visited) != len(self.dirs):
+            for d in set(self.dirs) - visited:
+                del self.dirs[d]
+            self.modified = True
+
+        return files
+
+    ###########################################################################
+    # Packages
+    ###########################################################################
+
+    def key(self, filename):
+        """ Return the key of a wralea file or None """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size, mtime(os.path.dirname(filename))
+
+    def register_packages(self, filename, pkgmanager, reader):
+        """ Register the packages of the wralea file in pkgmanager.
+
+        Use the index when the file has not changed, else read the file
+        with reader and store its packages.
+        """
+        key = self.key(filename)
+        entry = self.files.get(filename)
+
+        if (key is not None and entry is not None and entry[:3] == key and
+                entry[3] is not None):
+            try:
+                record = cPickle.loads(entry[3])
+            except Exception, e:
+                logger.warning('Wralea index: %s is invalid: %s'
+                               % (filename, e))
+            else:
+                self.hits += 1
+                self.replay(record, pkgmanager)
+                return
+
+        self.misses += 1
+        record = self.read(reader, pkgmanager)
+
+        # importing the module may write its .pyc in the directory
+        key = self.key(filename)
+        if key is not None:
+            self.files[filename] = key + (record,)
+            self.modified = True
+
+    def read(self, reader, pkgmanager):
+        """ Register the packages of reader and return their record """
+        pkgs = pkgmanager.pkgs
+        before = dict(pkgs)
+        sizes = dict((k, len(p)) for k, p in before.iteritems()
+                     if is_protected(k))
+        log_index = pkgmanager.log.log_index
+
+        reader.register_packages(pkgmanager)
+
+        # Errors may depend on the environment (e.g. missing modules)
+        if pkgmanager.log.log_index != log_index:
+            return None
+
+        packages = []
+        keys = []
+        for k, p in pkgs.iteritems():
+            if before.get(k) is p:
+                continue
+            for i, q in enumerate(packages):
+                if q is p:
+                    break
+            else:
+                i = len(packages)
+                packages.append(p)
+            keys.append((k, i))
+
+        # factories added to an existing alias package
+        merges = []
+        for k, n in sizes.iteritems():
+            alias_pkg = pkgs.get(k)
+            if alias_pkg is None or len(alias_pkg) == n:
+                continue
+            for i, p in enumerate(packages):
+                names = [name for name, f in alias_pkg.iteritems()
+                         if p.get(name) is f]
+                if names:
+                    merges.append((k, i, names))
+
+        if not packages:
+            return None
+
+        try:
+            return cPickle.dumps((packages, keys, merges), 2)
+        except Exception, e:
+            logger.debug('Wralea index: can not store %s: %s'
+                         % (reader.filename, e))
+            return None
+
+    def replay(self, record, pkgmanager):
+        """ Register the packages of a record """
+        packages, keys, merges = record
+
+        for p in packages:
+            for f in p.itervalues():
+                f.package = p
+
+        for k, i in keys:
+            p = packages[i]
+            if not is_protected(k) and k == p.get_id().lower():
+                pkgmanager.add_package(p)
+            else:
+                pkgmanager[k] = p
+
+        for k, i, names in merges:
+            p = packages[i]
+            alias_pkg = pkgmanager.pkgs.get(k)
+            if alias_pkg is None:
+                pkgmanager[k] = p
+                continue
+            for name in names:
+                if name not in alias_pkg:
+                    alias_pkg[name] = p[name]
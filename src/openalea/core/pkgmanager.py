@@ -31,6 +31,7 @@ from os.path import isdir
 
 import tempfile
 import urlparse
+import json
 from openalea.core.path import path
 from fnmatch import fnmatch
 from pkg_resources import iter_entry_points
@@ -38,7 +39,11 @@ from pkg_resources import iter_entry_points
 from openalea.core.singleton import Singleton
 from openalea.core.observer import Observed
 from openalea.core.package import (Package, UserPackage, PyPackageReader,
-                                   PyPackageReaderWralea, PyPackageReaderVlab)
+                                   PyPackageReaderWralea, PyPackageReaderVlab,
+                                   CompactPackageReader)
+from openalea.core.pkgindex import WraleaIndex, WRALEA_PATTERNS
+from openalea.core.searchindex import SearchIndex
+from openalea.core.depgraph import DependencyGraph
 from openalea.core.settings import get_userpkg_dir, Settings
 from openalea.core.pkgdict import PackageDict, is_protected, protected
 from openalea.core.category import PackageManagerCategory
@@ -140,6 +145,12 @@ class PackageManager(Observed):
         # dictionnary of packages
         self.pkgs = PackageDict()
 
+        # index of the factories for search_node
+        self.search_index = SearchIndex()
+
+        # dependencies of the composite nodes
+        self.dependency_graph = DependencyGraph(self)
+
         # dictionnary of category
         self.category = PseudoGroup("")
 
@@ -152,6 +163,9 @@ class PackageManager(Observed):
         # for packages that we don't want to save in the config file
         self.temporary_wralea_paths = set()
 
+        # persistent index of the wralea files (created on first use)
+        self.wralea_index = None
+
         # Compute system and user PATH to look for packages
         self.set_user_wralea_path()
         self.set_sys_wralea_path()
@@ -332,6 +346,8 @@ class PackageManager(Observed):
         self.sys_wralea_path = set()
 
         self.pkgs = PackageDict()
+        self.search_index.clear()
+        self.dependency_graph.clear()
         self.recover_syspath()
         self.category = PseudoGroup('Root')
 
@@ -519,10 +535,12 @@ class PackageManager(Observed):
 
         # search for wralea.py
         if recursive and SEARCH_OUTSIDE_ENTRY_POINTS:
-            for f in p.walkfiles("*wralea*.py"):
-                wralea_files.add(str(f))
+            for pattern in WRALEA_PATTERNS:
+                for f in p.walkfiles(pattern):
+                    wralea_files.add(str(f))
         else:
-            wralea_files.update(p.glob("*wralea*.py"))
+            for pattern in WRALEA_PATTERNS:
+                wralea_files.update(p.glob(pattern))
 
         for f in wralea_files:
             logger.info("Package Manager : found %s" % f)
@@ -602,16 +620,15 @@ class PackageManager(Observed):
         :return : a list of file paths
         """
 
-        files = set()
         directories = self.get_wralea_path()
-        recursive = True
-        if not SEARCH_OUTSIDE_ENTRY_POINTS:
-            recursive = False
-        if recursive:
-            files = set(f.abspath() for p in directories for f in path(p).walkfiles('*wralea*.py'))
-        else:
-            files = set(f.abspath() for p in directories for f in path(p).glob('*wralea*.py'))
-        return files
+        recursive = SEARCH_OUTSIDE_ENTRY_POINTS
+        return self.get_wralea_index().find_files(directories, recursive)
+
+    def get_wralea_index(self):
+        """ Return the persistent index of the wralea files """
+        if self.wralea_index is None:
+            self.wralea_index = WraleaIndex()
+        return self.wralea_index
 
     def create_readers(self, wralea_files):
         return filter(None, (self.get_pkgreader(f) for f in wralea_files))
@@ -626,6 +643,9 @@ class PackageManager(Observed):
             reader = PyPackageReader(filename)
         elif(filename.endswith('specifications')):
             reader = PyPackageReaderVlab(filename)
+        elif(filename.endswith('__wralea__.json') or
+             filename.endswith('__wralea__.bin')):
+            reader = CompactPackageReader(filename)
 
         else:
             return None
@@ -635,11 +655,15 @@ class PackageManager(Observed):
     def find_and_register_packages(self, no_cache=False):
         """
         Find all wralea on the system and register them
-        If no_cache is True, ignore cache file
+
+        Unchanged wralea files are registered from the wralea index,
+        without importing them.
+        If no_cache is True, ignore the index and read all the files.
         """
 
-#        if(no_cache):
-#            self.delete_cache()
+        index = self.get_wralea_index()
+        if(no_cache):
+            index.clear()
         self.set_sys_wralea_path()
         self.set_user_wralea_path()
         if DEBUG:
@@ -648,8 +672,6 @@ class PackageManager(Observed):
         wralea_files = self.find_all_wralea()
         readerlist = self.create_readers(wralea_files)
 
-        # readerlist = self.find_wralea_files()
-
         if DEBUG:
             t2 = time.clock()
             print '-------------------'
@@ -660,7 +682,7 @@ class PackageManager(Observed):
         for x in readerlist:
             if DEBUG:
                 tn = time.clock()
-            x.register_packages(self)
+            index.register_packages(x.filename, self, x)
             if DEBUG:
                 tt = time.clock() - tn
                 print 'register package ', x.get_pkg_name(), 'in ', time.clock() - tn
@@ -669,43 +691,17 @@ class PackageManager(Observed):
             t3 = time.clock()
             print '-------------------'
             print 'register_packages takes %f seconds' % (t3 - t2)
-#        self.save_cache()
+
+        try:
+            index.save()
+        except (IOError, OSError), e:
+            logger.warning("Cannot write the wralea index: %s" % e)
 
         self.rebuild_category()
 
         if DEBUG:
             return res
 
-    # Cache functions
-    # def get_cache_filename(self):
-    #     """ Return the cache filename """
-
-    #     return os.path.join(tempfile.gettempdir(), ".alea_pkg_cache")
-
-    # def save_cache(self):
-    #     """ Save in cache current package manager state """
-
-    #     f = open(self.get_cache_filename(),'w')
-    #     s = set([pkg.path + "\n" for pkg in self.pkgs.itervalues()])
-    #     f.writelines(list(s))
-    #     f.close()
-
-    # def delete_cache(self):
-    #     """ Remove cache """
-
-    #     n = self.get_cache_filename()
-
-    #     if(os.path.exists(n)):
-    #         os.remove(n)
-
-    # def get_cache(self):
-    #     """ Return cache contents """
-    #     f = open(self.get_cache_filename(), "r")
-    #     for d in f:
-    #         d = d.strip()
-    #         yield d
-    #     f.close()
-
     ###############################################################################
     # Package creation
     ###############################################################################
@@ -769,6 +765,7 @@ class PackageManager(Observed):
 
     def __setitem__(self, key, val):
         self.pkgs[key] = val
+        self.search_index.discard(key)
         self.notify_listeners("update")
 
     def __len__(self):
@@ -776,6 +773,7 @@ class PackageManager(Observed):
 
     def __delitem__(self, item):
         r = self.pkgs.__delitem__(item)
+        self.search_index.discard(item)
         self.rebuild_category()
         self.notify_listeners("update")
         return r
@@ -861,52 +859,13 @@ class PackageManager(Observed):
           3 - Then : Number of occurences of search_str in the category name
           4 - Finally : presence of search_str in package name and position
               in the name (close to the begining = higher score)
-        """
-
-        search_str = search_str.upper()
-
-        match = []
-
-        # Search for each package and for each factory
-        for name, pkg in self.iteritems():
-            if is_protected(name):
-                continue  # alias
-
-            for fname, factory in pkg.iteritems():
-                if is_protected(fname): 
-                    continue  # alias
-
-                # -- The scores for each string that is explored.
-                # They are long ints because we make a 96 bits bitshift
-                # to compute the final score --
-                facNameScore = 0L
-                facDescScore = 0L
-                facCateScore = 0L
-                pkgNameScore = 0L
-
-                fname = factory.name.upper()
-                if search_str in fname:
-                    l = float(len(fname))
-                    facNameScore = long(100 * (1 - fname.index(search_str) / l))
-
-                facDescScore = long(factory.description.upper().count(search_str))
-                facCateScore = long(factory.category.upper().count(search_str))
-
-                pname = pkg.name.upper()
-                if search_str in pname:
-                    l = float(len(pname))
-                    pkgNameScore = long(100 * (1 - pname.index(search_str) / l))
 
-                score = (facNameScore << (32 * 3) | facDescScore << (32 * 2) | 
-                         facCateScore << (32 * 1) | pkgNameScore << (32))
-                if score > 0:
-                    match.append((score, factory))
+        The factories are looked up in self.search_index, which is
+        updated with the packages registered since the last search.
+        """
 
-        # Filter ports
-        if(nb_inputs >= 0):
-            match = filter(lambda (sc, x): x and x.inputs and len(x.inputs) == nb_inputs, match)
-        if(nb_outputs >= 0):
-            match = filter(lambda (sc, x): x and x.outputs and len(x.outputs) == nb_outputs, match)
+        self.search_index.update(self.pkgs)
+        match = self.search_index.search(search_str, nb_inputs, nb_outputs)
 
         if not len(match):
             return match
@@ -952,47 +911,6 @@ class PackageManager(Observed):
         nf = [f for p in pkgs for f in p.itervalues() if f.is_node()]
         return nf
 
-    def _dependencies(self, factory):
-        f = factory
-        if not f.is_composite_node():
-            return
-
-        for p, n in f.elt_factory.values():
-            if is_protected(p) or is_protected(n):
-                continue
-            try:
-                fact = self[p][n]
-            except:
-                # print p, n
-                continue
-            yield fact
-
-            for df in self._dependencies(fact):
-                yield df
-
-    def _missing_dependencies(self, factory, l=[]):
-
-        f = factory
-        if not f.is_composite_node():
-            return
-
-        for p, n in f.elt_factory.values():
-            if is_protected(p) or is_protected(n):
-                continue
-            try:
-                fact = self[p][n]
-            except:
-                l.append((p, n))
-                continue
-            yield fact
-
-            for df in self._missing_dependencies(fact, l):
-                yield df
-
-    def _missing(self, factory, l=[]):
-        list(self._missing_dependencies(factory, l))
-        return l
-
     def missing_dependencies(self, package_or_factory=None):
         """ Return all the dependencies of a package or a factory. """
         f = package_or_factory
@@ -1025,13 +943,12 @@ class PackageManager(Observed):
     def _pkg_dependencies(self, package):
         cns = [f for f in package.itervalues() if f.is_composite_node()]
         factories = set(
-            (f.package.name, f.name) for cn_factory in cns for f in self._dependencies(cn_factory) 
-            if f.package.name != package.name)
+            (pname, name) for pname, name in self.dependency_graph.dependencies(cns)
+            if pname != package.name)
         return sorted(factories)
 
     def _cn_dependencies(self, factory):
-        factories = set((f.package.name, f.name) for f in self._dependencies(factory))
-        return sorted(factories)
+        return sorted(self.dependency_graph.dependencies([factory]))
 
     def _all_missing_dependencies(self):
         d = {}
@@ -1043,17 +960,13 @@ class PackageManager(Observed):
 
     def _missing_pkg_dependencies(self, package):
         cns = [f for f in package.itervalues() if f.is_composite_node()]
-        l = []
-        for cn in cns:
-            self._missing(cn, l)
-        factories = set(l)
+        factories = self.dependency_graph.missing(cns)
         if factories:
             return sorted(factories)
         return None
 
     def _missing_cn_dependencies(self, factory):
-        l = []
-        factories = set(self._missing(factory, l))
+        factories = self.dependency_graph.missing([factory])
         if factories:
             return sorted(factories)
         return None
@@ -1063,13 +976,21 @@ class PackageManager(Observed):
 
         return a list of factory.
         """
-        res = []
-        for pkg in self.get_packages():
-            cns = [f for f in pkg.itervalues() if f.is_composite_node()]
-            res.extend(
-                (pkg.name, cn.name) for cn in cns for pname, name in self._cn_dependencies(cn) 
-                if name == factory_name)
-        return res
+        return self.dependency_graph.who_use(factory_name)
+
+    def export_dependencies(self, filename=None):
+        """ Return the dependency graph of the composite nodes as a dict
+        (see DependencyGraph.to_dict), and write it in filename as JSON
+        if filename is not None.
+        """
+        d = self.dependency_graph.to_dict()
+        if filename is not None:
+            f = open(filename, 'w')
+            try:
+                json.dump(d, f, indent=1, sort_keys=True)
+            finally:
+                f.close()
+        return d
 
 
 def cmp_name(x, y):
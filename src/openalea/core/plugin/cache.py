@@ -0,0 +1,338 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Cache of the entry points and of the plugins they define.
+
+The cache is valid as long as the installed distributions (name, version,
+location and date of their metadata) do not change. It stores:
+
+- the entry point groups of the distributions,
+- the entry points of each group,
+- the metadata of the plugins of each group (attributes with plain python
+  values), with the date of the modules defining them.
+
+Plugins read from the cache are :class:`LazyPlugin` objects: their module
+is imported only when the implementation or an attribute which is not in
+the cache is used.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import copy
+import hashlib
+import marshal
+import os
+import sys
+
+import pkg_resources
+
+from openalea.core import logger
+
+_plain_types = (str, unicode, int, long, float, bool, type(None))
+
+
+def is_plain(value):
+    """ Return True if value can be stored in the cache """
+    if isinstance(value, _plain_types):
+        return True
+    elif isinstance(value, (list, tuple)):
+        return all(is_plain(v) for v in value)
+    elif isinstance(value, dict):
+        return all(is_plain(k) and is_plain(v) for k, v in value.iteritems())
+    return False
+
+
+def distributions_key(working_set=None):
+    """ Return a hash of the installed distributions """
+    if working_set is None:
+        working_set = pkg_resources.working_set
+    lines = []
+    for dist in working_set:
+        egg_info = getattr(dist, 'egg_info', None)
+        mtime = None
+        if egg_info:
+            try:
+                mtime = os.stat(egg_info).st_mtime
+            except OSError:
+                pass
+        lines.append('%s %s %s %r' % (dist.key, dist.version, dist.location,
+                                      mtime))
+    lines.sort()
+    return hashlib.sha1('\n'.join(lines)).hexdigest()
+
+
+def module_stamp(modulename):
+    """ Return (source file, mtime) of an imported module, or None """
+    module = sys.modules.get(modulename)
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+    if filename.endswith(('.pyc', '.pyo')) and os.path.exists(filename[:-1]):
+        filename = filename[:-1]
+    try:
+        return filename, os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+def scan_groups():
+    """ Return the entry point groups of all the distributions found in
+    site packages and in sys.path.
+    """
+    import site
+    groups = set()
+    paths = site.getsitepackages()
+    usersite = site.getusersitepackages()
+    if isinstance(usersite, basestring):
+        paths.append(usersite)
+    elif isinstance(usersite, (tuple, list)):
+        paths += list(usersite)
+    paths += sys.path
+    # scan all entry_point and list different groups
+    for path in set(paths):
+        distribs = pkg_resources.find_distributions(path)
+        for distrib in distribs:
+            for group in distrib.get_entry_map():
+                groups.add(group)
+    return sorted(groups)
+
+
+class EntryPointCache(object):
+    """ Entry points and plugin metadata, saved in filename """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._key = None
+        self.data = None
+        self.modified = False
+        pkg_resources.working_set.subscribe(self._distribution_added)
+
+    def _distribution_added(self, dist):
+        self._key = None
+
+    @property
+    def key(self):
+        if self._key is None:
+            self._key = distributions_key()
+        return self._key
+
+    def _data(self):
+        """ Return the content of the cache, reset if distributions changed """
+        key = self.key
+        if self.data is None:
+            self.data = self.load()
+        if self.data.get('key') != key:
+            self.data = dict(key=key, groups=None, entry_points={},
+                             plugins={})
+            self.modified = True
+        return self.data
+
+    def load(self):
+        self.modified = False
+        if self.filename:
+            try:
+                with open(self.filename, 'rb') as f:
+                    version, data = marshal.load(f)
+                if version == self.FORMAT_VERSION:
+                    return data
+            except (IOError, EOFError, ValueError, TypeError):
+                pass
+        return {}
+
+    def save(self):
+        if not self.filename or self.data is None or not self.modified:
+            return
+        tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                marshal.dump((self.FORMAT_VERSION, self.data), f)
+            try:
+                os.rename(tmp, self.filename)
+            except OSError:
+                # Windows does not replace existing files
+                os.remove(self.filename)
+                os.rename(tmp, self.filename)
+        except (IOError, OSError), e:
+            logger.warning('Cannot write plugin cache %s: %s'
+                           % (self.filename, e))
+            return
+        self.modified = False
+
+    def clear(self):
+        """ Forget all the cached entry points and plugins """
+        self.data = {}
+        self._key = None
+        self.modified = True
+
+    def groups(self):
+        """ Return the entry point groups of the distributions """
+        data = self._data()
+        if data['groups'] is None:
+            data['groups'] = scan_groups()
+            self.modified = True
+        return list(data['groups'])
+
+    def entry_points(self, group, name=None):
+        """ Return the EntryPoint objects of group (named name) """
+        data = self._data()
+        lines = data['entry_points'].get(group)
+        if lines is None:
+            lines = [(str(ep), ep.dist.key if ep.dist else None)
+                     for ep in pkg_resources.iter_entry_points(group)]
+            data['entry_points'][group] = lines
+            self.modified = True
+
+        by_key = pkg_resources.working_set.by_key
+        eps = []
+        for line, dist_key in lines:
+            ep = pkg_resources.EntryPoint.parse(line, dist=by_key.get(dist_key))
+            if name is None or ep.name == name:
+                eps.append(ep)
+        return eps
+
+    def plugins(self, group):
+        """ Return the records of the plugins of group, None if they are not
+        in the cache or if one of their modules changed.
+        """
+        entry = self._data()['plugins'].get(group)
+        if entry is None:
+            return None
+        stamps, records = entry
+        for filename, mtime in stamps:
+            try:
+                if os.stat(filename).st_mtime != mtime:
+                    return None
+            except OSError:
+                return None
+        return records
+
+    def set_plugins(self, group, records, modulenames):
+        """ Store the records of the plugins of group, defined in the
+        modules modulenames.
+        """
+        stamps = []
+        for modulename in set(modulenames):
+            stamp = module_stamp(modulename)
+            if stamp is not None:
+                stamps.append(stamp)
+        self._data()['plugins'][group] = (stamps, records)
+        self.modified = True
+
+
+def plugin_record(plugin, dist_key=None):
+    """ Return the cached metadata of a plugin (already patched by the
+    plugin manager).
+    """
+    cls = plugin.__class__
+    names = []
+    attrs = {}
+    for name in dir(plugin):
+        if name.startswith('_'):
+            continue
+        names.append(name)
+        if name in ('implementation', 'criteria', 'plugin_dist'):
+            continue
+        try:
+            value = getattr(plugin, name)
+        except Exception:
+            continue
+        if is_plain(value):
+            attrs[name] = value
+
+    # plugin_dist is not stored, LazyPlugin finds it from dist_key
+    try:
+        criteria = dict(plugin.criteria)
+    except Exception:
+        criteria = None
+    else:
+        criteria.pop('plugin_dist', None)
+        if not is_plain(criteria):
+            criteria = None
+
+    return dict(module=cls.__module__, classname=cls.__name__, names=names,
+                attrs=attrs, criteria=criteria, dist=dist_key)
+
+
+class LazyPlugin(object):
+    """ Plugin built from a cache record.
+
+    Cached attributes are available without importing the plugin module.
+    The plugin is instantiated on first access to its implementation, to a
+    method or to an attribute which could not be cached.
+    """
+
+    def __init__(self, record):
+        self.__dict__.update(copy.deepcopy(record['attrs']))
+        self._record = record
+        self._names = frozenset(record['names'])
+        self._plugin = None
+
+    def load(self):
+        """ Return the real plugin """
+        if self._plugin is None:
+            record = self._record
+            module = __import__(record['module'], fromlist=[record['classname']])
+            self._plugin = getattr(module, record['classname'])()
+        return self._plugin
+
+    def is_loaded(self):
+        return self._plugin is not None
+
+    def __getattr__(self, name):
+        names = self.__dict__.get('_names')
+        if names is None or name.startswith('__') or \
+                (name[0] != '_' and name not in names):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __call__(self, *args, **kwds):
+        return self.load()(*args, **kwds)
+
+    def __repr__(self):
+        record = self._record
+        return '<LazyPlugin %s.%s>' % (record['module'], record['classname'])
+
+    @property
+    def implementation(self):
+        from openalea.core.plugin.manager import get_implementation
+        return get_implementation(self.load())
+
+    @property
+    def criteria(self):
+        criteria = self._record['criteria']
+        if criteria is None:
+            from openalea.core.plugin.manager import get_criteria
+            return get_criteria(self.load())
+        criteria = dict(criteria)
+        if 'plugin_dist' in self._names:
+            criteria['plugin_dist'] = self.plugin_dist
+        return criteria
+
+    @property
+    def plugin_dist(self):
+        return pkg_resources.working_set.by_key.get(self._record['dist'])
+
+
+_cache = []
+
+
+def get_entry_point_cache():
+    """ Return the entry point cache shared by the plugin managers """
+    if not _cache:
+        from openalea.core.settings import get_openalea_home_dir
+        filename = os.path.join(get_openalea_home_dir(), 'plugin_cache')
+        _cache.append(EntryPointCache(filename))
+    return _cache[0]
@@ -12,6 +12,10 @@ Plugins are loaded from entry points or can be added dynamically to manager.
   - To *list* plugins, see :meth:`PluginManager.plugin` and :meth:`PluginManager.plugins`.
   - To *add* plugins dynamically, see :meth:`PluginManager.add_plugin` and :meth:`PluginManager.add_plugins`.
 
+Entry points and plugin metadata are cached (see :mod:`openalea.core.plugin.cache`):
+once a group has been loaded, next sessions get :class:`~openalea.core.plugin.cache.LazyPlugin`
+objects which import plugin modules only when they are used.
+
 All plugin are sorted in categories, each group defining a contract.
 This contract is generally described in an interface class or documentation.
 
@@ -27,12 +31,11 @@ from warnings import warn
 
 from openalea.core import logger
 from openalea.core.manager import GenericManager
+from openalea.core.plugin.cache import LazyPlugin, get_entry_point_cache, plugin_record
 from openalea.core.plugin.plugin import PluginDef
 from openalea.core.service.introspection import name
 from openalea.core.util import camel_case_to_lower
 
-from pkg_resources import iter_entry_points
-
 __all__ = ['PluginManager']
 
 
@@ -101,13 +104,42 @@ class PluginManager(GenericManager):
         return ':'.join([plugin.__class__.__module__, plugin.__class__.__name__])
 
     def discover(self, group=None, item_proxy=None):
-        if "entry_points" in self._autoload:
-            for ep in iter_entry_points(group):
-                self._load_entry_point_plugin(group, ep, item_proxy=item_proxy)
+        if "entry_points" not in self._autoload:
+            return
+        cache = get_entry_point_cache()
+
+        # Plugins embedded in proxies or loaded in debug mode are always loaded
+        lazy = not self.debug and item_proxy is None and group not in self._item_proxy
+        records = cache.plugins(group) if lazy else None
+        if records is not None:
+            for record in records:
+                self.add(LazyPlugin(record), group)
+            return
+
+        items = []
+        complete = True
+        for ep in cache.entry_points(group):
+            ep_items = self._load_entry_point_plugin(group, ep, item_proxy=item_proxy)
+            if ep_items is None:
+                complete = False
+            else:
+                items += [(ep, item) for item in ep_items]
+
+        # groups with errors are loaded again next time, to report them
+        if lazy and complete:
+            records = []
+            modulenames = []
+            for ep, item in items:
+                records.append(plugin_record(item, ep.dist.key if ep.dist else None))
+                modulenames += [ep.module_name, item.__class__.__module__]
+            cache.set_plugins(group, records, modulenames)
+        cache.save()
 
     def instantiate(self, item):
         if inspect.isclass(item):
             return item()
+        elif isinstance(item, LazyPlugin):
+            return item
         else:
             raise NotImplementedError
 
@@ -150,27 +182,33 @@ class PluginManager(GenericManager):
         else:
             plugin_classes = [plugin_class]
 
+        items = []
         for plugin_class in plugin_classes:
             name = plugin_class.name if hasattr(plugin_class, 'name') else plugin_class.__name__
             parts = [str(s) for s in (ep.dist.egg_name(), group, ep.module_name, ep.name, name)]
             identifier = ':'.join(parts)
             item = self.add(plugin_class, group, item_proxy=plugin_proxy, identifier=identifier)
             self.patch_ep_plugin(item, ep)
+            items.append(item)
+        return items
 
     def _load_entry_point_plugin(self, group, entry_point, item_proxy=None):
+        """
+        :return: list of plugins added, None if entry point cannot be loaded
+        """
         ep = entry_point
         plugin_class = None
         if self.debug:
             plugin_class = ep.load()
             logger.debug('%s load plugin %s' % (self.__class__.__name__, ep))
-            self._add_plugin_from_ep(group, ep, plugin_class, item_proxy)
+            return self._add_plugin_from_ep(group, ep, plugin_class, item_proxy)
         else:
             try:
                 plugin_class = ep.load()
             except Exception:
                 logger.error('%s: error loading %s ' % (group, ep))
             else:
-                self._add_plugin_from_ep(group, ep, plugin_class, item_proxy)
+                return self._add_plugin_from_ep(group, ep, plugin_class, item_proxy)
 
 
 class SimpleClassPluginProxy(object):
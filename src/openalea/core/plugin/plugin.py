@@ -28,11 +28,8 @@ Plugin fundamentals are:
 
 """
 
-import pkg_resources
-import site
-import sys
-
 from openalea.core.factory import AbstractFactory
+from openalea.core.plugin.cache import get_entry_point_cache
 
 def plugin_name(plugin):
     return plugin.name if hasattr(plugin, 'name') else plugin.__name__
@@ -50,31 +47,24 @@ def discover(group, name=None):
 
     :todo: check that the same name is not used by several plugins
     """
-
-    plugin_map = {ep.name:ep for ep in pkg_resources.iter_entry_points(group, name)}
+    cache = get_entry_point_cache()
+    plugin_map = {ep.name:ep for ep in cache.entry_points(group, name)}
+    cache.save()
     return plugin_map
 
 def iter_groups():
-    groups = set()
-    paths = site.getsitepackages()
-    usersite = site.getusersitepackages()
-    if isinstance(usersite, basestring):
-        paths.append(usersite)
-    elif isinstance(usersite, (tuple, list)):
-        paths += list(usersite)
-    paths += sys.path
-    # scan all entry_point and list different groups
-    for path in set(paths):
-        distribs = pkg_resources.find_distributions(path)
-        for distrib in distribs :
-            for group in distrib.get_entry_map():
-                groups.add(group)
+    cache = get_entry_point_cache()
+    groups = cache.groups()
+    cache.save()
     for group in groups:
         yield group
 
 
 def iter_plugins(group, name=None, debug=False):
-    for ep in pkg_resources.iter_entry_points(group, name):
+    cache = get_entry_point_cache()
+    eps = cache.entry_points(group, name)
+    cache.save()
+    for ep in eps:
         if debug is True or debug == 'all' or debug == group:
             ep = ep.load()
             if isinstance(ep, (list, tuple)):
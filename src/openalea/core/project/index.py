@@ -0,0 +1,207 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Persistent index of the projects found in repositories.
+
+The index stores:
+
+- for each directory of the repositories: its mtime, its sub directories
+  and whether it contains a manifest. A directory is listed again only if
+  its mtime changed (an entry was added, removed or renamed).
+- for each manifest: its mtime, its size and the metadata it defines.
+  A manifest is parsed again only if it changed. Manifests are parsed in
+  a pool of worker threads.
+
+Symbolic links to directories are followed, each directory is visited once.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import marshal
+import os
+from multiprocessing.pool import ThreadPool
+from os.path import join as pj
+
+from openalea.core import logger
+
+
+def read_manifest(filename):
+    """
+    :return: list of (metadata name, value) defined in manifest filename
+        or None if it can not be read.
+    """
+    from openalea.core.project.configobj import ConfigObj
+    from openalea.core.project.serialization import read_metadata
+    try:
+        return read_metadata(ConfigObj(filename))
+    except Exception, e:
+        logger.warning('Cannot read project manifest %s: %s' % (filename, e))
+        return None
+
+
+class ProjectIndex(object):
+    """ Projects of repositories, updated incrementally """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, filename=None, config_name='oaproject.cfg'):
+        self.filename = filename
+        self.config_name = config_name
+        self.clear()
+        if filename:
+            self.load()
+
+    def clear(self):
+        # directory -> (mtime, sub directories, contains a manifest)
+        self.dirs = {}
+        # manifest -> (mtime, size, metadata)
+        self.manifests = {}
+        self.modified = False
+
+    def load(self):
+        """ Read the index saved in filename, ignore it if it is invalid """
+        try:
+            with open(self.filename, 'rb') as f:
+                version, config_name, dirs, manifests = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return
+        if version == self.FORMAT_VERSION and config_name == self.config_name:
+            self.dirs = dirs
+            self.manifests = manifests
+            self.modified = False
+
+    def save(self):
+        """ Write the index in filename, if it has been modified """
+        if not self.filename or not self.modified:
+            return
+        tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                marshal.dump((self.FORMAT_VERSION, self.config_name,
+                              self.dirs, self.manifests), f)
+            try:
+                os.rename(tmp, self.filename)
+            except OSError:
+                # Windows does not replace existing files
+                os.remove(self.filename)
+                os.rename(tmp, self.filename)
+        except (IOError, OSError), e:
+            logger.warning('Cannot write project index %s: %s'
+                           % (self.filename, e))
+            return
+        self.modified = False
+
+    def _listdir(self, directory, mtime):
+        """ Return the sub directories of directory and whether it contains
+        a manifest, from the index if directory has not changed.
+        """
+        entry = self.dirs.get(directory)
+        if entry is not None and entry[0] == mtime:
+            return entry[1], entry[2]
+
+        subdirs = []
+        has_config = False
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        for name in names:
+            path = pj(directory, name)
+            if name == self.config_name:
+                has_config = has_config or os.path.isfile(path)
+            elif os.path.isdir(path):
+                subdirs.append(name)
+        self.dirs[directory] = (mtime, subdirs, has_config)
+        self.modified = True
+        return subdirs, has_config
+
+    def walk(self, repository, visited=None):
+        """ Return the manifests found in repository, recursively.
+        The directories listed are added to visited.
+        """
+        manifests = []
+        seen = set()
+        if visited is None:
+            visited = set()
+        stack = [str(repository)]
+        while stack:
+            directory = stack.pop()
+            try:
+                st = os.stat(directory)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                continue
+            seen.add(key)
+            visited.add(directory)
+
+            subdirs, has_config = self._listdir(directory, st.st_mtime)
+            if has_config:
+                manifests.append(pj(directory, self.config_name))
+            stack.extend(pj(directory, name) for name in reversed(subdirs))
+        return manifests
+
+    def update(self, repositories, nb_workers=None):
+        """
+        :return: list of (project directory, metadata) of the projects found
+            in repositories. metadata is None if the manifest can not be read.
+        """
+        found = []
+        visited = set()
+        for repository in repositories:
+            if os.path.isdir(repository):
+                for manifest in self.walk(repository, visited):
+                    if manifest not in found:
+                        found.append(manifest)
+
+        # forget directories and manifests which are not there anymore
+        for directory in self.dirs.keys():
+            if directory not in visited:
+                del self.dirs[directory]
+                self.modified = True
+        found_set = set(found)
+        for manifest in self.manifests.keys():
+            if manifest not in found_set:
+                del self.manifests[manifest]
+                self.modified = True
+
+        # parse new or modified manifests
+        stats = {}
+        changed = []
+        for manifest in found:
+            try:
+                st = os.stat(manifest)
+            except OSError:
+                continue
+            stats[manifest] = (st.st_mtime, st.st_size)
+            entry = self.manifests.get(manifest)
+            if entry is None or entry[:2] != stats[manifest]:
+                changed.append(manifest)
+
+        if changed:
+            if len(changed) > 1:
+                pool = ThreadPool(nb_workers)
+                try:
+                    metadata = pool.map(read_manifest, changed)
+                finally:
+                    pool.close()
+            else:
+                metadata = map(read_manifest, changed)
+            for manifest, md in zip(changed, metadata):
+                self.manifests[manifest] = stats[manifest] + (md, )
+            self.modified = True
+
+        return [(os.path.dirname(manifest), self.manifests[manifest][2])
+                for manifest in found if manifest in stats]
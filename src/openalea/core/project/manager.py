@@ -26,6 +26,7 @@ import sys
 from openalea.core import settings
 from openalea.core.control.manager import ControlManager
 from openalea.core.path import path as Path
+from openalea.core.project.index import ProjectIndex
 from openalea.core.project.project import Project
 from openalea.core.service.ipython import interpreter
 from openalea.core.service.plugin import plugins
@@ -56,6 +57,7 @@ class ProjectManager(GenericManager):
 
         self.repositories = self.search_path()
         self.previous_project = "temp"
+        self._index = {}
 
         self.shell = interpreter()
         self.cproject = None
@@ -83,7 +85,10 @@ class ProjectManager(GenericManager):
         """
         Discover projects from your disk and put them in self.projects.
 
-        Projects are not loaded, only metadata are.
+        Projects are not loaded, only metadata are. Metadata are read from
+        the project index (~/.openalea/project_index) which is updated with the
+        directories and manifests modified since the previous discovery.
+        Project items are read when they are used.
 
         :use:
             >>> project_manager.discover()
@@ -96,13 +101,28 @@ class ProjectManager(GenericManager):
             project_manager.repositories.append('path/to/search/projects')
             project_manager.discover()
         """
-        for _path in self.repositories:
-            _path = Path(_path)
-            if not _path.exists():
-                continue
-            for p in _path.walkfiles(config_name):
-                project = Project(p.parent)
-                self.add(project, self.default_group)
+        index = self.project_index(config_name)
+        repositories = [str(Path(_path).abspath()) for _path in self.repositories]
+        for path, metadata in index.update(repositories):
+            if metadata is None:
+                # invalid manifest, let Project report the error
+                project = Project(Path(path))
+            else:
+                kwds = dict((k, list(v) if isinstance(v, list) else v) for k, v in metadata)
+                project = Project(Path(path), lazy=True, **kwds)
+            self.add(project, self.default_group)
+        index.save()
+
+    def project_index(self, config_name='oaproject.cfg'):
+        """
+        :return: the persistent index of projects with manifest config_name
+        """
+        if config_name not in self._index:
+            filename = os.path.join(settings.get_openalea_home_dir(), 'project_index')
+            if config_name != 'oaproject.cfg':
+                filename += '.' + config_name
+            self._index[config_name] = ProjectIndex(filename, config_name)
+        return self._index[config_name]
 
     @staticmethod
     def search_path():
@@ -293,6 +313,8 @@ You can rename/move this project thanks to the button "Save As" in menu.
     def notify(self, sender, event=None):
         signal, data = event
         if signal == 'project_changed':
+            # name or metadata of the project may have changed
+            self.reindex()
             self.notify_listeners(('project_updated', self))
             self.update_namespace(self.shell)
 
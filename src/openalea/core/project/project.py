@@ -156,12 +156,17 @@ class Project(Observed):
         for k, v in self.DEFAULT_METADATA.iteritems():
             self.metadata[k] = kwargs.get(k, v.value)
 
-        # Allocate category dictionaries
-        for k in self.categories:
-            self.__dict__[k] = {}
+        # lazy: metadata are given, items are read from manifest on first access
+        self._items_loaded = True
+        if kwargs.get('lazy', False) and self._path.exists():
+            self._items_loaded = False
+        else:
+            # Allocate category dictionaries
+            for k in self.categories:
+                self.__dict__[k] = {}
 
-        if self._path.exists():
-            self._load()
+            if self._path.exists():
+                self._load()
         #    self.notify_listeners(('project_loaded', (self, self.path)))
         # else:
         #    self.notify_listeners(('project_created', (self, self.path)))
@@ -186,6 +191,9 @@ class Project(Observed):
     def __getattr__(self, key):
         if key in self.DEFAULT_METADATA:
             return super(Project, self).__getattribute__('metadata')[key]
+        elif key in self.__dict__.get('categories', ()) and not self.__dict__.get('_items_loaded', True):
+            self._load_items()
+            return self.__dict__[key]
         else:
             return super(Project, self).__getattribute__(key)
 
@@ -514,6 +522,17 @@ class Project(Observed):
         loader = ProjectLoader()
         loader.update(self, self.path, mode='lazy')
 
+    def _load_items(self):
+        """
+        Create Data objects for each file of manifest, for projects created with lazy=True.
+        """
+        self._items_loaded = True
+        for k in self.categories:
+            self.__dict__[k] = {}
+        from .serialization import ProjectLoader
+        loader = ProjectLoader()
+        loader.update(self, self.path, mode='lazy', metadata=False)
+
     def _save_manifest(self):
         from .serialization import ProjectSaver
         saver = ProjectSaver()
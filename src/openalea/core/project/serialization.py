@@ -26,6 +26,31 @@ from openalea.core.project import Project
 from openalea.core.customexception import ErrorInvalidItem
 
 
+def read_metadata(config, default_metadata=Project.DEFAULT_METADATA):
+    """
+    :param config: ConfigObj of a project manifest
+    :return: list of (metadata name, value) defined in config
+    """
+    metadata = []
+    if 'metadata' in config:
+        for info in config["metadata"].keys():
+            if info == 'name':
+                info = 'alias'
+                value = config['metadata']['name']
+            elif info == 'author':
+                info = 'authors'
+                value = config['metadata']['author']
+            elif info == 'author_email':
+                continue
+            else:
+                value = config['metadata'][info]
+            if interface_name(default_metadata[info].interface) == 'ISequence':
+                if isinstance(value, basestring):
+                    value = value.split(',')
+            metadata.append((info, value))
+    return metadata
+
+
 class ProjectLoader(object):
     dtype = ['IProject']
     protocols = ['inode/directory']
@@ -36,30 +61,21 @@ class ProjectLoader(object):
         return self.update(project, path, protocol=protocol, **kwds)
 
     def update(self, obj, path, protocol=None, **kwds):
+        """
+        Read metadata and items of project from manifest.
+        Use metadata=False or items=False to skip one of them.
+        """
         project = obj
         default_metadata = kwds.pop('default_metadata', project.DEFAULT_METADATA)
         default_categories = kwds.pop('default_categories', project.categories)
         config_filename = kwds.pop('config_filename', 'oaproject.cfg')
 
         config = ConfigObj(path / config_filename)
-        if 'metadata' in config:
-            for info in config["metadata"].keys():
-                if info == 'name':
-                    info = 'alias'
-                    value = config['metadata']['name']
-                elif info == 'author':
-                    info = 'authors'
-                    value = config['metadata']['author']
-                elif info == 'author_email':
-                    continue
-                else:
-                    value = config['metadata'][info]
-                if interface_name(default_metadata[info].interface) == 'ISequence':
-                    if isinstance(value, basestring):
-                        value = value.split(',')
+        if kwds.pop('metadata', True):
+            for info, value in read_metadata(config, default_metadata):
                 setattr(project, info, value)
 
-        if 'manifest' in config:
+        if 'manifest' in config and kwds.pop('items', True):
             # Load file names in right place (dict.keys()) but don't load entire object:
             # ie. load keys but not values
             for category in config["manifest"].keys():
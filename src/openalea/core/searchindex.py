@@ -0,0 +1,223 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Search index of the factories of the package manager.
+
+The index stores, for each factory, the upper case strings used to rank
+the search results (factory name, description and category), the text
+of each package (the strings of its factories, with the offset of each
+factory) and the factories bucketed by their number of inputs and
+outputs.
+A query looks for the search string in the text of the packages and
+only scores the factories where it is found, the scores are the ones of
+PackageManager.search_node.
+
+Packages are indexed on the first query following their registration,
+a package is indexed again when its factories are set or deleted (see
+PackageDict.nb_changes). Factories modified in place are not indexed
+again.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bisect import bisect_right
+
+from openalea.core.pkgdict import is_protected
+
+_empty = frozenset()
+
+
+def nb_ports(ports):
+    """ Return the number of ports, None if there is no port """
+    if ports:
+        return len(ports)
+    return None
+
+
+def stamp(pkg):
+    """ Return a value which changes when factories are set in or deleted
+    from pkg """
+    return len(pkg), getattr(pkg, 'nb_changes', None)
+
+
+def score(search_str, fname, desc, cate, pname):
+    """ Return the score of a factory for an upper case search_str.
+
+    The score is 0 when search_str does not match (see
+    PackageManager.search_node for the ranking).
+    """
+    facNameScore = 0L
+    pkgNameScore = 0L
+
+    if search_str in fname:
+        l = float(len(fname))
+        facNameScore = long(100 * (1 - fname.index(search_str) / l))
+
+    facDescScore = long(desc.count(search_str))
+    facCateScore = long(cate.count(search_str))
+
+    if search_str in pname:
+        l = float(len(pname))
+        pkgNameScore = long(100 * (1 - pname.index(search_str) / l))
+
+    return (facNameScore << (32 * 3) | facDescScore << (32 * 2) |
+            facCateScore << (32 * 1) | pkgNameScore << (32))
+
+
+class SearchIndex(object):
+    """ Index of the factories of a package dictionary.
+
+    - entries: entry id -> (factory, name, description, category,
+      package name, nb of inputs, nb of outputs), with the strings in
+      upper case, or None for a free entry
+    - packages: package key -> (package, stamp of the package, entry ids,
+      package name, text, offsets of the factories in text)
+    - inputs, outputs: nb of ports -> set of entry ids
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ Forget all the packages """
+        self.entries = []
+        self.free = []
+        self.packages = {}
+        self.inputs = {}
+        self.outputs = {}
+
+    def __len__(self):
+        return len(self.entries) - len(self.free)
+
+    def discard(self, key):
+        """ Remove the factories of the package registered with key """
+        record = self.packages.pop(key, None)
+        if record is None:
+            return
+
+        for eid in record[2]:
+            entry = self.entries[eid]
+            self._unbucket(self.inputs, entry[5], eid)
+            self._unbucket(self.outputs, entry[6], eid)
+            self.entries[eid] = None
+            self.free.append(eid)
+
+    def add(self, key, pkg):
+        """ Index the factories of pkg registered with key """
+        self.discard(key)
+
+        eids = []
+        pieces = []
+        offsets = []
+        offset = 0
+        pname = pkg.name.upper()
+        for fname, factory in pkg.iteritems():
+            if is_protected(fname):
+                continue  # alias
+
+            entry = (factory, factory.name.upper(),
+                     factory.description.upper(), factory.category.upper(),
+                     pname, nb_ports(factory.inputs),
+                     nb_ports(factory.outputs))
+            if self.free:
+                eid = self.free.pop()
+                self.entries[eid] = entry
+            else:
+                eid = len(self.entries)
+                self.entries.append(entry)
+            eids.append(eid)
+
+            # the separators only split the strings of a factory
+            offsets.append(offset)
+            for piece in entry[1:4]:
+                pieces.append(piece)
+                offset += len(piece) + 1
+
+            self.inputs.setdefault(entry[5], set()).add(eid)
+            self.outputs.setdefault(entry[6], set()).add(eid)
+
+        try:
+            text = '\0'.join(pieces)
+        except UnicodeDecodeError:
+            # non ascii str mixed with unicode, scan the whole package
+            text = None
+
+        self.packages[key] = (pkg, stamp(pkg), eids, pname, text, offsets)
+
+    def _unbucket(self, buckets, n, eid):
+        s = buckets.get(n)
+        if s is not None:
+            s.discard(eid)
+            if not s:
+                del buckets[n]
+
+    def update(self, pkgs):
+        """ Synchronize the index with the package dictionary pkgs.
+
+        Only the new packages and the packages whose factories changed
+        are indexed.
+        """
+        nb = 0
+        for key, pkg in pkgs.iteritems():
+            if is_protected(key):
+                continue  # alias
+            nb += 1
+            record = self.packages.get(key)
+            if record is None or record[0] is not pkg or \
+                    record[1] != stamp(pkg):
+                self.add(key, pkg)
+
+        if nb != len(self.packages):
+            for key in self.packages.keys():
+                if key not in pkgs or is_protected(key):
+                    self.discard(key)
+
+    def candidates(self, search_str, nb_inputs=-1, nb_outputs=-1):
+        """ Return the entry ids which may match an upper case search_str """
+        result = set()
+        for pkg, size, eids, pname, text, offsets in \
+                self.packages.itervalues():
+            if text is None or search_str in pname:
+                result.update(eids)
+                continue
+
+            find = text.find
+            nb = len(offsets)
+            i = find(search_str)
+            while i >= 0:
+                k = bisect_right(offsets, i) - 1
+                result.add(eids[k])
+                # next factory
+                if k + 1 == nb:
+                    break
+                i = find(search_str, offsets[k + 1])
+
+        if nb_inputs >= 0:
+            result &= self.inputs.get(nb_inputs, _empty)
+        if nb_outputs >= 0:
+            result &= self.outputs.get(nb_outputs, _empty)
+        return result
+
+    def search(self, search_str, nb_inputs=-1, nb_outputs=-1):
+        """ Return the list of (score, factory) matching search_str """
+        search_str = search_str.upper()
+
+        entries = self.entries
+        match = []
+        for eid in self.candidates(search_str, nb_inputs, nb_outputs):
+            entry = entries[eid]
+            sc = score(search_str, *entry[1:5])
+            if sc > 0:
+                match.append((sc, entry[0]))
+        return match
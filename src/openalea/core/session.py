@@ -29,13 +29,14 @@ from openalea.core.compositenode import CompositeNodeFactory
 from openalea.core.pkgmanager import PackageManager
 from openalea.core.observer import Observed
 from openalea.core.datapool import DataPool
+from openalea.core.sessionfile import (SessionWriter, SessionReader,
+                                       is_session_file, get_modules,
+                                       load_module)
 
 from openalea.core.service.interface import load_interfaces
 
 import shelve
 
-import time
-
 
 class Session(Observed):
 
@@ -51,6 +52,10 @@ class Session(Observed):
 
         Observed.__init__(self)
 
+        # session file of the workspaces and datapool entries not loaded yet
+        self.session_file = None
+        self.pending_workspaces = None
+
         self.workspaces = []
         self.cworkspace = -1  # current workspace
         self.graphViews = weakref.WeakKeyDictionary()
@@ -80,6 +85,25 @@ class Session(Observed):
 
     ws = property(get_current_workspace)
 
+    def get_workspaces(self):
+        """ Return the workspaces, loaded from the session file on first
+        access """
+        if self.pending_workspaces:
+            chunks, self.pending_workspaces = self.pending_workspaces, None
+            for cpt, chunk in enumerate(chunks):
+                try:
+                    self._workspaces.append(self.session_file.read(chunk))
+                except Exception, e:
+                    print e
+                    print "Unable to load workspace %i. Skip this." % (cpt, )
+        return self._workspaces
+
+    def set_workspaces(self, workspaces):
+        self.pending_workspaces = None
+        self._workspaces = workspaces
+
+    workspaces = property(get_workspaces, set_workspaces)
+
     def get_graph_views(self):
         return self.graphViews.keys()
 
@@ -140,14 +164,25 @@ class Session(Observed):
         """ Reinit Session """
 
         self.datapool.clear()
+        self.close_session_file()
         self.pkgmanager.clear()
         self.init(create_workspace)
 
-    def save(self, filename=None):
+    def close_session_file(self):
+        """ Close the session file of the pending entries """
+        if self.session_file is not None:
+            self.session_file.close()
+            self.session_file = None
+        self.pending_workspaces = None
+
+    def save(self, filename=None, compress=False):
         """
         Save session in filename
         user_pkg and workspaces data are saved
 
+        Each object is pickled in turn and streamed in the session file
+        (see sessionfile), compressed with zlib if compress is True.
+
         Be careful, this method do not work very well if data are not
         persistent.
         """
@@ -155,52 +190,70 @@ class Session(Observed):
         if (filename):
             self.session_filename = filename
 
-        d = shelve.open(self.session_filename, writeback=True)
+        # pending entries may be read from the file which is replaced
+        for key, e in self.datapool.load_all(ignore_errors=True):
+            print e
+            print "Unable to save %s in the datapool..." % str(key)
+        workspaces = self.workspaces
+        self.close_session_file()
 
-        # modules
-        modules_path = []
-        for k in sys.modules.keys():
-            m = sys.modules[k]
-            if hasattr(m, '__file__'):
-                modules_path.append((m.__name__, os.path.abspath(m.__file__)))
+        writer = SessionWriter(self.session_filename, compress)
+        try:
+            # modules
+            writer.add('__modules__', get_modules())
+
+            # datapool
+            for key in self.datapool:
+                try:
+                    writer.add('datapool', self.datapool[key], key)
+                except Exception, e:
+                    print e
+                    print "Unable to save %s in the datapool..." % str(key)
+
+            # workspaces
+            for cpt, ws in enumerate(workspaces):
+                try:
+                    writer.add('workspaces', ws, cpt)
+                except Exception, e:
+                    print e
+                    print "Unable to save workspace %i. Skip this." % (cpt, )
+                    print " WARNING: Your session is not saved. Please save your dataflow as a composite node !!!!!"
+        except:
+            writer.abort()
+            raise
+        writer.close()
 
-        d['__modules__'] = modules_path
-        d.sync()
+    def load(self, filename):
+        """ Load session data from filename
 
-        # datapool
-        d['datapool'] = {}
-        for key in self.datapool:
+        Datapool entries and workspaces are read from the file on first
+        access. Files saved by previous versions (shelve) are read at once.
+        """
 
-            try:
-                d['datapool'][key] = self.datapool[key]
-                d.sync()
-            except Exception, e:
-                print e
-                print "Unable to save %s in the datapool..." % str(key)
-                del d['datapool'][key]
+        self.clear(False)
 
-        # workspaces
-        d['workspaces'] = []
-        for cpt, ws in enumerate(self.workspaces):
-            try:
-                d['workspaces'].append(ws)
-                d.sync()
-            except Exception, e:
-                print e
-                print "Unable to save workspace %i. Skip this." % (cpt, )
-                print " WARNING: Your session is not saved. Please save your dataflow as a composite node !!!!!"
-                d['workspaces'].pop()
+        self.session_filename = filename
 
-        d.close()
+        if not is_session_file(filename):
+            self.load_shelve(filename)
+            return
 
-    def load(self, filename):
-        """ Load session data from filename """
+        self.session_file = reader = SessionReader(filename)
 
-        self.clear(False)
+        # datapool
+        for key, chunk in reader.get('datapool', []):
+            self.datapool.add_pending(key, lambda chunk=chunk: reader.read(chunk))
 
-        self.session_filename = filename
+        # workspaces
+        self.pending_workspaces = [chunk for cpt, chunk in
+                                   sorted(reader.get('workspaces', []))]
 
-        d = shelve.open(self.session_filename)
+        self.notify_listeners()
+
+    def load_shelve(self, filename):
+        """ Load session data from a shelve file """
+
+        d = shelve.open(filename)
 
         # modules
         modules = d['__modules__']
@@ -220,16 +273,4 @@ class Session(Observed):
         d.close()
 
     def load_module(self, name, path):
-
-        import imp
-        if (name in sys.modules.keys()):
-            return
-        lastname = name.rsplit('.', 1)[-1]
-        if (not os.path.isdir(path)):
-            path = os.path.dirname(path)
-
-        try:
-            (file, filename, desc) = imp.find_module(lastname, [path])
-            imp.load_module(name, file, filename, desc)
-        except Exception, e:
-            pass
+        load_module(name, path)
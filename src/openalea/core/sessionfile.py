@@ -0,0 +1,256 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Session file format.
+
+A session file is a single container:
+
+- a header: MAGIC and the format version,
+- the chunks, one pickle per object, optionally compressed with zlib,
+- the table of contents: a pickled dict of
+  section -> chunk or list of (key, chunk), with chunk = (offset, size,
+  compressed),
+- a trailer: the offset of the table of contents and MAGIC.
+
+Objects are pickled in turn and written as soon as they are ready.
+Compression runs in the shared pool of worker threads (zlib releases the
+GIL). The reader only reads the table of contents, each chunk is read
+and unpickled on demand.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import cPickle
+import imp
+import os
+import struct
+import sys
+import threading
+import zlib
+from cStringIO import StringIO
+
+MAGIC = 'OASESSION'
+FORMAT_VERSION = 1
+
+_header = struct.Struct('<%dsI' % len(MAGIC))
+_trailer = struct.Struct('<Q%ds' % len(MAGIC))
+
+
+class SessionFormatError(Exception):
+    """ The file is not a session file or has an unknown version """
+    pass
+
+
+def is_session_file(filename):
+    """ Return True if filename is a session file """
+    try:
+        f = open(filename, 'rb')
+    except IOError:
+        return False
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+
+
+def _compress(data):
+    return zlib.compress(data, 1)
+
+
+def get_modules():
+    """ Return the (name, filename) of the modules loaded from a file """
+    modules = []
+    for name, m in sys.modules.items():
+        if hasattr(m, '__file__') and m.__file__:
+            modules.append((m.__name__, os.path.abspath(m.__file__)))
+    return modules
+
+
+def load_module(name, path):
+    """ Import the module name from path (a file or a directory) """
+    if name in sys.modules:
+        return
+    lastname = name.rsplit('.', 1)[-1]
+    if not os.path.isdir(path):
+        path = os.path.dirname(path)
+
+    try:
+        (f, filename, desc) = imp.find_module(lastname, [path])
+        try:
+            imp.load_module(name, f, filename, desc)
+        finally:
+            if f:
+                f.close()
+    except Exception:
+        pass
+
+
+class SessionWriter(object):
+    """ Stream objects in a session file.
+
+    Objects are added with add(section, obj, key=None) and written as soon
+    as they are pickled (and compressed). close() writes the table of
+    contents and replaces filename.
+    """
+
+    def __init__(self, filename, compress=False, nb_pending=16):
+        self.filename = filename
+        self.compress = compress
+        self.nb_pending = nb_pending
+
+        self.toc = {}
+        self.pending = []
+        self.tmp = filename + '.%d.tmp' % os.getpid()
+        self.file = open(self.tmp, 'wb')
+        self.file.write(_header.pack(MAGIC, FORMAT_VERSION))
+        self.offset = _header.size
+
+        self.pool = None
+        if compress:
+            from openalea.core.algo.dataflow_evaluation import get_worker_pool
+            self.pool = get_worker_pool()
+
+    def add(self, section, obj, key=None):
+        """ Store obj in section, with key if the section is a list.
+
+        Pickling errors are raised, the object is then not stored.
+        """
+        data = cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+        if self.pool is not None:
+            data = self.pool.apply_async(_compress, (data, ))
+        self.pending.append((section, key, data))
+        if len(self.pending) > self.nb_pending:
+            self.flush(self.nb_pending // 2)
+
+    def flush(self, nb_pending=0):
+        """ Write the pending objects until nb_pending remain """
+        while len(self.pending) > nb_pending:
+            section, key, data = self.pending.pop(0)
+            if self.pool is not None:
+                data = data.get()
+            self.file.write(data)
+            chunk = (self.offset, len(data), self.compress)
+            self.offset += len(data)
+            if key is None:
+                self.toc[section] = chunk
+            else:
+                self.toc.setdefault(section, []).append((key, chunk))
+
+    def close(self):
+        """ Write the table of contents and replace filename """
+        try:
+            self.flush()
+            self.file.write(cPickle.dumps(self.toc, cPickle.HIGHEST_PROTOCOL))
+            self.file.write(_trailer.pack(self.offset, MAGIC))
+        except:
+            self.abort()
+            raise
+        self.file.close()
+
+        try:
+            os.rename(self.tmp, self.filename)
+        except OSError:
+            # Windows does not replace existing files
+            os.remove(self.filename)
+            os.rename(self.tmp, self.filename)
+
+    def abort(self):
+        """ Remove the partial file """
+        self.pending = []
+        self.file.close()
+        os.remove(self.tmp)
+
+
+class SessionReader(object):
+    """ Read the chunks of a session file on demand.
+
+    Modules are only imported when an unpickled object needs them, from
+    the paths stored in the '__modules__' section.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._modules = None
+        self.file = open(filename, 'rb')
+        try:
+            self.toc = self._read_toc()
+        except:
+            self.file.close()
+            raise
+
+    def _read_toc(self):
+        f = self.file
+        magic, version = _header.unpack(f.read(_header.size))
+        if magic != MAGIC:
+            raise SessionFormatError('%s is not a session file'
+                                     % self.filename)
+        if version != FORMAT_VERSION:
+            raise SessionFormatError('%s: unknown session format %r'
+                                     % (self.filename, version))
+
+        f.seek(-_trailer.size, os.SEEK_END)
+        end = f.tell()
+        offset, magic = _trailer.unpack(f.read(_trailer.size))
+        if magic != MAGIC:
+            raise SessionFormatError('%s is truncated' % self.filename)
+        f.seek(offset)
+        return cPickle.loads(f.read(end - offset))
+
+    def close(self):
+        self.file.close()
+
+    def get(self, section, default=None):
+        """ Return the chunk or the list of (key, chunk) of section """
+        return self.toc.get(section, default)
+
+    def _read(self, chunk):
+        offset, size, compressed = chunk
+        self._lock.acquire()
+        try:
+            self.file.seek(offset)
+            data = self.file.read(size)
+        finally:
+            self._lock.release()
+        if compressed:
+            data = zlib.decompress(data)
+        return data
+
+    def read(self, chunk):
+        """ Return the object stored in chunk """
+        unpickler = cPickle.Unpickler(StringIO(self._read(chunk)))
+        unpickler.find_global = self.find_global
+        return unpickler.load()
+
+    def find_global(self, module, name):
+        """ Import module, from the saved paths if needed """
+        if module not in sys.modules:
+            try:
+                __import__(module)
+            except ImportError:
+                path = self.modules().get(module)
+                if path is None:
+                    raise
+                load_module(module, path)
+        return getattr(sys.modules[module], name)
+
+    def modules(self):
+        """ Return the dict of the saved modules, name -> path """
+        if self._modules is None:
+            chunk = self.get('__modules__')
+            if chunk is None:
+                self._modules = {}
+            else:
+                self._modules = dict(cPickle.loads(self._read(chunk)))
+        return self._modules
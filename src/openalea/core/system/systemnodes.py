@@ -19,6 +19,8 @@
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
+from itertools import islice
+
 from openalea.core.node import AbstractNode, Node, Annotation
 from openalea.core.dataflow import SubDataflow
 
@@ -43,7 +45,13 @@ class AnnotationNode(Annotation):
 
 
 class IterNode(Node):
-    """ Iteration Node """
+    """ Iteration Node
+
+    If chunk_size is set (see StreamEvaluation), the output is a list of
+    at most chunk_size items.
+    """
+
+    chunk_size = None
 
     def __init__(self, *args):
         """ Constructor """
@@ -61,6 +69,9 @@ class IterNode(Node):
         """
         Return True if the node need a reevaluation
         """
+        if self.chunk_size:
+            return self.eval_chunk(self.chunk_size)
+
         try:
             if self.iterable == "Empty":
                 self.iterable = iter(self.inputs[0])
@@ -83,14 +94,50 @@ class IterNode(Node):
                 del self.nextval
             return False
 
+    def eval_chunk(self, size):
+        """
+        Output a list of at most size items.
+        Return True if the node need a reevaluation
+        """
+        try:
+            if self.iterable == "Empty":
+                self.iterable = iter(self.inputs[0])
+        except TypeError, e:
+            self.outputs[0] = self.inputs[0]
+            return False
+
+        items = []
+        if(hasattr(self, "nextval")):
+            items.append(self.nextval)
+            del self.nextval
+        items.extend(islice(self.iterable, size - len(items)))
+        self.outputs[0] = items
+
+        try:
+            self.nextval = self.iterable.next()
+            return True
+        except StopIteration, e:
+            self.iterable = "Empty"
+            return False
+
 
 class IterWithDelayNode(IterNode):
     """ Iteration Node """
 
+    def eval_chunk(self, size):
+        """
+        Output a list of at most size items.
+        Return the delay if the node need a reevaluation
+        """
+        return IterNode.eval_chunk(self, size) and self.inputs[1]
+
     def eval(self):
         """
         Return True if the node need a reevaluation
         """
+        if self.chunk_size:
+            return self.eval_chunk(self.chunk_size)
+
         try:
             if self.iterable == "Empty":
                 self.iterable = iter(self.inputs[0])
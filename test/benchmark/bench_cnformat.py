@@ -0,0 +1,82 @@
+"""Reading a package of composite nodes: python wralea vs JSON format.
+
+A package of 20 composite node factories of 10 x 50 nodes is written
+with the python writer (__wralea__.py) and with the compact writers
+(__wralea__.json, __wralea__.bin). Reading registers the package in the
+package manager. Python files are compiled at the first read. Unchanged
+packages are then read from the wralea index whatever their format (see
+pkgindex).
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import sys
+import tempfile
+from os import devnull
+from os.path import join as pj
+from shutil import rmtree
+
+from bench_tools import get_catalog, layered_graph, timeit, report
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package, PyPackageWriter
+from openalea.core.compositenode import CompositeNodeFactory
+from openalea.core import cnformat
+
+
+def build_package(nb_factories, nb_layers, width):
+    pkg = Package('bench.cnformat', dict(version='1.0'))
+    cn, layers = layered_graph(nb_layers, width)
+    for i in range(nb_factories):
+        f = CompositeNodeFactory('composite%d' % i)
+        cn.to_factory(f)
+        pkg.add_factory(f)
+    return pkg
+
+
+def main(nb_factories=20, nb_layers=10, width=50, repeat=5):
+    pm = PackageManager()
+    pm.add_package(get_catalog())
+    pkg = build_package(nb_factories, nb_layers, width)
+
+    tmpdir = tempfile.mkdtemp()
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    try:
+        for d in ('py', 'json', 'bin'):
+            os.mkdir(pj(tmpdir, d))
+        py_file = pj(tmpdir, 'py', '__wralea__.py')
+        PyPackageWriter(pkg).write_wralea(py_file)
+        json_file = cnformat.write_package(pkg, pj(tmpdir, 'json'))
+        bin_file = cnformat.write_package(pkg, pj(tmpdir, 'bin'), binary=True)
+
+        def read(filename, compiled=True):
+            if not compiled and os.path.exists(filename + 'c'):
+                os.remove(filename + 'c')
+            pm.get_pkgreader(filename).register_packages(pm)
+
+        rows = []
+        for label, func in [('python', lambda: read(py_file, False)),
+                            ('python (compiled)', lambda: read(py_file)),
+                            ('json', lambda: read(json_file)),
+                            ('binary', lambda: read(bin_file))]:
+            rows.append((label, '%.1f ms' % (timeit(func, repeat) * 1e3)))
+
+        for label, filename in [('python', py_file), ('json', json_file),
+                                ('binary', bin_file)]:
+            rows.append(('%s file size' % label,
+                         '%d KB' % (os.path.getsize(filename) / 1024)))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        pm.pkgs.pop('bench.cnformat', None)
+        rmtree(tmpdir)
+
+    report('Reading %d composite nodes of %d nodes'
+           % (nb_factories, nb_layers * width), rows)
+
+
+if __name__ == '__main__':
+    main()
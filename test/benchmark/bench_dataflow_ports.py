@@ -0,0 +1,69 @@
+"""Port queries on nodes with a high fan-in.
+
+connected_edges, nb_connections and in_port used to scan every edge, or
+every port, of the vertex. Compare them with that linear scan on a vertex
+with an increasing number of incoming edges.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import timeit, report
+
+from openalea.core.dataflow import DataFlow
+
+
+def fan_in_dataflow(nb_inputs, nb_ports=10):
+    """ Return a dataflow with a vertex of nb_ports input ports connected to
+    nb_inputs source vertices, and this vertex.
+    """
+    df = DataFlow()
+    target = df.add_vertex()
+    pids = [df.add_in_port(target, i) for i in range(nb_ports)]
+    for i in range(nb_inputs):
+        vid = df.add_vertex()
+        df.connect(df.add_out_port(vid, 0), pids[i % nb_ports])
+    return df, target
+
+
+def scan_connected_edges(df, pid):
+    """ Previous implementation of DataFlow.connected_edges """
+    vid = df.vertex(pid)
+    return [eid for eid in df.in_edges(vid) if df.target_port(eid) == pid]
+
+
+def scan_in_port(df, vid, local_pid):
+    """ Previous implementation of DataFlow.in_port """
+    for pid in df.in_ports(vid):
+        if df.local_id(pid) == local_pid:
+            return pid
+
+
+def main(repeat=10, nb_calls=100):
+    rows = []
+    for nb_inputs in (10, 100, 1000, 10000):
+        df, target = fan_in_dataflow(nb_inputs)
+        pid = df.in_port(target, 0)
+
+        def indexed():
+            for i in range(nb_calls):
+                list(df.connected_edges(pid))
+                df.nb_connections(pid)
+                df.in_port(target, 9)
+
+        def scanned():
+            for i in range(nb_calls):
+                scan_connected_edges(df, pid)
+                len(scan_connected_edges(df, pid))
+                scan_in_port(df, target, 9)
+
+        t_index = timeit(indexed, repeat) / nb_calls
+        t_scan = timeit(scanned, repeat) / nb_calls
+        rows.append(('%d inputs (index / scan)' % nb_inputs,
+                     '%.1f us / %.1f us' % (t_index * 1e6, t_scan * 1e6)))
+
+    report('Port queries on a high fan-in vertex', rows)
+
+
+if __name__ == '__main__':
+    main()
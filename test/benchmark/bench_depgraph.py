@@ -0,0 +1,109 @@
+"""Dependency queries of the package manager.
+
+8 packages of 20 composite nodes are registered. Each composite node
+has 50 elements: nodes of the test catalog and 2 composite nodes of the
+previous package. The queries are timed with the previous recursive
+walk of the composite nodes and with the dependency graph (first query,
+then up to date graph).
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import get_catalog, timeit, report
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.compositenode import CompositeNodeFactory
+from openalea.core.pkgdict import is_protected
+
+
+def build_packages(nb_packages=8, nb_composites=20, nb_elements=50):
+    pkgs = []
+    for p in range(nb_packages):
+        pkg = Package('bench.deps%d' % p, {})
+        for c in range(nb_composites):
+            elts = {}
+            for i in range(nb_elements):
+                if p > 0 and i % 25 == 0:
+                    elts[i] = ('bench.deps%d' % (p - 1),
+                               'cn%d' % ((c + i) % nb_composites))
+                else:
+                    elts[i] = ('core catalog', ('plus', 'float')[i % 2])
+            elts[nb_elements] = ('bench.missing', 'f%d' % c)
+            pkg.add_factory(CompositeNodeFactory('cn%d' % c,
+                                                 elt_factory=elts))
+        pkgs.append(pkg)
+    return pkgs
+
+
+def walk(pm, factory, missing):
+    """ Previous recursive walk of the dependencies """
+    if not factory.is_composite_node():
+        return
+    for p, n in factory.elt_factory.values():
+        if is_protected(p) or is_protected(n):
+            continue
+        try:
+            fact = pm[p][n]
+        except:
+            missing.append((p, n))
+            continue
+        yield fact
+        for df in walk(pm, fact, missing):
+            yield df
+
+
+def walk_all(pm, pkgs):
+    for pkg in pkgs:
+        missing = []
+        set((f.package.name, f.name) for cn in pkg.itervalues()
+            for f in walk(pm, cn, missing) if f.package.name != pkg.name)
+
+
+def walk_who_use(pm, pkgs, name):
+    res = []
+    for pkg in pkgs:
+        for cn in pkg.itervalues():
+            deps = sorted(set((f.package.name, f.name)
+                              for f in walk(pm, cn, [])))
+            res.extend((pkg.name, cn.name) for p, n in deps if n == name)
+    return res
+
+
+def main(repeat=3):
+    pm = PackageManager()
+    pm.add_package(get_catalog())
+    pkgs = build_packages()
+    for pkg in pkgs:
+        pm.add_package(pkg)
+
+    def first(func):
+        def f():
+            pm.dependency_graph.clear()
+            func()
+        return f
+
+    try:
+        rows = []
+        for label, old, new in [
+                ('dependencies of all packages',
+                 lambda: walk_all(pm, pkgs), pm.dependencies),
+                ('missing dependencies',
+                 lambda: walk_all(pm, pkgs), pm.missing_dependencies),
+                ('who_use',
+                 lambda: walk_who_use(pm, pkgs, 'plus'),
+                 lambda: pm.who_use('plus'))]:
+            rows.append((label, 'walk %.1f ms, graph %.1f ms, cached %.1f ms'
+                         % (timeit(old, 1) * 1e3,
+                            timeit(first(new), repeat) * 1e3,
+                            timeit(new, repeat) * 1e3)))
+    finally:
+        for pkg in pkgs:
+            del pm[pkg.get_id()]
+
+    report('Dependencies of 160 composite nodes', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Discrete time simulation with sparse delays.
+
+20 timer nodes, with delays from 50 to 69 cycles, each feed a chain of
+'plus' nodes, next to a graph of 1,000 nodes. The simulation lasts 200
+cycles. The old scheduler walked the whole graph at each cycle, the event
+scheduler jumps to the cycles where some timers are due and only evaluates
+their downstream cones.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import get_catalog, layered_graph, timeit, report
+
+from openalea.core.node import FuncNode
+from openalea.core.algo.dataflow_evaluation import DiscreteTimeEvaluation
+
+
+class EveryCycleEvaluation(DiscreteTimeEvaluation):
+    """ Previous behaviour: each cycle walks the whole graph """
+
+    def next_step(self):
+        self._current_cycle += 1
+        return []
+
+    def eval_cycle(self, due):
+        self.clear()
+        for vid, actor in self.get_plan().sorted_leaves():
+            self.eval_vertex(vid)
+
+
+def timer_node(delay):
+    node = FuncNode((), (dict(name='out'),), lambda: 1.)
+    node.lazy = False
+    node.delay = delay
+    return node
+
+
+def build(nb_timers=20, chain=10):
+    pkg = get_catalog()
+    cn, layers = layered_graph(10, 100, pkg)
+    for i in range(nb_timers):
+        vid = cn.add_node(timer_node(50 + i))
+        for j in range(chain):
+            plus = cn.add_node(pkg['plus'].instantiate())
+            cn.connect(vid, 0, plus, 0)
+            vid = plus
+    return cn
+
+
+def main(nb_cycles=200, repeat=1):
+    cn = build()
+
+    rows = []
+    for algo_class in (EveryCycleEvaluation, DiscreteTimeEvaluation):
+        algo = algo_class(cn, max_cycles=nb_cycles)
+        t = timeit(algo.run, repeat)
+        rows.append((algo_class.__name__, '%.1f ms' % (t * 1e3)))
+
+    report('Simulation of %d cycles' % nb_cycles, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Evaluation of a composite node for a sweep over its inputs.
+
+Compare a python loop around set_input and __call__ with eval_batch,
+for a chain of 'plus' nodes.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+from os import devnull
+
+from bench_tools import get_catalog, timeit, report
+
+from openalea.core.compositenode import CompositeNode
+
+
+def chain(length, pkg):
+    """ Return a composite node computing x + y * length """
+    cn = CompositeNode(inputs=(dict(name="x", interface=None, value=None),
+                               dict(name="y", interface=None, value=None)),
+                       outputs=(dict(name="out", interface=None),))
+    previous = (cn.id_in, 0)
+    for i in range(length):
+        vid = cn.add_node(pkg['plus'].instantiate())
+        cn.connect(previous[0], previous[1], vid, 0)
+        cn.connect(cn.id_in, 1, vid, 1)
+        previous = (vid, 0)
+    cn.connect(previous[0], previous[1], cn.id_out, 0)
+    return cn
+
+
+def main(length=50, nb_items=200, repeat=5):
+    pkg = get_catalog()
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    try:
+        cn = chain(length, pkg)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    items = [(float(i), 1.) for i in range(nb_items)]
+
+    def loop():
+        results = []
+        for x, y in items:
+            cn.set_input(0, x)
+            cn.set_input(1, y)
+            cn()
+            results.append(cn.get_output(0))
+        return results
+
+    def batch():
+        return cn.eval_batch(items)[0]
+
+    assert loop() == batch()
+
+    rows = [('loop over __call__', '%.2f ms' % (timeit(loop, repeat) * 1e3)),
+            ('eval_batch', '%.2f ms' % (timeit(batch, repeat) * 1e3))]
+    report('%d evaluations of %d nodes' % (nb_items, length), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Per evaluation overhead of the compiled evaluation plan.
+
+Compare PriorityEvaluation, which rediscovers the graph at each evaluation,
+with LambdaEvaluation, which uses the EvaluationPlan of the CompositeNode,
+on a 1,000 nodes graph.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import layered_graph, timeit, report
+
+from openalea.core.algo.dataflow_evaluation import (PriorityEvaluation,
+                                                    LambdaEvaluation)
+
+
+def main(nb_layers=10, width=100, repeat=20):
+    cn, layers = layered_graph(nb_layers, width)
+    first = cn.node(layers[0][0])
+
+    rows = []
+    for algo_class in (PriorityEvaluation, LambdaEvaluation):
+        algo = algo_class(cn)
+        algo.eval()
+
+        # nothing modified: only the traversal is measured
+        overhead = timeit(algo.eval, repeat)
+
+        # one input modified at the top of the graph
+        def modified():
+            first.set_input(0, first.get_input(0) + 1.)
+            algo.eval()
+        partial = timeit(modified, repeat)
+
+        name = algo_class.__name__
+        rows.append(('%s (unmodified graph)' % name, '%.2f ms' % (overhead * 1e3)))
+        rows.append(('%s (one input modified)' % name, '%.2f ms' % (partial * 1e3)))
+
+    def compile_plan():
+        cn.invalidate_eval_plan()
+        cn.get_eval_plan()
+    rows.append(('plan compilation', '%.2f ms' % (timeit(compile_plan, repeat) * 1e3)))
+
+    report('Evaluation of %d nodes' % len(cn), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Re-evaluation after a local modification.
+
+One input at the top of a 1,000 nodes graph is modified between two
+evaluations. LambdaEvaluation walks the whole graph, IncrementalEvaluation
+only visits the downstream cone of the modified node.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import layered_graph, timeit, report
+
+from openalea.core.algo.dataflow_evaluation import (LambdaEvaluation,
+                                                    IncrementalEvaluation)
+
+
+def main(nb_layers=10, width=100, repeat=20):
+    cn, layers = layered_graph(nb_layers, width)
+    first = cn.node(layers[0][0])
+
+    rows = []
+    for algo_class in (LambdaEvaluation, IncrementalEvaluation):
+        algo = algo_class(cn)
+        algo.eval()
+
+        def modified():
+            first.set_input(0, first.get_input(0) + 1.)
+            algo.eval()
+
+        name = algo_class.__name__
+        rows.append(('%s (unmodified graph)' % name,
+                     '%.2f ms' % (timeit(algo.eval, repeat) * 1e3)))
+        rows.append(('%s (one input modified)' % name,
+                     '%.2f ms' % (timeit(modified, repeat) * 1e3)))
+
+    algo = IncrementalEvaluation(cn)
+    first.set_input(0, first.get_input(0) + 1.)
+    rows.append(('vertices to re-run', len(algo.get_cone())))
+
+    report('Evaluation of %d nodes' % len(cn), rows)
+
+
+if __name__ == '__main__':
+    main()
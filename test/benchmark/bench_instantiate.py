@@ -0,0 +1,67 @@
+"""Instantiation of a nested composite node factory.
+
+The inner factory is a layered graph of 10 x 50 nodes, the outer factory
+contains 10 instances of the inner one (5,000 nodes). The first
+instantiation decodes the elements of the factories, the following ones
+reuse the prototypes of the factories.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+from os import devnull
+
+from bench_tools import get_catalog, layered_graph, timeit, report
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.compositenode import CompositeNode, CompositeNodeFactory
+
+
+def build_factories(nb_inner=10, nb_layers=10, width=50):
+    pm = PackageManager()
+    pkg = get_catalog()
+    pm.add_package(pkg)
+
+    cn, layers = layered_graph(nb_layers, width, pkg)
+    inner = CompositeNodeFactory('layers')
+    cn.to_factory(inner)
+
+    bench_pkg = Package('bench.composite', {})
+    bench_pkg.add_factory(inner)
+    pm.add_package(bench_pkg)
+
+    cn = CompositeNode()
+    for i in range(nb_inner):
+        cn.add_node(inner.instantiate())
+    outer = CompositeNodeFactory('nested')
+    cn.to_factory(outer)
+    return inner, outer
+
+
+def main(repeat=5):
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    try:
+        inner, outer = build_factories()
+
+        def first():
+            inner.invalidate_prototype()
+            outer.invalidate_prototype()
+            outer.instantiate()
+
+        t_first = timeit(first, repeat)
+        t_cached = timeit(outer.instantiate, repeat)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        PackageManager().pkgs.pop('bench.composite', None)
+
+    report('Instantiation of 10 nested composite nodes of 500 nodes',
+           [('first instantiation', '%.1f ms' % (t_first * 1e3)),
+            ('cached prototypes', '%.1f ms' % (t_cached * 1e3))])
+
+
+if __name__ == '__main__':
+    main()
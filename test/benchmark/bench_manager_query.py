@@ -0,0 +1,110 @@
+"""Queries of the items of a GenericManager.
+
+A group holds 2,000 items with 10 tags and 2 criteria (20 and 5 values).
+The previous implementation (a scan of the group at each query) is
+compared with the indexes of the group: selection by criteria, by tags
+and criteria, lookup of an item by name and items sorted by name. Each
+timing is for 100 queries.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import random
+
+from bench_tools import timeit, report
+
+from openalea.core.manager import GenericManager
+
+
+class Item(object):
+
+    def __init__(self, i, rnd):
+        self.identifier = 'pkg.module:Item%d' % i
+        self.name = 'item_%d' % i
+        self.tags = rnd.sample(['tag%d' % t for t in range(10)], 3)
+        self.implement = 'IModel%d' % rnd.randint(0, 19)
+        self.dtype = 'lang%d' % rnd.randint(0, 4)
+
+
+class Manager(GenericManager):
+
+    def discover(self, group=None):
+        pass
+
+    def instantiate(self, item):
+        return item
+
+
+def scan_items(manager, group, tags=None, criteria=None):
+    """ Previous implementation of GenericManager.items """
+    items = manager._item[group].values()
+    if criteria is None:
+        criteria = {}
+    valid_items = []
+    for pl in items:
+        if tags is not None and all(tag in pl.tags for tag in tags) is False:
+            continue
+        if not all(hasattr(pl, criterion) and getattr(pl, criterion)
+                   == criteria[criterion] for criterion in criteria):
+            continue
+        valid_items.append(pl)
+    return valid_items
+
+
+def scan_item(manager, identifier, group):
+    """ Previous implementation of GenericManager.item """
+    items = scan_items(manager, group)
+    if identifier in manager._item[group]:
+        return manager._item[group][identifier]
+    for item in items:
+        if item.name == identifier:
+            return item
+
+
+def main(nb_items=2000, nb_queries=100, repeat=3):
+    rnd = random.Random(0)
+    manager = Manager()
+    for i in range(nb_items):
+        manager.add(Item(i, rnd), 'models')
+
+    criteria = [dict(implement='IModel%d' % (i % 20), dtype='lang%d' % (i % 5))
+                for i in range(nb_queries)]
+    tags = [['tag%d' % (i % 10)] for i in range(nb_queries)]
+    names = ['item_%d' % rnd.randint(0, nb_items - 1) for i in range(nb_queries)]
+
+    for c, t in zip(criteria, tags):
+        assert manager.items('models', criteria=c) == scan_items(manager, 'models', criteria=c)
+        assert manager.items('models', t, c) == scan_items(manager, 'models', t, c)
+    assert [manager.item(n, 'models') for n in names] == \
+        [scan_item(manager, n, 'models') for n in names]
+
+    rows = []
+
+    def bench(label, scan, indexed):
+        rows.append(('%s, scan' % label, '%.2f ms' % (timeit(scan, repeat) * 1e3)))
+        rows.append(('%s, indexes' % label, '%.2f ms' % (timeit(indexed, repeat) * 1e3)))
+
+    bench('criteria',
+          lambda: [scan_items(manager, 'models', criteria=c) for c in criteria],
+          lambda: [manager.items('models', criteria=c) for c in criteria])
+    bench('tags and criteria',
+          lambda: [scan_items(manager, 'models', t, c) for c, t in zip(criteria, tags)],
+          lambda: [manager.items('models', t, c) for c, t in zip(criteria, tags)])
+    bench('item by name',
+          lambda: [scan_item(manager, n, 'models') for n in names],
+          lambda: [manager.item(n, 'models') for n in names])
+    bench('sorted items',
+          lambda: [manager._sorted_items(scan_items(manager, 'models')) for i in range(nb_queries)],
+          lambda: [manager.sorted_items('models') for i in range(nb_queries)])
+
+    def first_query():
+        manager.reindex()
+        manager.items('models', tags[0], criteria[0])
+
+    rows.append(('first query after a change', '%.2f ms' % (timeit(first_query, repeat) * 1e3)))
+    report('%d queries on %d items' % (nb_queries, nb_items), rows)
+
+
+if __name__ == '__main__':
+    main()
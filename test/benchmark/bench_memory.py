@@ -0,0 +1,64 @@
+"""Memory used by the nodes and the edges of a composite node.
+
+A graph of 20,000 'plus' nodes is built, then its nodes are connected
+(38,000 edges). The memory is the resident size of the process (Linux)
+or the maximum resident size.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import gc
+import os
+import resource
+import sys
+from os import devnull
+
+from bench_tools import get_catalog, report
+
+from openalea.core.compositenode import CompositeNode
+
+
+def memory():
+    """ Return the memory used by the process in bytes """
+    gc.collect()
+    try:
+        f = open('/proc/self/statm')
+        try:
+            return int(f.read().split()[1]) * resource.getpagesize()
+        finally:
+            f.close()
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main(nb_nodes=20000, width=1000):
+    pkg = get_catalog()
+    factory = pkg['plus']
+
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    try:
+        m0 = memory()
+        cn = CompositeNode()
+        vids = [cn.add_node(factory.instantiate()) for i in xrange(nb_nodes)]
+        m1 = memory()
+
+        nb_edges = 0
+        for i in xrange(width, nb_nodes):
+            previous = vids[i - width - i % width: i - i % width]
+            cn.connect(previous[i % width], 0, vids[i], 0)
+            cn.connect(previous[(i + 1) % width], 0, vids[i], 1)
+            nb_edges += 2
+        m2 = memory()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    report('Memory of %d nodes and %d edges' % (nb_nodes, nb_edges),
+           [('bytes per node', (m1 - m0) / nb_nodes),
+            ('bytes per edge', (m2 - m1) / nb_edges)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Loading python models with the parse cache.
+
+300 model sources of about 60 lines (docstring with inputs and outputs,
+init code and step function) are loaded as PythonModel: without cache
+(each source parsed) and with the sources in the shared parse cache.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import timeit, report
+
+from openalea.core.model import PythonModel
+from openalea.core.model_inout import parse_cache
+
+template = '''"""
+input = x%(i)d:int=1, y=[1,2,3], z:float=2.5, name='model%(i)d'
+output = result, total
+"""
+import math
+
+result = 0
+total = 0
+values = [x%(i)d * k for k in range(10)]
+%(body)s
+
+def step():
+    result += x%(i)d * z
+    for val in y:
+        total += math.sqrt(val) + helper0(val)
+'''
+
+
+def sources(nb_models=300):
+    body = '\n'.join('def helper%d(v):\n    """ helper %d """\n    '
+                     'return v * %d + len(name)\n' % (k, k, k)
+                     for k in range(12))
+    return [template % dict(i=i, body=body) for i in range(nb_models)]
+
+
+def main(repeat=3):
+    codes = sources()
+
+    def load():
+        for code in codes:
+            PythonModel(name='m', code=code)
+
+    def uncached():
+        parse_cache.clear()
+        load()
+
+    rows = [('no cache', '%.1f ms' % (timeit(uncached, repeat) * 1e3))]
+    rows.append(('shared cache', '%.1f ms' % (timeit(load, repeat) * 1e3)))
+
+    report('Loading %d python models' % len(codes), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Steps per second of python models.
+
+The models are written like the ones of test_run_python_model: inputs and
+outputs declared in the docstring, some init code and a step function.
+They are run for 10,000 steps, with an empty interpreter namespace and
+with a namespace of 600 names (the size of a shell after
+'from numpy import *'). The last model sets its step code as a string
+(Model.set_step_code), which was compiled again at each step.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import timeit, report
+
+from openalea.core.model import Model, PythonModel
+from openalea.core.model_inout import InputObj, OutputObj
+from openalea.core.service.ipython import interpreter
+
+models = [
+    ('sum', '''"""input = x=1, y=2
+output = result"""
+result = x + y
+
+def step():
+    result = x + y
+'''),
+    ('accumulate', '''"""input = x=1, y=[1,2,3]
+output = result"""
+result = 0
+n = 0
+
+def step():
+    n += 1
+    for val in y:
+        result += val * n
+'''),
+]
+
+
+def string_model():
+    model = Model('string')
+    model.inputs_info = [InputObj('a=0')]
+    model.outputs_info = [OutputObj('a')]
+    model.set_step_code('a += 10')
+    return model
+
+
+def main(nstep=10000, repeat=3):
+    user_ns = interpreter().user_ns
+    old_ns = dict(user_ns)
+    rows = []
+    try:
+        for nb_names in (0, 600):
+            user_ns.clear()
+            user_ns.update(('name%d' % i, float(i)) for i in range(nb_names))
+            for name, code in models + [('string', None)]:
+                if code is None:
+                    model = string_model()
+                else:
+                    model = PythonModel(name=name, code=code)
+                t = timeit(lambda: model.run(nstep=nstep), repeat)
+                rows.append(('%s, %d names in the shell' % (name, nb_names),
+                             '%.0f steps/s' % (nstep / t)))
+    finally:
+        user_ns.clear()
+        user_ns.update(old_ns)
+
+    report('Python models, %d steps' % nstep, rows)
+
+
+if __name__ == '__main__':
+    main()
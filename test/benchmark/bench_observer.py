@@ -0,0 +1,71 @@
+"""Cost of the notifications.
+
+notify_listeners is timed on an object without listeners and with one
+listener, then a graph of 1,000 nodes is evaluated without listeners and
+with a listener on each node, in the default, 'batch' and 'quiet'
+notification modes.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import layered_graph, timeit, report
+
+from openalea.core import observer
+from openalea.core.observer import Observed, AbstractListener
+
+
+class Listener(AbstractListener):
+
+    def __init__(self):
+        AbstractListener.__init__(self)
+        self.nb_events = 0
+
+    def notify(self, sender, event=None):
+        self.nb_events += 1
+
+
+def notify(nb=100000):
+    o = Observed()
+
+    def loop():
+        for i in xrange(nb):
+            o.notify_listeners(('data_modified', None, None))
+
+    rows = [('%d notifications, no listener' % nb,
+             '%.1f ms' % (timeit(loop, 5) * 1e3))]
+    listener = Listener()
+    listener.initialise(o)
+    rows.append(('%d notifications, one listener' % nb,
+                 '%.1f ms' % (timeit(loop, 5) * 1e3)))
+    return rows
+
+
+def evaluation(nb_layers=10, width=100, repeat=30):
+    cn, layers = layered_graph(nb_layers, width)
+    for vid in cn.vertices():
+        cn.node(vid).lazy = False
+
+    def run(mode=None):
+        cn.eval_as_expression(notification_mode=mode)
+
+    rows = [('evaluation, no listener', '%.1f ms' % (timeit(run, repeat) * 1e3))]
+
+    listeners = []
+    for vid in cn.vertices():
+        listener = Listener()
+        listener.initialise(cn.node(vid))
+        listeners.append(listener)
+
+    for mode in (None, 'batch', 'quiet'):
+        for l in listeners:
+            l.nb_events = 0
+        t = timeit(lambda: run(mode), repeat)
+        nb_events = sum(l.nb_events for l in listeners) / repeat
+        rows.append(('evaluation, listeners, mode %s' % mode,
+                     '%.1f ms, %d events' % (t * 1e3, nb_events)))
+    return rows
+
+
+if __name__ == '__main__':
+    report('Notifications', notify() + evaluation())
@@ -0,0 +1,72 @@
+"""Package discovery with the wralea index.
+
+150 packages of 20 factories are generated in a temporary directory.
+Without the index every wralea file is imported, with an up to date
+index the packages are registered from the index file.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import tempfile
+from os.path import join as pj
+from shutil import rmtree
+
+from bench_tools import timeit, report
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.pkgindex import WraleaIndex
+
+FACTORY = """
+f%(i)d = Factory(name='f%(i)d', category='bench', nodemodule='nodes',
+                 nodeclass='F%(i)d',
+                 inputs=(dict(name='a', interface=IInt, value=0),
+                         dict(name='b', interface=IFloat, value=1.)),
+                 outputs=(dict(name='c', interface=IFloat),))
+"""
+
+
+def write_packages(dirname, nb_packages, nb_factories):
+    for p in range(nb_packages):
+        pkgdir = pj(dirname, 'pkg%d' % p, 'src')
+        os.makedirs(pkgdir)
+        f = open(pj(pkgdir, '__wralea__.py'), 'w')
+        f.write('from openalea.core import *\n')
+        f.write("__name__ = 'bench.pkg%d'\n" % p)
+        f.write('__all__ = %r\n' % ['f%d' % i for i in range(nb_factories)])
+        for i in range(nb_factories):
+            f.write(FACTORY % dict(i=i))
+        f.close()
+
+
+def main(nb_packages=150, nb_factories=20, repeat=5):
+    pm = PackageManager()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_packages(tmpdir, nb_packages, nb_factories)
+        filename = pj(tmpdir, 'index.pkl')
+
+        def startup(clear=False):
+            index = WraleaIndex(filename)
+            if clear:
+                index.clear()
+            for f in index.find_files([tmpdir]):
+                index.register_packages(f, pm, pm.get_pkgreader(f))
+            index.save()
+            return index
+
+        rows = [('import all the wralea files',
+                 '%.1f ms' % (timeit(lambda: startup(True), repeat) * 1e3)),
+                ('up to date index',
+                 '%.1f ms' % (timeit(startup, repeat) * 1e3))]
+        rows.append(('index hits', startup().hits))
+        report('Discovery of %d packages' % nb_packages, rows)
+    finally:
+        for p in range(nb_packages):
+            pm.pkgs.pop('bench.pkg%d' % p, None)
+        rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Discovery of plugins defined by entry points.
+
+20 distributions define 5 plugins each in the 'bench.plugins' group, the
+module defining the plugins takes about 5 ms to import (it stands for the
+heavy dependencies plugin modules usually import). Plugin modules are
+removed from sys.modules before each discovery, as in a new session.
+
+The previous discovery (iter_entry_points and load of each entry point)
+is compared with the entry point cache: first discovery (empty cache) and
+discovery in a next session, which builds lazy plugins without importing
+any plugin module. The scan of entry point groups is compared likewise.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import sys
+import tempfile
+
+import pkg_resources
+
+from bench_tools import timeit, report
+
+from openalea.core.path import path as Path
+from openalea.core.plugin import cache as plugin_cache
+from openalea.core.plugin.cache import EntryPointCache, scan_groups
+from openalea.core.plugin.manager import PluginManager
+
+GROUP = 'bench.plugins'
+
+PLUGIN_CLASS = '''
+class Plugin%(j)d(object):
+    name = 'plugin_%(i)d_%(j)d'
+    implement = 'IBench%(j)d'
+    tags = ['bench']
+
+    def __call__(self):
+        return dict
+'''
+
+
+def create_distributions(location, nb_dists=20, nb_plugins=5):
+    modulenames = []
+    for i in range(nb_dists):
+        name = 'benchplugin%d' % i
+        egg_info = location / ('%s.egg-info' % name)
+        egg_info.makedirs()
+        (egg_info / 'PKG-INFO').write_text(
+            'Metadata-Version: 1.0\nName: %s\nVersion: 0.1\n' % name)
+        (egg_info / 'entry_points.txt').write_text(
+            '[%s]\nplugins = %s.plugins\n' % (GROUP, name))
+        package = location / name
+        package.makedirs()
+        (package / '__init__.py').write_text('')
+        code = ['from openalea.core.plugin import PluginDef',
+                '_table = dict((str(i), i) for i in range(40000))']
+        for j in range(nb_plugins):
+            code.append('@PluginDef' + PLUGIN_CLASS % dict(i=i, j=j))
+        (package / 'plugins.py').write_text('\n'.join(code))
+        modulenames += [name, name + '.plugins']
+
+    for dist in pkg_resources.find_distributions(str(location)):
+        pkg_resources.working_set.add(dist)
+    return modulenames
+
+
+def main(repeat=5):
+    tmpdir = Path(tempfile.mkdtemp())
+    location = tmpdir / 'site'
+    cache_file = str(tmpdir / 'plugin_cache')
+    saved_cache = list(plugin_cache._cache)
+    sys.path.insert(0, str(location))
+    try:
+        modulenames = create_distributions(location)
+
+        def purge():
+            for name in modulenames:
+                sys.modules.pop(name, None)
+
+        def entry_points():
+            """ Previous implementation of PluginManager.discover """
+            purge()
+            pm = PluginManager()
+            pm._item[GROUP] = {}
+            for ep in pkg_resources.iter_entry_points(GROUP):
+                pm._load_entry_point_plugin(GROUP, ep)
+            return pm
+
+        def first():
+            purge()
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            plugin_cache._cache[:] = [EntryPointCache(cache_file)]
+            return PluginManager().items(GROUP)
+
+        def next_session():
+            purge()
+            plugin_cache._cache[:] = [EntryPointCache(cache_file)]
+            return PluginManager().items(GROUP)
+
+        def groups():
+            plugin_cache._cache[:] = [EntryPointCache(cache_file)]
+            return plugin_cache.get_entry_point_cache().groups()
+
+        rows = [('iter_entry_points and load', '%.1f ms' % (timeit(entry_points, repeat) * 1e3))]
+        rows.append(('cache, first discovery', '%.1f ms' % (timeit(first, repeat) * 1e3)))
+        rows.append(('cache, next session', '%.1f ms' % (timeit(next_session, repeat) * 1e3)))
+
+        assert len(next_session()) == 100
+        pm = PluginManager()
+        pm.items(GROUP)
+        criteria = dict(implement='IBench3')
+        assert len(pm.items(GROUP, criteria=criteria)) == 20
+        assert not any(name in sys.modules for name in modulenames)
+        rows.append(('lazy items, criteria filter', '%.3f ms' % (
+            timeit(lambda: pm.items(GROUP, criteria=criteria), repeat) * 1e3)))
+
+        rows.append(('scan of entry point groups', '%.1f ms' % (timeit(scan_groups, repeat) * 1e3)))
+        groups()
+        plugin_cache.get_entry_point_cache().save()
+        rows.append(('cached groups, next session', '%.1f ms' % (timeit(groups, repeat) * 1e3)))
+    finally:
+        plugin_cache._cache[:] = saved_cache
+        sys.path.remove(str(location))
+        tmpdir.rmtree()
+
+    report('Discovery of 100 plugins in 20 distributions', rows)
+
+
+if __name__ == '__main__':
+    main()
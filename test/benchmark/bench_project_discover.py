@@ -0,0 +1,94 @@
+"""Discovery of projects by the project manager.
+
+A repository holds 200 projects, each with 20 models, 5 data files and
+its category directories. The previous discovery (walk of the repository
+and full load of each Project) is compared with the project index: first
+discovery (empty index), discovery with the index saved by a previous
+session and nothing modified, and with one modified manifest.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import tempfile
+
+from bench_tools import timeit, report
+
+from openalea.core.path import path as Path
+from openalea.core.project.index import ProjectIndex
+from openalea.core.project.manager import ProjectManager
+from openalea.core.project.project import Project
+
+
+def create_projects(repository, nb_projects=200, nb_models=20, nb_data=5):
+    for i in range(nb_projects):
+        project = Project(repository / ('project%d' % i), alias='project %d' % i,
+                          authors=['John Doe', 'Jane Doe'],
+                          description='Project number %d' % i)
+        for j in range(nb_models):
+            project.add('model', filename='model%d.py' % j, content='a = %d\n' % j)
+        for j in range(nb_data):
+            project.add('data', filename='data%d.txt' % j, content='%d\n' % j)
+        project.add('startup', filename='start.py', content='b = 1\n')
+        project.save()
+        for category in ('world', 'cache', 'lib', 'doc'):
+            (project.path / category).makedirs()
+
+
+def walk_discover(pm, config_name='oaproject.cfg'):
+    """ Previous implementation of ProjectManager.discover """
+    for _path in pm.repositories:
+        _path = Path(_path)
+        if not _path.exists():
+            continue
+        for p in _path.walkfiles(config_name):
+            project = Project(p.parent)
+            pm.add(project, pm.default_group)
+
+
+def main(repeat=3):
+    tmpdir = Path(tempfile.mkdtemp())
+    repository = tmpdir / 'repository'
+    index_file = str(tmpdir / 'project_index')
+    try:
+        create_projects(repository)
+        pm = ProjectManager()
+        pm.repositories = [repository]
+
+        def discover():
+            pm._item = {}
+            pm.discover()
+
+        def first():
+            if os.path.exists(index_file):
+                os.remove(index_file)
+            pm._index['oaproject.cfg'] = ProjectIndex(index_file)
+            discover()
+
+        def next_session():
+            pm._index['oaproject.cfg'] = ProjectIndex(index_file)
+            discover()
+
+        count = [0]
+
+        def one_modified():
+            count[0] += 1
+            project = Project(repository / 'project0')
+            project.description = 'modified %d' % count[0]
+            project.save()
+            discover()
+
+        rows = [('walk and load', '%.1f ms' % (timeit(lambda: walk_discover(pm), 1) * 1e3))]
+        rows.append(('index, first discovery', '%.1f ms' % (timeit(first, repeat) * 1e3)))
+        rows.append(('index, next session', '%.1f ms' % (timeit(next_session, repeat) * 1e3)))
+        rows.append(('index, one manifest modified', '%.1f ms' % (timeit(one_modified, repeat) * 1e3)))
+        assert len(pm.items()) == 200
+    finally:
+        tmpdir.rmtree()
+
+    report('Discovery of 200 projects', rows)
+
+
+if __name__ == '__main__':
+    main()
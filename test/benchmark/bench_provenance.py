@@ -0,0 +1,54 @@
+"""Overhead of the provenance store.
+
+Evaluate a 1,000 nodes graph with all its nodes modified, without
+provenance and with a ProvenanceStore, with and without size measures
+(opt-in, done by the writer thread). The nodes of the graph are additions
+of floats: this is the worst case, the relative overhead is lower for
+nodes doing real work. With a single core, the work of the writer thread
+is included in the evaluation time.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import tempfile
+from os.path import join as pj
+from shutil import rmtree
+
+from bench_tools import layered_graph, timeit, report
+
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.metadata.provenance_data import ProvenanceStore
+from openalea.core.metadata.data_size import total_size
+
+
+def main(nb_layers=10, width=100, repeat=10):
+    cn, layers = layered_graph(nb_layers, width)
+
+    def evaluate():
+        cn.invalidate()
+        cn()
+
+    reference = timeit(evaluate, repeat)
+    rows = [('no provenance', '%.2f ms' % (reference * 1e3))]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for label, size in (('store, no sizes', None),
+                            ('store, total_size', total_size)):
+            store = ProvenanceStore(pj(tmpdir, 'prov.sq3'), size=size)
+            previous = dataflow_evaluation.set_provenance_store(store)
+            try:
+                t = timeit(evaluate, repeat)
+            finally:
+                dataflow_evaluation.set_provenance_store(previous)
+                store.close()
+            rows.append((label, '%.2f ms (+%.1f%%)' % (t * 1e3, 100 * (t / reference - 1))))
+    finally:
+        rmtree(tmpdir)
+
+    report('Evaluation of %d nodes' % len(cn), rows)
+
+
+if __name__ == '__main__':
+    main()
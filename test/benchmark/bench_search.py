@@ -0,0 +1,112 @@
+"""Latency of PackageManager.search_node vs number of factories.
+
+Packages of 100 factories are registered in the package manager. Each
+query is timed with a full scan of the factories (the previous
+implementation of search_node), at the first search (the search index
+is built) and with an up to date search index.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import timeit, report
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.pkgdict import is_protected
+from openalea.core.node import NodeFactory
+
+WORDS = ['plus', 'minus', 'filter', 'read', 'write', 'image', 'mesh',
+         'tree', 'leaf', 'light', 'soil', 'root', 'plot', 'table', 'color']
+
+QUERIES = [('plus', -1, -1), ('li', -1, -1), ('tree', 2, 1),
+           ('zzz', -1, -1)]
+
+
+def build_packages(nb_factories, per_package=100):
+    pkgs = []
+    for p in range(nb_factories // per_package):
+        pkg = Package('bench.search%d' % p, {})
+        for i in range(per_package):
+            n = p * per_package + i
+            w1, w2 = WORDS[n % len(WORDS)], WORDS[(n // 7) % len(WORDS)]
+            pkg.add_factory(NodeFactory(
+                name='%s_%s_%d' % (w1, w2, n),
+                description='%s the %s of a %s' % (w1, w2, WORDS[p % 15]),
+                category='bench.%s' % w2,
+                nodemodule='nodes', nodeclass='F',
+                inputs=[dict(name='x%d' % k) for k in range(n % 4)],
+                outputs=[dict(name='y')]))
+        pkgs.append(pkg)
+    return pkgs
+
+
+def scan(pm, search_str, nb_inputs=-1, nb_outputs=-1):
+    """ search_node without the search index """
+    search_str = search_str.upper()
+    match = []
+    for name, pkg in pm.iteritems():
+        if is_protected(name):
+            continue
+        for fname, factory in pkg.iteritems():
+            if is_protected(fname):
+                continue
+            facNameScore = 0L
+            pkgNameScore = 0L
+            fname = factory.name.upper()
+            if search_str in fname:
+                l = float(len(fname))
+                facNameScore = long(100 * (1 - fname.index(search_str) / l))
+            facDescScore = long(factory.description.upper().count(search_str))
+            facCateScore = long(factory.category.upper().count(search_str))
+            pname = pkg.name.upper()
+            if search_str in pname:
+                l = float(len(pname))
+                pkgNameScore = long(100 * (1 - pname.index(search_str) / l))
+            score = (facNameScore << (32 * 3) | facDescScore << (32 * 2) |
+                     facCateScore << (32 * 1) | pkgNameScore << (32))
+            if score > 0:
+                match.append((score, factory))
+    if nb_inputs >= 0:
+        match = [(s, x) for s, x in match
+                 if x and x.inputs and len(x.inputs) == nb_inputs]
+    if nb_outputs >= 0:
+        match = [(s, x) for s, x in match
+                 if x and x.outputs and len(x.outputs) == nb_outputs]
+    match.sort(reverse=True)
+    return [x for s, x in match]
+
+
+def main(sizes=(1000, 5000, 20000), repeat=5):
+    pm = PackageManager()
+    rows = []
+    for nb in sizes:
+        pkgs = build_packages(nb)
+        for pkg in pkgs:
+            pm.add_package(pkg)
+        try:
+            for q in QUERIES:
+                assert list(pm.search_node(*q)) == scan(pm, *q)
+
+            def first():
+                pm.search_index.clear()
+                pm.search_node(*QUERIES[0])
+
+            t_first = timeit(first, 1)
+            for q in QUERIES:
+                t_scan = timeit(lambda: scan(pm, *q), repeat)
+                t_index = timeit(lambda: pm.search_node(*q), repeat)
+                rows.append(('%d factories, %r' % (nb, q),
+                             'scan %.2f ms, index %.2f ms'
+                             % (t_scan * 1e3, t_index * 1e3)))
+            rows.append(('%d factories, building the index' % nb,
+                         '%.1f ms' % (t_first * 1e3)))
+        finally:
+            for pkg in pkgs:
+                del pm[pkg.get_id()]
+
+    report('Search latency', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Saving and loading a session with a large datapool.
+
+The datapool holds 100 entries of 10,000 floats. The previous format
+(a shelve synchronized after each entry) is compared with the session
+file, without and with compression. Loading the session file only reads
+the table of contents, the entries are read on first access.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import shelve
+import sys
+import tempfile
+from os import devnull
+from os.path import join as pj
+from shutil import rmtree
+
+from bench_tools import timeit, report
+
+from openalea.core.session import Session
+
+
+def shelve_save(session, filename):
+    """ Previous implementation of Session.save """
+    d = shelve.open(filename, writeback=True)
+    d['__modules__'] = []
+    d.sync()
+    d['datapool'] = {}
+    for key in session.datapool:
+        d['datapool'][key] = session.datapool[key]
+        d.sync()
+    d['workspaces'] = []
+    d.close()
+
+
+def size(filename):
+    """ Size in KB of filename or of the files of a dbm database """
+    d, name = os.path.split(filename)
+    return sum(os.path.getsize(pj(d, f)) for f in os.listdir(d)
+               if f.startswith(name)) // 1024
+
+
+def main(nb_entries=100, entry_size=10000, repeat=3):
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    tmpdir = tempfile.mkdtemp()
+    try:
+        session = Session()
+        session.workspaces = []
+        for i in range(nb_entries):
+            session.datapool['data%d' % i] = [float(j * i)
+                                              for j in range(entry_size)]
+
+        old = pj(tmpdir, 'old.pic')
+        new = pj(tmpdir, 'new.session')
+        rows = [('shelve save', '%.1f ms' % (
+            timeit(lambda: shelve_save(session, old), 1) * 1e3))]
+        rows.append(('shelve load', '%.1f ms' % (
+            timeit(lambda: session.load(old), 1) * 1e3)))
+
+        for compress in (False, True):
+            label = 'compressed' if compress else 'session file'
+            rows.append(('%s save' % label, '%.1f ms' % (
+                timeit(lambda: session.save(new, compress), repeat) * 1e3)))
+
+            def load():
+                session.load(new)
+                session.datapool['data0']
+
+            def load_all():
+                session.load(new)
+                session.datapool.load_all()
+
+            rows.append(('%s load, one entry' % label, '%.1f ms' % (
+                timeit(load, repeat) * 1e3)))
+            rows.append(('%s load, all entries' % label, '%.1f ms' % (
+                timeit(load_all, repeat) * 1e3)))
+            rows.append(('%s size' % label, '%d KB' % size(new)))
+        rows.append(('shelve size', '%d KB' % size(old)))
+
+        session.clear(False)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        rmtree(tmpdir)
+
+    report('Session with %d datapool entries' % nb_entries, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Iteration over the items of a list.
+
+An iterator node feeds a 'plus' node whose other input is computed by a
+graph of 1,000 nodes. GeneratorEvaluation walks the whole graph for each
+item, StreamEvaluation only evaluates the downstream cone of the iterator.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from bench_tools import get_catalog, layered_graph, timeit, report
+
+from openalea.core.node import FuncNode
+from openalea.core.system.systemnodes import IterNode
+from openalea.core.algo.dataflow_evaluation import (GeneratorEvaluation,
+                                                    StreamEvaluation)
+
+
+def build(nb_items, nb_layers, width):
+    pkg = get_catalog()
+    cn, layers = layered_graph(nb_layers, width, pkg)
+
+    source = FuncNode((), (dict(name='out'),), lambda: range(nb_items))
+    iterid = cn.add_node(IterNode((dict(name='generator'),),
+                                  (dict(name='value'),)))
+    cn.node(iterid).lazy = False
+    cn.connect(cn.add_node(source), 0, iterid, 0)
+
+    addid = cn.add_node(pkg['plus'].instantiate())
+    cn.connect(iterid, 0, addid, 0)
+    cn.connect(layers[-1][0], 0, addid, 1)
+
+    items = []
+    collect = FuncNode((dict(name='x'),), (dict(name='y'),), items.append)
+    collectid = cn.add_node(collect)
+    cn.connect(addid, 0, collectid, 0)
+    return cn, collectid
+
+
+def main(nb_items=200, nb_layers=10, width=100, repeat=3):
+    cn, collectid = build(nb_items, nb_layers, width)
+
+    rows = []
+    for algo_class in (GeneratorEvaluation, StreamEvaluation):
+        t = timeit(lambda: algo_class(cn).eval(collectid), repeat)
+        rows.append((algo_class.__name__, '%.1f ms' % (t * 1e3)))
+
+    report('Iteration over %d items' % nb_items, rows)
+
+
+if __name__ == '__main__':
+    main()
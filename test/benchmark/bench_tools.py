@@ -0,0 +1,85 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks are not run by the test suite, run them directly with python:
+
+    python test/benchmark/bench_eval_plan.py
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+import time
+from os import devnull
+from os.path import abspath, dirname, join as pj
+
+test_dir = dirname(dirname(abspath(__file__)))
+
+
+def get_catalog():
+    """ Return the test package defined in test/catalog.py """
+    d = {}
+    execfile(pj(test_dir, 'catalog.py'), {}, d)
+    return d['pkg']
+
+
+def layered_graph(nb_layers=10, width=100, pkg=None):
+    """ Build a CompositeNode of nb_layers * width nodes.
+
+    The first layer is made of 'float' nodes, each node of the following
+    layers is a 'plus' node connected to two nodes of the previous layer.
+    Return the composite node and the list of layers (list of vids).
+    """
+    from openalea.core.compositenode import CompositeNode
+
+    if pkg is None:
+        pkg = get_catalog()
+
+    # factories of builtin functions print a message at each instantiation
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    try:
+        return _layered_graph(nb_layers, width, pkg)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def _layered_graph(nb_layers, width, pkg):
+    from openalea.core.compositenode import CompositeNode
+
+    cn = CompositeNode()
+    layers = [[cn.add_node(pkg['float'].instantiate()) for i in range(width)]]
+    for i, vid in enumerate(layers[0]):
+        cn.node(vid).set_input(0, float(i))
+
+    for l in range(1, nb_layers):
+        previous = layers[-1]
+        layer = []
+        for i in range(width):
+            vid = cn.add_node(pkg['plus'].instantiate())
+            cn.connect(previous[i], 0, vid, 0)
+            cn.connect(previous[(i + 1) % width], 0, vid, 1)
+            layer.append(vid)
+        layers.append(layer)
+
+    return cn, layers
+
+
+def timeit(func, repeat=10):
+    """ Return the best time in seconds of repeat calls to func """
+    best = sys.maxint
+    for i in range(repeat):
+        t0 = time.time()
+        func()
+        best = min(best, time.time() - t0)
+    return best
+
+
+def report(title, rows):
+    """ Print a table of (label, value) """
+    print title
+    print '-' * len(title)
+    for label, value in rows:
+        print '%-40s %s' % (label, value)
+    print
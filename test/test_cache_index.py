@@ -0,0 +1,149 @@
+"""Result cache tests"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import tempfile
+from os.path import join as pj
+from shutil import rmtree
+
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.compositenode import CompositeNode
+from openalea.core.metadata.cache_index import ResultCache
+
+from .small_tools import test_dir
+
+
+def get_pkg():
+    d = {}
+    execfile(pj(test_dir(), 'catalog.py'), globals(), d)
+    return d['pkg']
+
+
+def build_graph(pkg):
+    sg = CompositeNode()
+    val1id = sg.add_node(pkg['float'].instantiate())
+    val2id = sg.add_node(pkg['float'].instantiate())
+    addid = sg.add_node(pkg['plus'].instantiate())
+    sg.connect(val1id, 0, addid, 0)
+    sg.connect(val2id, 0, addid, 1)
+    sg.node(val1id).set_input(0, 2.)
+    sg.node(val2id).set_input(0, 3.)
+    return sg, addid
+
+
+def test_lru():
+    cache = ResultCache(max_items=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == (True, [1])
+    cache.put('c', [3])
+
+    # 'b' is the least recently used
+    assert cache.get('b') == (False, None)
+    assert cache.get('c') == (True, [3])
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_eval_with_cache():
+    pkg = get_pkg()
+    cache = ResultCache()
+    previous = dataflow_evaluation.set_result_cache(cache)
+    try:
+        sg, addid = build_graph(pkg)
+        sg()
+        assert sg.node(addid).get_output(0) == 5.
+        assert cache.hits == 0
+        nb_items = cache.stats()['nb_items']
+
+        # a new instance of the same graph uses the cached outputs
+        sg, addid = build_graph(pkg)
+        sg()
+        assert sg.node(addid).get_output(0) == 5.
+        assert cache.hits == nb_items
+        assert not sg.node(addid).modified
+    finally:
+        dataflow_evaluation.set_result_cache(previous)
+
+
+def test_disk_cache():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(max_items=1, path=tmpdir, max_disk_size=10000)
+        cache.put('a', [1])
+        cache.put('b', [2])
+        assert cache.evictions == 1
+
+        assert cache.get('a') == (True, [1])
+        assert cache.disk_hits == 1
+
+        # entries are reloaded from the directory
+        cache = ResultCache(path=tmpdir, max_disk_size=10000)
+        assert cache.get('b') == (True, [2])
+
+        # the size of the directory is limited
+        cache = ResultCache(path=tmpdir, max_disk_size=1)
+        assert cache.stats()['nb_disk_items'] == 0
+        assert cache.disk_evictions == 2
+    finally:
+        rmtree(tmpdir)
+
+
+def test_cached_values_not_shared():
+    from threading import Thread
+    from openalea.core.node import NodeFactory
+
+    cache = ResultCache()
+    cache.put('a', [[1, 2]])
+    found, outputs = cache.get('a')
+    outputs[0].append(3)
+    assert cache.get('a') == (True, [[1, 2]])
+
+    # outputs which can not be pickled are not cached
+    cache.put('b', [lambda x: x])
+    assert 'b' not in cache
+
+    # non ascii source
+    factory = NodeFactory('f', nodemodule='m', nodeclass='c')
+    factory.get_node_src = lambda: u'# \xe9t\xe9\nx = 1\n'
+    assert cache.factory_key(factory).startswith('None:f:')
+
+    # concurrent use
+    def work(i):
+        for j in range(200):
+            cache.put('%d-%d' % (i, j % 20), [j])
+            cache.get('%d-%d' % (i, (j + 7) % 20))
+    threads = [Thread(target=work, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()['nb_items'] == 81
+
+
+def test_node_key():
+    pkg = get_pkg()
+    cache = ResultCache(max_input_size=1000)
+    node = pkg['plus'].instantiate()
+
+    def key(*inputs):
+        node.inputs[:] = inputs
+        return cache.node_key(node)
+
+    # dicts and sets are equal whatever their order
+    d1 = dict(a=1, b=[2])
+    d2 = dict(b=[2])
+    d2['a'] = 1
+    assert key(d1, set('abc')) == key(d2, set('cba'))
+
+    # equal values of different types are not the same inputs
+    assert len(set([key(1, 0), key(1., 0), key(True, 0), key((1,), 0)])) == 4
+
+    # large inputs are not cached
+    assert key(range(1000), 0) is None
+    assert key('x' * 1000, 0) is None
+    assert key(1, 2) is not None
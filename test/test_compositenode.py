@@ -68,6 +68,39 @@ class TestClass:
 
         assert len(sg) == 4 + 2
 
+    def test_instantiate_prototype(self):
+        """ Instances share the decoded elements of the factory """
+        sg = CompositeNode()
+        addid = sg.add_node(self.plus_node)
+        valid = sg.add_node(self.float_node)
+        sg.connect(valid, 0, addid, 0)
+        sg.node(addid).set_input(1, [1.])
+
+        sgfactory = CompositeNodeFactory("addition")
+        sg.to_factory(sgfactory)
+
+        sg1 = sgfactory.instantiate()
+        prototype = sgfactory.get_prototype()
+        sg2 = sgfactory.instantiate()
+        assert sgfactory.get_prototype() is prototype
+
+        # instances do not share their data
+        assert sg1.node(addid).get_input(1) == [1.]
+        assert sg1.node(addid).get_input(1) is not sg2.node(addid).get_input(1)
+        sg1.node(addid).internal_data['caption'] = 'sum'
+        assert sg2.node(addid).internal_data['caption'] != 'sum'
+
+        # reloading the package changes the factory of the elements
+        d = {}
+        execfile(pj(test_dir(), 'catalog.py'), globals(), d)
+        self.pm.add_package(d['pkg'])
+        assert sgfactory.get_prototype() is not prototype
+        sg3 = sgfactory.instantiate()
+        assert sg3.node(addid).factory is d['pkg']['plus']
+
+        sgfactory.clear()
+        assert sgfactory._prototype is None
+
     def test_to_factory(self):
         """ Create a compositenode, generate its factory and reintantiate it """
 
@@ -325,3 +358,423 @@ class TestClass:
         sg()
         res = sg.get_output(0)
         assert ''.join(eval(res)) == "toto"
+
+    def test_parallel_eval(self):
+        """ Test the parallel evaluation algorithms"""
+        from openalea.core.algo.dataflow_evaluation import EvaluationException
+
+        for algo in ("ParallelEvaluation", "ProcessParallelEvaluation",
+                     "DistributedEvaluation"):
+            sg = CompositeNode()
+
+            # two independent branches joined by an addition
+            val1id = sg.add_node(self.pkg['float'].instantiate())
+            val2id = sg.add_node(self.pkg['float'].instantiate())
+            val3id = sg.add_node(self.pkg['float'].instantiate())
+            val4id = sg.add_node(self.pkg['float'].instantiate())
+            addid = sg.add_node(self.pkg['plus'].instantiate())
+
+            sg.connect(val1id, 0, val3id, 0)
+            sg.connect(val2id, 0, val4id, 0)
+            sg.connect(val3id, 0, addid, 0)
+            sg.connect(val4id, 0, addid, 1)
+
+            sg.eval_algo = algo
+            assert sg.get_eval_algo().__class__.__name__ == algo
+
+            sg.node(val1id).set_input(0, 2.)
+            sg.node(val2id).set_input(0, 3.)
+            sg()
+            assert sg.node(addid).get_output(0) == 5.
+
+            # lazy: only the modified branch is recomputed
+            sg.node(val2id).set_input(0, 4.)
+            sg()
+            assert sg.node(addid).get_output(0) == 6.
+            assert not sg.node(val3id).modified
+
+            # blocked node keeps its output
+            sg.node(val3id).block = True
+            sg.node(val1id).set_input(0, 10.)
+            sg()
+            assert sg.node(addid).get_output(0) == 6.
+            sg.node(val3id).block = False
+
+            # errors are reported with the failing vertex
+            sg.node(val1id).set_input(0, "a")
+            try:
+                sg()
+                assert False
+            except EvaluationException, e:
+                assert e.vid == val1id
+
+    def test_parallel_notifications(self):
+        """ Test the listeners are notified in the calling thread"""
+        import threading
+        from openalea.core.algo.dataflow_evaluation import ParallelEvaluation
+        from openalea.core.observer import AbstractListener
+
+        class Listener(AbstractListener):
+            def __init__(self):
+                AbstractListener.__init__(self)
+                self.events = []
+
+            def notify(self, sender, event=None):
+                self.events.append((threading.current_thread(), event))
+
+        sg = CompositeNode()
+        val1id = sg.add_node(self.pkg['float'].instantiate())
+        val2id = sg.add_node(self.pkg['float'].instantiate())
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        sg.connect(val1id, 0, addid, 0)
+        sg.connect(val2id, 0, addid, 1)
+        sg.node(val1id).set_input(0, 2.)
+        sg.node(val2id).set_input(0, 3.)
+
+        listeners = []
+        for vid in (val1id, val2id, addid):
+            listener = Listener()
+            listener.initialise(sg.node(vid))
+            listeners.append(listener)
+
+        ParallelEvaluation(sg, nb_workers=2).eval()
+        assert sg.node(addid).get_output(0) == 5.
+        for listener in listeners:
+            assert ('start_eval', ) in [event for thread, event in listener.events]
+            assert all(thread is threading.current_thread()
+                       for thread, event in listener.events)
+
+    def test_distributed_eval(self):
+        """ Test the placement of the nodes on sites"""
+        from openalea.core.algo.dataflow_evaluation import DistributedEvaluation
+        from openalea.core.metadata.cloud_sites import (Site, MultiSiteCloud,
+                                                        link_two_sites)
+
+        sg = CompositeNode()
+        val1id = sg.add_node(self.pkg['float'].instantiate())
+        val2id = sg.add_node(self.pkg['float'].instantiate())
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        sg.connect(val1id, 0, addid, 0)
+        sg.connect(val2id, 0, addid, 1)
+        sg.node(val1id).set_input(0, 2.)
+        sg.node(val2id).set_input(0, 3.)
+
+        # computing on s0 is expensive
+        cloud = MultiSiteCloud()
+        s0 = Site(sid='s0', compute_cost=1000.)
+        s1 = Site(sid='s1', compute_cost=1.)
+        cloud.add_sitelist([s0, s1])
+        link_two_sites(s0, s1, 1.)
+
+        algo = DistributedEvaluation(sg, cloud)
+        algo.eval()
+        assert sg.node(addid).get_output(0) == 5.
+        assert sorted(algo.plan.plan) == [(val1id, 's1'), (val2id, 's1'),
+                                          (addid, 's1')]
+        assert algo.plan.cost > 0
+
+        # measures are kept for the next evaluations
+        item = algo.get_measures().check_prov(str(addid))
+        assert item.output_size > 0
+        assert item.exec_time >= 0
+
+    def test_site_pool(self):
+        """ Test the site processes are forked again when packages change"""
+        from openalea.core.algo.dataflow_evaluation import (get_site_pool,
+                                                            shutdown_site_pools)
+
+        pool = get_site_pool(1)
+        assert get_site_pool(1) is pool
+
+        pkg = Package('test.site_pool', {})
+        self.pm.add_package(pkg)
+        try:
+            pool2 = get_site_pool(1)
+            assert pool2 is not pool
+            assert not any(p.is_alive() for p in pool.processes)
+        finally:
+            del self.pm['test.site_pool']
+
+        shutdown_site_pools()
+        assert not any(p.is_alive() for p in pool2.processes)
+
+    def test_incremental_eval(self):
+        """ Test only the downstream cone of a modification is evaluated"""
+        from openalea.core.algo.dataflow_evaluation import IncrementalEvaluation
+
+        sg = CompositeNode()
+        val1id = sg.add_node(self.pkg['float'].instantiate())
+        val2id = sg.add_node(self.pkg['float'].instantiate())
+        val3id = sg.add_node(self.pkg['float'].instantiate())
+        val4id = sg.add_node(self.pkg['float'].instantiate())
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        sg.connect(val1id, 0, val3id, 0)
+        sg.connect(val2id, 0, val4id, 0)
+        sg.connect(val3id, 0, addid, 0)
+        sg.connect(val4id, 0, addid, 1)
+
+        sg.node(val1id).set_input(0, 2.)
+        sg.node(val2id).set_input(0, 3.)
+        algo = IncrementalEvaluation(sg)
+        algo.eval()
+        assert sg.node(addid).get_output(0) == 5.
+        assert set(algo.executed) == set(sg.vertices())
+
+        algo.eval()
+        assert algo.executed == []
+
+        sg.node(val2id).set_input(0, 4.)
+        assert algo.get_cone() == [val2id, val4id, addid]
+        algo.eval()
+        assert algo.executed == [val2id, val4id, addid]
+        assert sg.node(addid).get_output(0) == 6.
+
+        # evaluation restricted to the ancestors of val3id
+        sg.node(val1id).set_input(0, 1.)
+        sg.node(val2id).set_input(0, 5.)
+        assert algo.get_cone(val3id) == [val1id, val3id]
+        algo.eval(val3id)
+        assert sg.node(val3id).get_output(0) == 1.
+        assert sg.node(addid).get_output(0) == 6.
+        algo.eval()
+        assert algo.executed == [val2id, val4id, addid]
+        assert sg.node(addid).get_output(0) == 6.
+
+        # blocked node keeps its output
+        sg.node(val3id).block = True
+        sg.node(val1id).set_input(0, 10.)
+        assert algo.get_cone() == [val1id]
+        algo.eval()
+        assert sg.node(addid).get_output(0) == 6.
+
+    def test_eval_batch(self):
+        """ Test the evaluation of a composite node for a batch of inputs"""
+        from openalea.core.node import FuncNode
+        from openalea.core.algo.dataflow_evaluation import EvaluationException
+
+        sg = CompositeNode(inputs=(dict(name="in1", interface=None, value=None),
+                                   dict(name="in2", interface=None, value=None)),
+                           outputs=(dict(name="out1", interface=None),
+                                    dict(name="out2", interface=None)))
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        calls = []
+        def double(values):
+            calls.append(values)
+            return [2 * v for v in values]
+        double_node = FuncNode((dict(name="x"),), (dict(name="y"),), double)
+        double_node.vectorizable = True
+        doubleid = sg.add_node(double_node)
+
+        sg.connect(sg.id_in, 0, addid, 0)
+        sg.connect(sg.id_in, 1, addid, 1)
+        sg.connect(addid, 0, doubleid, 0)
+        sg.connect(addid, 0, sg.id_out, 0)
+        sg.connect(doubleid, 0, sg.id_out, 1)
+
+        sg.set_input(1, 10.)
+        assert sg.eval_batch([(1., 2.), (3., 4.), (5.,)]) == [[3., 7., 15.],
+                                                               [6., 14., 30.]]
+        # the vectorizable node is called once
+        assert calls == [[3., 7., 15.]]
+        assert sg.node(addid).get_output(0) is None
+
+        # nested composite node
+        parent = CompositeNode(inputs=(dict(name="in1", interface=None, value=None),),
+                               outputs=(dict(name="out1", interface=None),))
+        sgid = parent.add_node(sg)
+        parent.connect(parent.id_in, 0, sgid, 0)
+        parent.connect(sgid, 1, parent.id_out, 0)
+        assert parent.eval_batch([(1.,), (2.,)]) == [[22., 24.]]
+
+        try:
+            sg.eval_batch([(1., "a")])
+            assert False
+        except EvaluationException, e:
+            assert e.vid == addid
+
+    def test_vectorizable_flag(self):
+        """ Test the vectorizable flag of nodes and the batch of special nodes"""
+        from openalea.core.node import FuncNode, NodeFactory
+
+        # the flag of the factory is not copied in the node
+        factory = self.pkg['plus']
+        node = factory.instantiate()
+        assert 'vectorizable' not in node.internal_data
+        assert not node.vectorizable
+        factory.vectorizable = True
+        try:
+            assert node.vectorizable
+            node.vectorizable = False
+            assert not node.vectorizable
+        finally:
+            del factory.vectorizable
+
+        # padded outputs do not share their values
+        def first(values):
+            return [values]
+        sg = CompositeNode(inputs=(dict(name="in1", interface=None, value=None),),
+                           outputs=(dict(name="out1", interface=None),
+                                    dict(name="out2", interface=None)))
+        node = FuncNode((dict(name="x"),), (dict(name="a"), dict(name="b"),
+                                             dict(name="c")), first)
+        node.vectorizable = True
+        nid = sg.add_node(node)
+        sg.connect(sg.id_in, 0, nid, 0)
+        sg.connect(nid, 1, sg.id_out, 0)
+        sg.connect(nid, 2, sg.id_out, 1)
+        out1, out2 = sg.eval_batch([(1,), (2,)])
+        assert out1 == [None, None] and out1 is not out2
+
+        # nodes overriding eval are evaluated item by item
+        class EvalNode(FuncNode):
+            def eval(self):
+                self.outputs[0] = self.inputs[0] + 1
+                return False
+        node.vectorizable = False
+        eval_node = EvalNode((dict(name="x"),), (dict(name="y"),), None)
+        eval_node.vectorizable = True
+        sg = CompositeNode(inputs=(dict(name="in1", interface=None, value=None),),
+                           outputs=(dict(name="out1", interface=None),))
+        eid = sg.add_node(eval_node)
+        sg.connect(sg.id_in, 0, eid, 0)
+        sg.connect(eid, 0, sg.id_out, 0)
+        assert sg.eval_batch([(1,), (2,)]) == [[2, 3]]
+
+    def test_stream_eval(self):
+        """ Test the streaming of the items of an iterator"""
+        from openalea.core.node import FuncNode
+        from openalea.core.system.systemnodes import IterNode
+        from openalea.core.algo.dataflow_evaluation import (GeneratorEvaluation,
+                                                            StreamEvaluation)
+
+        calls = []
+        def source():
+            calls.append('source')
+            return range(5)
+        def offset():
+            calls.append('offset')
+            return 10
+        items = []
+        def collect(x):
+            items.append(x)
+            return x
+
+        sg = CompositeNode()
+        sourceid = sg.add_node(FuncNode((), (dict(name="out"),), source))
+        iterid = sg.add_node(IterNode((dict(name="generator"),),
+                                      (dict(name="value"),)))
+        offsetid = sg.add_node(FuncNode((), (dict(name="out"),), offset))
+        sg.node(offsetid).lazy = False
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        collectid = sg.add_node(FuncNode((dict(name="x"),), (dict(name="y"),),
+                                         collect))
+        sg.connect(sourceid, 0, iterid, 0)
+        sg.connect(iterid, 0, addid, 0)
+        sg.connect(offsetid, 0, addid, 1)
+        sg.connect(addid, 0, collectid, 0)
+
+        GeneratorEvaluation(sg).eval()
+        assert items == [10, 11, 12, 13, 14]
+        assert calls.count('offset') == 5
+
+        # the upstream branches are evaluated once
+        del calls[:], items[:]
+        algo = StreamEvaluation(sg)
+        algo.eval()
+        assert items == [10, 11, 12, 13, 14]
+        assert calls.count('offset') == 1
+        assert algo.nb_items == 4
+
+        # chunks of items
+        del items[:]
+        sg.disconnect(addid, 0, collectid, 0)
+        sg.connect(iterid, 0, collectid, 0)
+        algo = StreamEvaluation(sg, chunk_size=2)
+        algo.eval(collectid)
+        assert items == [[0, 1], [2, 3], [4]]
+        assert sg.node(iterid).chunk_size is None
+
+    def test_discrete_time_eval(self):
+        """ Test the event scheduler of the discrete time evaluation"""
+        from openalea.core.node import FuncNode
+        from openalea.core.algo.dataflow_evaluation import DiscreteTimeEvaluation
+
+        sg = CompositeNode()
+        algo = DiscreteTimeEvaluation(sg)
+
+        calls = []
+        def timer():
+            calls.append(algo._current_cycle)
+            # evaluated again 3 cycles later, 4 times
+            timer_node.delay = 3 if len(items) < 3 else 0
+            return len(items)
+        def other():
+            calls.append('other')
+            return 1
+        items = []
+        def collect(x, y):
+            items.append((algo._current_cycle, x, y))
+            return x
+
+        timer_node = FuncNode((), (dict(name="out"),), timer)
+        timerid = sg.add_node(timer_node)
+        otherid = sg.add_node(FuncNode((), (dict(name="out"),), other))
+        collectid = sg.add_node(FuncNode((dict(name="x"), dict(name="y")),
+                                         (dict(name="out"),), collect))
+        for vid in (timerid, otherid, collectid):
+            sg.node(vid).lazy = False
+        sg.connect(timerid, 0, collectid, 0)
+        sg.connect(otherid, 0, collectid, 1)
+
+        assert algo.run() == 9
+        # the other branch is evaluated once
+        assert calls == [0, 'other', 3, 6, 9]
+        assert [item[0] for item in items] == [0, 3, 6, 9]
+        assert algo._current_cycle == 0
+
+        # step by step
+        del calls[:], items[:]
+        assert algo.step()
+        assert calls == [0, 'other']
+        assert algo.step()
+        assert calls == [0, 'other', 3]
+        algo.eval(step=True)
+        assert algo.step() == False
+        assert calls == [0, 'other', 3, 6, 9]
+
+        # cycle limit
+        del calls[:], items[:]
+        algo.max_cycles = 5
+        algo.eval()
+        assert calls == [0, 'other', 3]
+
+    def test_eval_plan(self):
+        """ Test the evaluation plan is rebuilt when the graph is modified"""
+        sg = CompositeNode()
+
+        val1id = sg.add_node(self.pkg['float'].instantiate())
+        val2id = sg.add_node(self.pkg['float'].instantiate())
+        addid = sg.add_node(self.pkg['plus'].instantiate())
+        sg.connect(val1id, 0, addid, 0)
+
+        plan = sg.get_eval_plan()
+        assert sg.get_eval_plan() is plan
+        assert plan.order.index(val1id) < plan.order.index(addid)
+
+        sg.node(val1id).set_input(0, 2.)
+        sg.node(val2id).set_input(0, 3.)
+        sg()
+        assert sg.node(addid).get_output(0) == 2.
+
+        sg.connect(val2id, 0, addid, 1)
+        assert sg.get_eval_plan() is not plan
+        sg()
+        assert sg.node(addid).get_output(0) == 5.
+
+        plan = sg.get_eval_plan()
+        sg.disconnect(val2id, 0, addid, 1)
+        assert sg.get_eval_plan() is not plan
+
+        plan = sg.get_eval_plan()
+        sg.remove_node(val2id)
+        assert val2id not in sg.get_eval_plan().inputs
@@ -56,3 +56,41 @@ def test_dataflow():
     except PortError:
         test=True
     assert test
+
+
+def test_port_index():
+    df=DataFlow()
+    vid1=df.add_vertex()
+    pid11=df.add_out_port(vid1, "out")
+    vid2=df.add_vertex()
+    pid21=df.add_in_port(vid2, "in")
+
+    eids=set(df.connect(pid11, pid21) for i in range(10))
+    assert set(df.connected_edges(pid11))==eids
+    assert set(df.connected_edges(pid21))==eids
+    assert df.nb_connections(pid21)==10
+
+    eid=eids.pop()
+    df.remove_edge(eid)
+    assert set(df.connected_edges(pid11))==eids
+    assert df.nb_connections(pid11)==9
+
+    df.remove_vertex(vid1)
+    assert df.nb_connections(pid21)==0
+    test=False
+    try:
+        dummy=df.out_port(vid1, "out")
+    except PortError:
+        test=True
+    assert test
+
+    pid=df.add_in_port(vid2, "in2")
+    assert df.in_port(vid2, "in2")==pid
+
+    df.clear()
+    test=False
+    try:
+        dummy=df.in_port(vid2, "in")
+    except PortError:
+        test=True
+    assert test
@@ -4,7 +4,8 @@ import operator
 from openalea.core.dataflow import DataFlow
 from openalea.core.dataflow_state import DataflowState
 from openalea.core.dataflow_evaluation import (AbstractEvaluation,
-                                               BruteEvaluation)
+                                               BruteEvaluation,
+                                               LazyEvaluation)
 from openalea.core.node import Node, FuncNode
 
 
@@ -190,3 +191,59 @@ def test_dataflow_evaluation_no_input_two_outputs():
     dfs.reinit()
     pid2 = df.add_out_port(vid, "out3")
     assert_raises(UserWarning, lambda: algo.eval(env, dfs, vid))
+
+
+def test_dataflow_evaluation_lazy():
+    df, (pid_in, pid_out) = get_dataflow()
+    calls = []
+
+    def counted(vid):
+        func = df.actor(vid).func
+
+        def f(*args):
+            calls.append(vid)
+            return func(*args)
+        df.set_actor(vid, FuncNode({}, {}, f))
+
+    for vid in list(df.vertices()):
+        counted(vid)
+
+    algo = LazyEvaluation(df)
+    env = 0
+    dfs = DataflowState(df)
+    dfs.set_data(pid_in, 1)
+
+    algo.eval(env, dfs)
+    assert dfs.is_valid()
+    assert sorted(calls) == sorted(df.vertices())
+
+    # nothing changed
+    del calls[:]
+    algo.clear()
+    algo.eval(env, dfs)
+    assert calls == []
+
+    # the input of the first node changed
+    dfs.set_data(pid_in, 2)
+    algo.clear()
+    algo.eval(env, dfs)
+    vid1 = df.vertex(pid_in)
+    vid2 = [vid for vid in df.vertices()
+            if df.nb_in_edges(vid) == 0 and vid != vid1][0]
+    assert vid2 not in calls
+    assert sorted(calls) == sorted(set(df.vertices()) - set([vid2]))
+
+    # not lazy
+    del calls[:]
+    df.actor(vid2).lazy = False
+    algo.clear()
+    algo.eval(env, dfs)
+    assert vid2 in calls
+
+    # outputs removed from the state
+    del calls[:]
+    dfs.reinit()
+    algo.clear()
+    algo.eval(env, dfs)
+    assert sorted(calls) == sorted(df.vertices())
+    assert dfs.is_valid()
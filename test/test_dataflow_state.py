@@ -190,3 +190,62 @@ def test_dataflow_state_get_data():
     n2.get_ad_hoc_dict().set_metadata('position', [10, 0])
     n5.get_ad_hoc_dict().set_metadata('position', [0, 0])
     assert tuple(dfs.get_data(pid32)) == (3, 1)
+
+
+def test_dataflow_state_version():
+    df = DataFlow()
+    vid1 = df.add_vertex()
+    pid10 = df.add_in_port(vid1, "in")
+    pid11 = df.add_out_port(vid1, "out")
+    vid2 = df.add_vertex()
+    pid21 = df.add_out_port(vid2, "out")
+    vid3 = df.add_vertex()
+    pid31 = df.add_in_port(vid3, "in")
+
+    df.connect(pid11, pid31)
+
+    dfs = DataflowState(df)
+    for pid in (pid10, pid11, pid21):
+        assert dfs.get_version(pid) is None
+    assert dfs.get_version(pid31) == (None, )
+
+    dfs.set_data(pid10, 0)
+    dfs.set_data(pid11, 1)
+    v10 = dfs.get_version(pid10)
+    v31 = dfs.get_version(pid31)
+    assert v31 == (dfs.get_version(pid11), )
+
+    dfs.set_data(pid11, 1)
+    assert dfs.get_version(pid31) != v31
+
+    df.connect(pid21, pid31)
+    dfs.set_data(pid21, 2)
+    assert len(dfs.get_version(pid31)) == 2
+    assert tuple(dfs.get_data(pid31)) == (1, 2)
+
+    dfs.reinit()
+    assert dfs.get_version(pid10) == v10
+    assert dfs.get_version(pid11) is None
+
+
+def test_dataflow_state_lonely_ports():
+    df = DataFlow()
+    vid1 = df.add_vertex()
+    pid10 = df.add_in_port(vid1, "in")
+    pid11 = df.add_out_port(vid1, "out")
+    vid2 = df.add_vertex()
+    pid20 = df.add_in_port(vid2, "in")
+
+    dfs = DataflowState(df)
+    dfs.set_data(pid10, 0)
+    assert not dfs.is_ready_for_evaluation()
+
+    df.connect(pid11, pid20)
+    assert dfs.is_ready_for_evaluation()
+    assert not dfs.is_valid()
+
+    dfs.set_data(pid11, 1)
+    assert dfs.is_valid()
+
+    pid12 = df.add_out_port(vid1, "out2")
+    assert not dfs.is_valid()
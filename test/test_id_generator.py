@@ -0,0 +1,97 @@
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import pickle
+
+from openalea.core.graph.id_generator import IdGenerator
+
+
+def test_id_generator():
+    """Test reuse of released ids"""
+    gen = IdGenerator()
+    assert [gen.get_id() for i in range(3)] == [0, 1, 2]
+
+    gen.release_id(0)
+    gen.release_id(2)
+    assert gen.get_id() == 2
+    assert gen.get_id() == 0
+    assert gen.get_id() == 3
+
+    # explicit id of a released id
+    gen.release_id(1)
+    assert gen.get_id(1) == 1
+    assert gen.get_id() == 4
+
+    try:
+        gen.get_id(1)
+        assert False
+    except IndexError:
+        pass
+    try:
+        gen.release_id(10)
+        assert False
+    except IndexError:
+        pass
+
+
+def test_explicit_ids():
+    """Test ids skipped by an explicit id"""
+    gen = IdGenerator()
+    assert gen.get_id(10 ** 9) == 10 ** 9
+    assert gen.get_id(5) == 5
+    assert gen.get_id(6) == 6
+    assert gen.get_id() == 10 ** 9 - 1
+
+    try:
+        gen.release_id(7)
+        assert False
+    except IndexError:
+        pass
+
+    gen.release_id(5)
+    assert gen.get_id() == 5
+    assert gen.get_id() == 10 ** 9 - 2
+
+
+def test_gap_interior():
+    """Test ids taken inside a range of skipped ids"""
+    gen = IdGenerator()
+    gen.get_id(10)
+    for i in (5, 3, 7, 6, 4):
+        assert gen.get_id(i) == i
+    assert gen.get_id() == 9
+    assert gen.get_id() == 8
+    assert gen.get_id() == 2
+    gen.release_id(6)
+    assert gen.get_id() == 6
+    assert [gen.get_id() for i in range(3)] == [1, 0, 11]
+
+
+def test_reserve():
+    gen = IdGenerator()
+    gen.get_id()
+    gen.release_id(0)
+    gen.reserve([8, 3, 0, 5])
+    assert gen.get_id() == 7
+    assert gen.get_id(5) == 5
+    assert gen.get_id(0) == 0
+    assert [gen.get_id() for i in range(5)] == [6, 4, 2, 1, 9]
+    try:
+        gen.reserve([2])
+        assert False
+    except IndexError:
+        pass
+
+    # reserved ids can be released without being taken
+    gen.release_id(3)
+    assert gen.get_id() == 3
+    assert gen.get_id(8) == 8
+
+
+def test_pickle():
+    gen = IdGenerator()
+    gen.get_id(3)
+    gen.release_id(3)
+    gen = pickle.loads(pickle.dumps(gen))
+    assert gen.get_id() == 3
+    assert gen.get_id() == 2
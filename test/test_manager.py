@@ -0,0 +1,118 @@
+import random
+
+from openalea.core.manager import GenericManager, UnknownItemError
+
+from openalea.core.unittest_tools import TestCase
+
+
+class Item(object):
+
+    def __init__(self, identifier, name, tags, **criteria):
+        self.identifier = identifier
+        self.name = name
+        self.tags = tags
+        self.__dict__.update(criteria)
+
+
+class Manager(GenericManager):
+
+    def discover(self, group=None):
+        pass
+
+    def instantiate(self, item):
+        return item
+
+
+def scan(manager, group, tags=None, criteria=None):
+    """ items selected by scanning the group (implementation without indexes) """
+    criteria = criteria or {}
+    valid_items = []
+    for pl in manager._item[group].values():
+        if tags is not None and all(tag in pl.tags for tag in tags) is False:
+            continue
+        if not all(hasattr(pl, criterion) and getattr(pl, criterion)
+                   == criteria[criterion] for criterion in criteria):
+            continue
+        valid_items.append(pl)
+    return valid_items
+
+
+class TestGenericManager(TestCase):
+
+    def setUp(self):
+        rnd = random.Random(0)
+        self.manager = Manager()
+        for i in range(200):
+            kwds = dict(implement='I%d' % rnd.randint(0, 4))
+            if i % 3:
+                kwds['level'] = rnd.randint(0, 2)
+            tags = rnd.sample(['a', 'b', 'c', 'd'], rnd.randint(0, 3))
+            self.manager.add(Item('item%d' % i, 'name%d' % (i % 150), tags, **kwds), 'g')
+
+    def check(self, tags=None, criteria=None):
+        expected = scan(self.manager, 'g', tags, criteria)
+        assert self.manager.items('g', tags=tags, criteria=criteria) == expected
+        return expected
+
+    def test_items(self):
+        m = self.manager
+        assert m.items('g') == m._item['g'].values()
+        assert len(self.check(criteria=dict(implement='I1'))) > 0
+        assert len(self.check(criteria=dict(implement='I1', level=2))) > 0
+        assert self.check(criteria=dict(implement='I9')) == []
+        assert self.check(criteria=dict(unknown=1)) == []
+        assert len(self.check(tags=['a', 'b'])) > 0
+        assert len(self.check(tags=['c'], criteria=dict(level=0))) > 0
+        self.check(tags=[])
+        # float and bool values equal to indexed int values
+        self.check(criteria=dict(level=1.0))
+        self.check(criteria=dict(level=True))
+
+        # items with values which cannot be indexed are scanned
+        m.add(Item('list', 'list', ['a'], implement=['I1']), 'g')
+        self.check(criteria=dict(implement='I1'))
+        self.check(criteria=dict(implement=['I1']))
+
+    def test_update(self):
+        m = self.manager
+        self.check(criteria=dict(implement='I0'))
+        m.add(Item('new', 'new', ['a'], implement='I0'), 'g')
+        assert m.item('new', 'g') in self.check(criteria=dict(implement='I0'))
+
+        item = [item for item in m.items('g') if item.tags][0]
+        criteria = dict(implement=item.implement)
+        assert item in self.check(item.tags, criteria)
+        # changed items are not returned by stale indexes
+        item.implement = 'I8'
+        assert item not in self.check(criteria=criteria)
+        item.implement = criteria['implement']
+        tags, item.tags = item.tags, []
+        assert item not in self.check(tags)
+        item.implement = 'I8'
+        item.tags = tags
+        m.reindex('g')
+        assert self.check(criteria=dict(implement='I8')) == [item]
+
+        m.clear()
+        assert m.items('g') == []
+
+    def test_item(self):
+        m = self.manager
+        assert m.item('item3', 'g').identifier == 'item3'
+        # first item with this name, in items order
+        expected = [item for item in m.items('g') if item.name == 'name10'][0]
+        assert m.item('name10', 'g') is expected
+
+        # renamed items are still found
+        expected.name = 'renamed'
+        assert m.item('renamed', 'g') is expected
+        self.assertRaises(UnknownItemError, m.item, 'unknown', 'g')
+
+    def test_sorted_items(self):
+        m = self.manager
+        items = m.sorted_items('g')
+        assert items == m._sorted_items(m.items('g'))
+        assert len(items) == 150
+        assert m.sorted_items('g') is items
+        m.add(Item('new', 'new', []), 'g')
+        assert len(m.sorted_items('g')) == 151
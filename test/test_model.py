@@ -295,3 +295,74 @@ out = f()
     model = PythonModel(name='func')
     model.set_code(code)
     assert model.init() == 1
+
+
+def test_compiled_steps():
+    from openalea.core.model import PythonModel
+    from openalea.core.service.ipython import interpreter
+    interp = interpreter()
+    interp.user_ns = {}
+    interp.user_ns['ipython_ns'] = 1
+
+    code = '''
+"""
+input = a=1
+output = total
+"""
+total = 0
+count = 0
+
+def step():
+    count += 1
+    total += a * count
+'''
+    model = PythonModel(name='compiled', code=code)
+    assert model._compiled['step'] is model._compiled['step']
+    copied = copy.copy(model)
+    assert copied._compiled['step'] is model._compiled['step']
+
+    # internal state is kept from one step to the next
+    assert model.run(nstep=4) == 10
+    assert model.step() == 15
+    assert model.run(2, nstep=3) == 12
+    for varname in ['a', 'count', 'total']:
+        assert varname not in interp.user_ns
+    assert 'ipython_ns' in interp.user_ns
+
+
+def test_parse_cache():
+    from openalea.core.model import PythonModel
+    from openalea.core.model_inout import ParseCache, parse_docstring, extract_functions
+
+    code = '''"""
+input = x:int=1, y=[1,2]
+output = res
+"""
+res = 0
+
+def step():
+    res += x
+'''
+    cache = ParseCache(max_items=2)
+    parsed = cache.parse(code)
+    model, inputs, outputs = parse_docstring(code)
+    assert [inp.repr_code() for inp in parsed.inputs] == [inp.repr_code() for inp in inputs]
+    assert [out.repr_code() for out in parsed.outputs] == [out.repr_code() for out in outputs]
+    assert parsed.funcs.keys() == extract_functions(code).keys()
+    assert parsed.docstring.strip() == 'input = x:int=1, y=[1,2]\noutput = res'
+
+    # models do not share inputs
+    parsed2 = cache.parse(code)
+    assert parsed2.inputs[0] is not parsed.inputs[0]
+    assert parsed2.funcs['step'] is parsed.funcs['step']
+    assert cache.nb_parsed == 1
+
+    cache.parse('a = 1')
+    cache.parse('a = 2')
+    assert len(cache) == 2
+    assert cache.nb_parsed == 3
+
+    m1 = PythonModel(name='m1', code=code)
+    m2 = PythonModel(name='m2', code=code)
+    assert m1.run(nstep=3) == 3
+    assert m2.run(2, nstep=2) == 4
@@ -154,3 +154,36 @@ def test_node_output():
     n2.eval()
     assert n1.get_output('y') == 1
     assert n2.get_output('y') == [1, 2]
+
+
+def test_compact_ports():
+    """ Ports and their bookkeeping have no instance dict until observed """
+    import cPickle
+    from copy import deepcopy
+
+    n = Node([dict(name='a'), dict(name='b'), dict(name='c')],
+             [dict(name='out')])
+    for port in n.input_desc + n.output_desc:
+        assert not vars(port)
+    assert not vars(n.input_desc[0].get_ad_hoc_dict())
+    assert n.map_index_in[2] == n.map_index_in['c'] == 2
+    try:
+        n.map_index_in[3]
+        assert False
+    except KeyError:
+        pass
+
+    n.input_desc[1].get_ad_hoc_dict().set_metadata('hide', True)
+    for proto in (0, 2):
+        m = cPickle.loads(cPickle.dumps(n, proto))
+        assert m.input_desc[2].get_id() == 2
+        assert m.input_desc[1].vertex() is m
+        assert m.input_desc[1].get_ad_hoc_dict().get_metadata('hide')
+        assert m.map_index_out[0] == m.map_index_out['out'] == 0
+
+    # the types of the metadata are only copied when they change
+    m = deepcopy(n)
+    ad_hoc = m.input_desc[0].get_ad_hoc_dict()
+    ad_hoc.add_metadata('color', list)
+    assert 'color' not in n.input_desc[0].get_ad_hoc_dict().keys()
+    assert 'color' not in m.input_desc[1].get_ad_hoc_dict().keys()
@@ -86,3 +86,118 @@ def test_lock():
         assert True
     except NotifyException:
         assert False
+
+
+class recorder(AbstractListener):
+
+    def __init__(self):
+        AbstractListener.__init__(self)
+        self.events = []
+
+    def notify(self, sender, event=None):
+        self.events.append(event)
+
+
+class graphobserved(object):
+    """ Observed which sends notifications without the notification
+    modes, as the Observed class of grapheditor """
+
+    def __init__(self):
+        self.listeners = []
+
+    def register_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify_listeners(self, event=None):
+        for listener in self.listeners:
+            listener.call_notify(self, event)
+
+
+
+def test_notification_modes():
+    from openalea.core.observer import _with_notification_modes
+    for cls in (myobserved, _with_notification_modes(graphobserved)):
+        check_notification_modes(cls)
+
+
+def check_notification_modes(cls):
+    l = recorder()
+    o = cls()
+    l.initialise(o)
+
+    with quiet_notifications():
+        o.notify_listeners(('a',))
+    assert l.events == []
+
+    with batch_notifications():
+        o.notify_listeners(('status', True))
+        o.notify_listeners(('status', False))
+        o.notify_listeners(('a',))
+        o.notify_listeners(('status', True))
+        with batch_notifications():
+            o.notify_listeners(('a',))
+        assert l.events == []
+    # one event per (sender, event), at its last position
+    assert l.events == [('status', False), ('status', True), ('a',)]
+
+    # notification_mode(None) does not change anything
+    del l.events[:]
+    with notification_mode(None):
+        o.notify_listeners(('a',))
+    assert l.events == [('a',)]
+
+
+def test_queued_notifications():
+    from threading import current_thread
+    from multiprocessing.pool import ThreadPool
+    from openalea.core.observer import _with_notification_modes
+
+    class threadrecorder(AbstractListener):
+        def __init__(self):
+            AbstractListener.__init__(self)
+            self.events = []
+
+        def notify(self, sender, event=None):
+            self.events.append((current_thread(), event))
+
+    def send(observed):
+        queue = []
+        with queued_notifications(queue):
+            observed.notify_listeners(('start_eval',))
+            observed.notify_listeners(('stop_eval',))
+        return queue
+
+    pool = ThreadPool(1)
+    try:
+        for cls in (myobserved, _with_notification_modes(graphobserved)):
+            l = threadrecorder()
+            o = cls()
+            l.initialise(o)
+            queue = pool.apply(send, (o,))
+            assert l.events == []
+            assert queue == [(o, ('start_eval',)), (o, ('stop_eval',))]
+            for sender, event in queue:
+                sender.notify_listeners(event)
+            assert l.events == [(current_thread(), ('start_eval',)),
+                                (current_thread(), ('stop_eval',))]
+    finally:
+        pool.close()
+
+
+def test_thread_modes():
+    """ modes only apply to the thread which sets them """
+    from multiprocessing.pool import ThreadPool
+
+    l = recorder()
+    o = myobserved()
+    l.initialise(o)
+    pool = ThreadPool(1)
+    try:
+        with quiet_notifications():
+            pool.apply(o.notify_listeners, (('worker',),))
+            o.notify_listeners(('main',))
+        with batch_notifications():
+            pool.apply(o.notify_listeners, (('worker',),))
+            assert l.events == [('worker',), ('worker',)]
+    finally:
+        pool.close()
@@ -1,4 +1,16 @@
+import os
+import tempfile
+from os.path import join as pj
+from shutil import rmtree
+
 from openalea.core.pkgmanager import PackageManager
+from openalea.core.pkgindex import WraleaIndex
+from openalea.core.pkgdict import is_protected
+from openalea.core.searchindex import score
+from openalea.core.package import Package, CompactPackageReader
+from openalea.core.compositenode import CompositeNode, CompositeNodeFactory
+from openalea.core.node import NodeFactory
+from openalea.core import cnformat
 
 from .small_tools import test_dir
 
@@ -70,6 +82,68 @@ def test_search():
     # print res
     # assert "command" in res[0].name
 
+
+def scan_search(pkgman, search_str, nb_inputs=-1, nb_outputs=-1):
+    """ search_node without index """
+    match = []
+    for name, pkg in pkgman.iteritems():
+        if is_protected(name):
+            continue
+        for fname, factory in pkg.iteritems():
+            if is_protected(fname):
+                continue
+            sc = score(search_str.upper(), factory.name.upper(),
+                       factory.description.upper(),
+                       factory.category.upper(), pkg.name.upper())
+            if sc > 0:
+                match.append((sc, factory))
+    if nb_inputs >= 0:
+        match = [(sc, x) for sc, x in match
+                 if x.inputs and len(x.inputs) == nb_inputs]
+    if nb_outputs >= 0:
+        match = [(sc, x) for sc, x in match
+                 if x.outputs and len(x.outputs) == nb_outputs]
+    match.sort(reverse=True)
+    return [x for sc, x in match]
+
+
+def test_search_index():
+    pkgman = PackageManager()
+    pkgman.load_directory(test_dir())
+
+    queries = ['', 'a', 'su', 'sum', 'SUM', 'test', 'node', 'xyzxyz']
+    ports = [(-1, -1), (0, -1), (1, -1), (2, 1), (-1, 1)]
+
+    def check():
+        for q in queries:
+            for nb_inputs, nb_outputs in ports:
+                res = pkgman.search_node(q, nb_inputs, nb_outputs)
+                assert list(res) == scan_search(pkgman, q, nb_inputs,
+                                                nb_outputs)
+
+    check()
+    assert len(pkgman.search_index) > 0
+
+    # packages changed after the last search
+    pkg = Package('test.search_index', {})
+    pkgman.add_package(pkg)
+    pkg.add_factory(CompositeNodeFactory('summary_node', description='sum',
+                                         inputs=[dict(name='a')],
+                                         outputs=[dict(name='b')]))
+    check()
+    assert pkgman.search_node('summary')[0].name == 'summary_node'
+
+    # factory replaced, same number of factories
+    pkg.update_factory('summary_node',
+                       CompositeNodeFactory('subtotal_node', description='sum'))
+    check()
+    assert pkgman.search_node('subtotal')[0].name == 'subtotal_node'
+    assert not pkgman.search_node('summary_node')
+
+    del pkgman['test.search_index']
+    check()
+    assert not pkgman.search_node('subtotal_node')
+
 # test has been removed
 # too dangerous to test writing on a singleton
 # while other test may be modifying the config
@@ -85,3 +159,265 @@ def test_search():
 #     paths = list(eval(path))  # path is a string
 #
 #     assert set(paths) == set(p)
+
+
+def walk_dependencies(pkgman, factory, missing):
+    """ Previous recursive walk of the dependencies """
+    if not factory.is_composite_node():
+        return
+    for p, n in factory.elt_factory.values():
+        if is_protected(p) or is_protected(n):
+            continue
+        try:
+            fact = pkgman[p][n]
+        except Exception:
+            missing.append((p, n))
+            continue
+        yield fact
+        for df in walk_dependencies(pkgman, fact, missing):
+            yield df
+
+
+def check_dependencies(pkgman, pkgs, names):
+    for pkg in pkgs:
+        cns = [f for f in pkg.itervalues() if f.is_composite_node()]
+        missing = []
+        deps = set((f.package.name, f.name) for cn in cns
+                   for f in walk_dependencies(pkgman, cn, missing)
+                   if f.package.name != pkg.name)
+        assert pkgman.dependencies(pkg) == sorted(deps)
+        assert pkgman.missing_dependencies(pkg) == (sorted(set(missing))
+                                                    or None)
+        for cn in cns:
+            missing = []
+            deps = set((f.package.name, f.name)
+                       for f in walk_dependencies(pkgman, cn, missing))
+            assert pkgman.dependencies(cn) == sorted(deps)
+            assert pkgman.missing_dependencies(cn) == (sorted(set(missing))
+                                                       or None)
+
+    for name in names:
+        res = []
+        for pkg in pkgman.get_packages():
+            for cn in pkg.itervalues():
+                if not cn.is_composite_node():
+                    continue
+                deps = sorted(set((f.package.name, f.name) for f in
+                                  walk_dependencies(pkgman, cn, [])))
+                res.extend((pkg.name, cn.name) for p, n in deps if n == name)
+        assert sorted(pkgman.who_use(name)) == sorted(res)
+
+
+def test_dependency_graph():
+    pkgman = PackageManager()
+    pkgman.load_directory(test_dir())
+
+    def composite(name, elements):
+        return CompositeNodeFactory(name, elt_factory=dict(enumerate(elements)))
+
+    base = Package('test.dep_base', {})
+    for name in ('plus', 'float', 'int'):
+        base.add_factory(NodeFactory(name, nodemodule='nodes', nodeclass=name))
+    inner = Package('test.dep_inner', {})
+    inner.add_factory(composite('inner', [('test.dep_base', 'plus'),
+                                          ('test.dep_base', 'float'),
+                                          ('test.dep_missing', 'f')]))
+    outer = Package('test.dep_outer', {})
+    outer.add_factory(composite('outer', [('test.dep_inner', 'inner'),
+                                          ('test.dep_inner', 'inner'),
+                                          ('test.dep_base', 'plus')]))
+    outer.add_factory(composite('top', [('test.dep_outer', 'outer'),
+                                        ('test.dep_missing', 'g')]))
+    pkgs = [base, inner, outer]
+    names = ['plus', 'inner', 'outer', 'f']
+    try:
+        for pkg in pkgs:
+            pkgman.add_package(pkg)
+        check_dependencies(pkgman, pkgs, names)
+        assert pkgman.missing_dependencies(outer) == [('test.dep_missing', 'f'),
+                                                      ('test.dep_missing', 'g')]
+        assert len(pkgman.who_use('inner')) == 2
+
+        # the missing package is registered
+        missing = Package('test.dep_missing', {})
+        missing.add_factory(composite('f', [('test.dep_base', 'int')]))
+        pkgman.add_package(missing)
+        pkgs.append(missing)
+        check_dependencies(pkgman, pkgs, names)
+        assert pkgman.missing_dependencies(outer) == [('test.dep_missing', 'g')]
+
+        # the factory is added after the package registration
+        missing.add_factory(composite('g', [('test.dep_inner', 'inner')]))
+        check_dependencies(pkgman, pkgs, names)
+        assert pkgman.missing_dependencies(outer) is None
+
+        # a composite node is modified
+        inner['inner'].elt_factory[1] = ('test.dep_base', 'int')
+        check_dependencies(pkgman, pkgs, names + ['int', 'float'])
+        assert ('test.dep_base', 'float') not in pkgman.dependencies(inner)
+
+        d = pkgman.export_dependencies()
+        assert d['test.dep_outer:top'] == dict(
+            depends=[['test.dep_missing', 'g'], ['test.dep_outer', 'outer']],
+            missing=[])
+
+        del pkgman['test.dep_missing']
+        check_dependencies(pkgman, pkgs[:3], names)
+    finally:
+        for pkg in pkgs:
+            if pkg.get_id() in pkgman:
+                del pkgman[pkg.get_id()]
+
+
+WRALEA = """
+from openalea.core import Factory
+__name__ = 'test.wralea_index'
+__alias__ = ['test_index_alias']
+__all__ = ['f']
+f = Factory(name='f', nodemodule='nodes', nodeclass='F')
+"""
+
+
+def test_wralea_index():
+    pkgman = PackageManager()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        os.mkdir(pj(tmpdir, 'pkg'))
+        filename = pj(tmpdir, 'pkg', '__wralea__.py')
+        f = open(filename, 'w')
+        f.write(WRALEA)
+        f.close()
+
+        index = WraleaIndex(pj(tmpdir, 'index.pkl'))
+        assert index.find_files([tmpdir]) == set([filename])
+        index.register_packages(filename, pkgman,
+                                pkgman.get_pkgreader(filename))
+        index.save()
+        assert index.misses == 1
+
+        pkg = pkgman['test.wralea_index']
+        del pkgman['test.wralea_index']
+        del pkgman.pkgs['#test_index_alias']
+
+        # packages are registered from the index file
+        index = WraleaIndex(pj(tmpdir, 'index.pkl'))
+        assert index.find_files([tmpdir]) == set([filename])
+        index.register_packages(filename, pkgman,
+                                pkgman.get_pkgreader(filename))
+        assert index.hits == 1
+        cached = pkgman['test.wralea_index']
+        assert cached is not pkg
+        assert cached.keys() == pkg.keys()
+        assert cached.metainfo == pkg.metainfo
+        assert cached['f'].package is cached
+        assert pkgman['test_index_alias'] is cached
+
+        # modified files are read again
+        f = open(filename, 'a')
+        f.write("__version__ = '1.0'\n")
+        f.close()
+        index.register_packages(filename, pkgman,
+                                pkgman.get_pkgreader(filename))
+        assert index.misses == 1
+        assert pkgman['test.wralea_index'].metainfo['version'] == '1.0'
+
+        # new wralea files are found
+        os.mkdir(pj(tmpdir, 'pkg2'))
+        filename2 = pj(tmpdir, 'pkg2', 'my_wralea.py')
+        open(filename2, 'w').close()
+        assert index.find_files([tmpdir]) == set([filename, filename2])
+    finally:
+        for k in ('test.wralea_index', '#test_index_alias'):
+            if k in pkgman.pkgs:
+                del pkgman.pkgs[k]
+        rmtree(tmpdir)
+
+
+def test_compact_package():
+    pkgman = PackageManager()
+    d = {}
+    execfile(pj(test_dir(), 'catalog.py'), globals(), d)
+    pkgman.add_package(d['pkg'])
+
+    sg = CompositeNode()
+    val1id = sg.add_node(d['pkg']['float'].instantiate())
+    val2id = sg.add_node(d['pkg']['string'].instantiate())
+    addid = sg.add_node(d['pkg']['plus'].instantiate())
+    sg.connect(val1id, 0, addid, 0)
+    sg.node(val1id).set_input(0, 2.)
+    sg.node(val2id).set_input(0, 'x' * (cnformat.BLOB_SIZE + 1))
+    sg.node(addid).set_input(1, (1, u'\xe9', None))
+
+    factory = CompositeNodeFactory('sg', doc='\xe9')
+    sg.to_factory(factory)
+    pkg = Package('test.json_package', dict(version='1.0'))
+    pkg.add_factory(factory)
+
+    for binary in (False, True):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            check_compact_package(pkgman, pkg, sg, tmpdir, binary)
+        finally:
+            for k in ('test.json_package', '#test_json'):
+                if k in pkgman.pkgs:
+                    del pkgman.pkgs[k]
+            rmtree(tmpdir)
+
+
+def check_compact_package(pkgman, pkg, sg, tmpdir, binary):
+    factory = pkg['sg']
+    filename = cnformat.write_package(pkg, tmpdir, alias=['test_json'],
+                                      binary=binary)
+    assert os.path.exists(pj(tmpdir, '__wralea__.data'))
+
+    reader = pkgman.get_pkgreader(filename)
+    assert isinstance(reader, CompactPackageReader)
+    reader.register_packages(pkgman)
+
+    pkg2 = pkgman['test.json_package']
+    assert pkgman['test_json'] is pkg2
+    assert pkg2.metainfo == pkg.metainfo
+    f = pkg2['sg']
+    for attr in ('doc', 'inputs', 'outputs', 'elt_factory',
+                 'connections', 'elt_data', 'lazy', 'eval_algo'):
+        assert getattr(f, attr) == getattr(factory, attr), attr
+    for vid, ad_hoc in factory.elt_ad_hoc.iteritems():
+        assert f.elt_ad_hoc[vid] == dict((k, ad_hoc.get_metadata(k))
+                                         for k in ad_hoc.keys())
+
+    # input values are decoded by the reader
+    assert len(f.elt_decoded) == 3
+    assert [v for v in f.elt_decoded.itervalues()
+            if isinstance(v, cnformat.OutOfLineValue)]
+
+    sg2 = f.instantiate()
+    for vid in sg2.vertices():
+        node = sg2.node(vid)
+        for port in range(node.get_nb_input()):
+            assert node.get_input(port) == sg.node(vid).get_input(port)
+
+    # the python writer stores the repr of the out of line values
+    namespace = dict(CompositeNodeFactory=CompositeNodeFactory)
+    exec repr(f.get_writer()) in namespace
+    f3 = namespace[f.get_python_name()]
+    values = [eval(vs[1]) for vs in sum(f3.elt_value.values(), [])]
+    assert 'x' * (cnformat.BLOB_SIZE + 1) in values
+
+
+def test_binary_codec():
+    import marshal
+
+    codec = cnformat.BinaryCodec()
+    d = {'a': (1, [u'b', None]), 2: set([3.])}
+    assert codec.loads(codec.dumps(d)) == d
+
+    header = cnformat.BIN_MAGIC + chr(cnformat.MARSHAL_VERSION)
+    for data in ('', marshal.dumps(d),
+                 cnformat.BIN_MAGIC + chr(99) + marshal.dumps(d),
+                 header + marshal.dumps(d)[:-2],
+                 header + marshal.dumps([compile('1', '', 'eval')])):
+        try:
+            codec.loads(data)
+            assert False
+        except cnformat.FormatError:
+            pass
@@ -0,0 +1,124 @@
+import os
+import sys
+
+import pkg_resources
+
+from openalea.core.path import path as Path
+from openalea.core.path import tempdir
+from openalea.core.plugin import cache as plugin_cache
+from openalea.core.plugin.cache import EntryPointCache, LazyPlugin
+from openalea.core.plugin.manager import PluginManager
+
+from openalea.core.unittest_tools import TestCase
+
+ENTRY_POINTS = """
+[test.cache.c1]
+Plugins = tstpkg1.plugin
+
+[test.cache.err]
+Plugin = tstpkg1.plugin:C3PluginDoNotExist
+"""
+
+
+def install_distribution(location):
+    """ Add a distribution defining ENTRY_POINTS to the working set """
+    egg_info = location / 'tstpkgcache.egg-info'
+    egg_info.makedirs()
+    (egg_info / 'PKG-INFO').write_text(
+        'Metadata-Version: 1.0\nName: tstpkgcache\nVersion: 0.1\n')
+    (egg_info / 'entry_points.txt').write_text(ENTRY_POINTS)
+    dist = list(pkg_resources.find_distributions(str(location)))[0]
+    pkg_resources.working_set.add(dist)
+    return dist
+
+
+def purge_modules():
+    for name in ('tstpkg1', 'tstpkg1.plugin', 'tstpkg1.impl'):
+        sys.modules.pop(name, None)
+
+
+class TestPluginCache(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmppath = tempdir()
+        cls.dist = install_distribution(cls.tmppath)
+        sys.path.insert(0, str(Path(__file__).parent.abspath() / 'tstdistrib'))
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.pop(0)
+        cls.tmppath.rmtree()
+
+    def setUp(self):
+        self.tmpdir = tempdir()
+        self._cache = list(plugin_cache._cache)
+        plugin_cache._cache[:] = [EntryPointCache(self.tmpdir / 'plugin_cache')]
+        purge_modules()
+
+    def tearDown(self):
+        plugin_cache._cache[:] = self._cache
+        purge_modules()
+        self.tmpdir.rmtree()
+
+    def test_entry_points(self):
+        cache = plugin_cache.get_entry_point_cache()
+        eps = cache.entry_points('test.cache.c1')
+        assert [ep.name for ep in eps] == ['Plugins']
+        assert eps[0].dist.key == 'tstpkgcache'
+        assert 'test.cache.c1' in cache.groups()
+        cache.save()
+
+        cache = EntryPointCache(cache.filename)
+        eps = cache.entry_points('test.cache.c1')
+        assert [str(ep) for ep in eps] == ['Plugins = tstpkg1.plugin']
+        assert eps[0].dist is self.dist
+        assert not cache.modified
+
+    def test_lazy_plugins(self):
+        pm = PluginManager()
+        plugins = pm.items('test.cache.c1')
+        names = sorted(plugin.name for plugin in plugins)
+        assert names == ['MyPlugin1', 'MyPlugin2']
+        assert not any(isinstance(plugin, LazyPlugin) for plugin in plugins)
+
+        # next discovery does not import plugin modules
+        purge_modules()
+        pm = PluginManager()
+        plugins = pm.items('test.cache.c1')
+        assert sorted(plugin.name for plugin in plugins) == names
+        assert all(isinstance(plugin, LazyPlugin) for plugin in plugins)
+        assert 'tstpkg1.plugin' not in sys.modules
+
+        plugins = pm.items('test.cache.c1', criteria=dict(implement='IClass1'))
+        assert len(plugins) == 1
+        plugin = plugins[0]
+        assert plugin.name == 'MyPlugin1'
+        assert plugin.plugin_dist is self.dist
+        assert plugin.criteria['plugin_dist'] is self.dist
+        assert pm.item('MyPlugin2', 'test.cache.c1').name == 'MyPlugin2'
+        assert 'tstpkg1.plugin' not in sys.modules
+
+        # implementation loads the plugin
+        assert plugin.implementation.__name__ == 'C1Class1'
+        assert plugin.is_loaded()
+        assert 'tstpkg1.impl' in sys.modules
+
+    def test_broken_group(self):
+        pm = PluginManager()
+        assert pm.items('test.cache.err') == []
+        cache = plugin_cache.get_entry_point_cache()
+        assert cache.plugins('test.cache.err') is None
+
+    def test_modified_module(self):
+        pm = PluginManager()
+        pm.items('test.cache.c1')
+        cache = plugin_cache.get_entry_point_cache()
+        assert cache.plugins('test.cache.c1') is not None
+
+        stamps, records = cache.data['plugins']['test.cache.c1']
+        cache.data['plugins']['test.cache.c1'] = ([(f, 0) for f, mtime in stamps], records)
+        assert cache.plugins('test.cache.c1') is None
+        pm = PluginManager()
+        plugins = pm.items('test.cache.c1')
+        assert not any(isinstance(plugin, LazyPlugin) for plugin in plugins)
@@ -183,3 +183,54 @@ class TestProjectManager(TestCase):
         pm.cproject = None
         assert 'world' not in user_ns
         assert w.keys() == []
+
+    def test_project_index(self):
+        from openalea.core.project import index as project_index
+        from openalea.core.project.index import ProjectIndex
+
+        self.create_projects()
+        project = Project(self.tmpdir / 'p1')
+        project.add('model', filename='m.py', content='a = 1')
+        project.save()
+
+        parsed = []
+        read_manifest = project_index.read_manifest
+
+        def counting_read_manifest(filename):
+            parsed.append(filename)
+            return read_manifest(filename)
+
+        project_index.read_manifest = counting_read_manifest
+        try:
+            filename = self.tmpdir2 / 'index'
+            index = ProjectIndex(filename)
+            repositories = [str(self.tmpdir)]
+            projects = dict(index.update(repositories))
+            assert sorted(_normpath(p).name for p in projects) == ['p1', 'p2']
+            assert dict(projects[str(self.tmpdir / 'p1')])['alias'] == 'p1'
+            assert len(parsed) == 2
+            index.save()
+
+            # unchanged manifests are not parsed again
+            index = ProjectIndex(filename)
+            assert len(index.update(repositories)) == 2
+            assert len(parsed) == 2
+
+            # new and modified projects are
+            project.alias = 'p1 modified'
+            project.save()
+            Project(self.tmpdir / 'p5', alias='p5').save()
+            projects = dict(index.update(repositories))
+            assert len(projects) == 3
+            assert dict(projects[str(self.tmpdir / 'p1')])['alias'] == 'p1 modified'
+            assert len(parsed) == 4
+        finally:
+            project_index.read_manifest = read_manifest
+
+        # items are read when the project is used
+        pm.discover()
+        proj = pm.item('p1')
+        assert '_items_loaded' in proj.__dict__ and not proj._items_loaded
+        assert proj.alias == 'p1 modified'
+        assert proj.model.keys() == ['m.py']
+        assert proj._items_loaded
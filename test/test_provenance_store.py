@@ -0,0 +1,126 @@
+"""Provenance store tests"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import tempfile
+import time
+from os.path import join as pj
+from shutil import rmtree
+
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.compositenode import CompositeNode
+from openalea.core.metadata.provenance_data import ProvenanceStore
+from openalea.core.metadata.data_size import total_size
+from openalea.core.metadata.cloud_sites import MultiSiteCloud
+from openalea.core.metadata.costs import minimum_cost_site
+
+from .small_tools import test_dir
+
+
+def get_pkg():
+    d = {}
+    execfile(pj(test_dir(), 'catalog.py'), globals(), d)
+    return d['pkg']
+
+
+def build_graph(pkg):
+    sg = CompositeNode()
+    val1id = sg.add_node(pkg['float'].instantiate())
+    val2id = sg.add_node(pkg['float'].instantiate())
+    addid = sg.add_node(pkg['plus'].instantiate())
+    sg.connect(val1id, 0, addid, 0)
+    sg.connect(val2id, 0, addid, 1)
+    sg.node(val1id).set_input(0, 2.)
+    sg.node(val2id).set_input(0, 3.)
+    return sg, addid
+
+
+def test_provenance_store():
+    tmpdir = tempfile.mkdtemp()
+    filename = pj(tmpdir, 'provenance.sq3')
+    store = ProvenanceStore(filename, flush_interval=10., size=total_size)
+    previous = dataflow_evaluation.set_provenance_store(store)
+    try:
+        sg, addid = build_graph(get_pkg())
+        sg()
+        sg.node(addid).invalidate()
+        sg()
+    finally:
+        dataflow_evaluation.set_provenance_store(previous)
+
+    try:
+        executions = store.executions()
+        assert len(executions) == 2
+        exec_id, name, start_time, end_time = executions[0]
+        assert start_time <= end_time
+
+        nodes = store.node_executions(exec_id)
+        vids = [vid for vid, factory, t0, t1, input_size, output_size in nodes]
+        assert addid in vids
+        for vid, factory, t0, t1, input_size, output_size in nodes:
+            if vid == addid:
+                assert factory.endswith(':plus')
+                assert input_size > 0 and output_size > 0
+        assert len(store.node_executions(executions[1][0])) < len(nodes)
+
+        # records are kept in the database
+        store.close()
+        store = ProvenanceStore(filename)
+        prov = store.get_prov()
+        assert prov.check_prov(str(addid)).output_size > 0
+
+        # history feeds the cost model: data transfers cost more than
+        # the computation of the node
+        cloud = MultiSiteCloud()
+        cloud.generate_fake()
+        cloud.list_sites['s1'].add_input_data(str(addid))
+        site, cost = minimum_cost_site(addid, prov, cloud)
+        assert site == 's1'
+        store.close()
+    finally:
+        rmtree(tmpdir)
+
+
+def test_shared_database():
+    from openalea.core.algo.dataflow_evaluation import ParallelEvaluation
+
+    tmpdir = tempfile.mkdtemp()
+    filename = pj(tmpdir, 'provenance.sq3')
+    store1 = ProvenanceStore(filename, flush_interval=10.)
+    store2 = ProvenanceStore(filename, flush_interval=10.)
+    try:
+        sg, addid = build_graph(get_pkg())
+        for store in (store1, store2, store1):
+            previous = dataflow_evaluation.set_provenance_store(store)
+            try:
+                sg.node(addid).invalidate()
+                ParallelEvaluation(sg).eval()
+            finally:
+                dataflow_evaluation.set_provenance_store(previous)
+            store.flush()
+
+        # ids are assigned by the database, executions of the evaluators
+        # without a workflow record are recorded
+        executions = store1.executions()
+        assert len(executions) == 3
+        assert len(set(e[0] for e in executions)) == 3
+        for exec_id, name, start_time, end_time in executions:
+            assert start_time <= end_time
+            assert addid in [n[0] for n in store1.node_executions(exec_id)]
+
+        # errors are logged, the writer goes on
+        store1._conn.execute("DROP TABLE Data")
+        for i in range(2):
+            store1.node_exec(1, addid, sg.node(addid), 0., 1.)
+            store1._wakeup.set()
+            for j in range(100):
+                if not store1._records:
+                    break
+                time.sleep(0.01)
+            assert len(store1._records) == 0
+            assert store1._writer.is_alive()
+    finally:
+        store1.close()
+        store2.close()
+        rmtree(tmpdir)
@@ -21,8 +21,11 @@ __revision__ = " $Id$ "
 
 from nose.tools import with_setup
 import os
+import shelve
+import threading
 
 from openalea.core.session import Session
+from openalea.core.sessionfile import is_session_file
 from openalea.core.pkgmanager import PackageManager
 from openalea.core.compositenode import CompositeNodeFactory, CompositeNode
 
@@ -110,3 +113,91 @@ def no_save_workspace():
     assert type(i) == type(instance)
     #assert i.node_id[addid].get_input(0) == 3
 #test_save_workspace()
+
+
+@with_setup(setup, teardown)
+def test_lazy_load():
+    filename = os.path.join(tmp_dir, 'lazy.pic')
+
+    asession = Session()
+    asession.workspaces = []
+    datapool = asession.datapool
+    datapool['i'] = [1, 2, 3]
+    datapool['big'] = range(10000)
+    datapool['lock'] = threading.Lock()  # can not be pickled
+    add_user_class(datapool)
+
+    for compress in (False, True):
+        asession.save(filename, compress=compress)
+        assert is_session_file(filename)
+
+        asession.load(filename)
+        datapool = asession.datapool
+        assert sorted(datapool) == ['big', 'i', 'j']
+        assert not datapool.is_loaded('big')
+        assert datapool['i'] == [1, 2, 3]
+        assert not datapool.is_loaded('big')
+        assert datapool.get('big') == range(10000)
+        assert datapool['j'].__class__.__name__ == 'test_data'
+
+        assert asession.pending_workspaces == []
+        assert asession.workspaces == []
+
+    # save over the file of the pending entries
+    asession.load(filename)
+    asession.add_workspace()
+    asession.save()
+    asession.workspaces = []
+    asession.load(filename)
+    assert len(asession.pending_workspaces) == 1
+    assert dict(asession.datapool.items())['big'] == range(10000)
+    assert len(asession.workspaces) == 1
+    assert asession.workspaces[0].__class__ is CompositeNode
+    asession.clear(False)
+
+
+@with_setup(setup, teardown)
+def test_pending_entries():
+    filename = os.path.join(tmp_dir, 'pending.pic')
+
+    asession = Session()
+    asession.workspaces = []
+    datapool = asession.datapool
+    datapool.clear()
+    datapool['i'] = 1
+    datapool.add_pending('j', lambda: 2)
+    datapool.add_pending('k', lambda: 3)
+
+    # dict methods do not return the pending loaders
+    assert dict(datapool) == {'i': 1}
+    assert len(datapool) == 3 and 'j' in datapool
+    assert datapool.setdefault('j') == 2
+    key, value = datapool.popitem()
+    assert (key, value) == ('k', 3)
+    assert sorted(datapool.items()) == [('i', 1), ('j', 2)]
+
+    def fail():
+        raise ValueError('corrupted entry')
+
+    # entries which can not be loaded are skipped
+    datapool.add_pending('bad', fail)
+    asession.save(filename)
+    assert 'bad' not in datapool
+    asession.load(filename)
+    assert sorted(asession.datapool.items()) == [('i', 1), ('j', 2)]
+    asession.clear(False)
+
+
+@with_setup(setup, teardown)
+def test_load_shelve():
+    filename = os.path.join(tmp_dir, 'old.pic')
+
+    d = shelve.open(filename)
+    d['__modules__'] = []
+    d['datapool'] = {'i': [1, 2, 3]}
+    d['workspaces'] = []
+    d.close()
+
+    asession = Session()
+    asession.load(filename)
+    assert asession.datapool['i'] == [1, 2, 3]